@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Measurement device test without hardware.
+
+A FakeDevice streams synthetic readings of a glider (theoretical length plus
+noise), in the measurement order selected in the window, through the
+measurement queue of a LineTrim window, as the DISTO does. With --exit, the
+window is closed once the stream is consumed and the number of measured
+lines printed, e.g. on the offscreen Qt platform.
+
+Usage (from the repository root)::
+
+    python benchmarks/fake_device.py [--glider data/gliders/Ozone_Geo5_S.txt] [--rate 20] [--exit]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(root, "src"))
+
+from PyQt5 import QtCore, QtWidgets
+
+import main
+from core.measurement import FakeDevice, synthetic_readings
+from core.ordering import Traversal
+
+
+def start_fake_device(lt, rate=20., noise=5., seed=None):
+    """Stream synthetic readings of the glider of a LineTrim window in its measurement order."""
+    traversal = Traversal(lt.table, lt.comboBox_Direction.currentText(), interleave=lt.actionInterleave_sides.isChecked())
+    order = [(int(i), int(side)) for i, side in zip(traversal.index, traversal.side)]
+    readings = synthetic_readings(lt.table, noise, order, seed)
+    samples = [value for value in readings for _ in range(lt.acquisition.samples)]
+    device = FakeDevice(samples, rate)
+    lt.measurement_bridge.addSource(device)
+    return device
+
+
+def main_fake_device(argv=None):
+    parser = argparse.ArgumentParser(description="Stream synthetic readings through the measurement queue of LineTrim.")
+    parser.add_argument("--glider", default=os.path.join(root, "data", "gliders", "Supair_Savage_S.txt"))
+    parser.add_argument("--rate", type=float, default=20., help="Readings per second")
+    parser.add_argument("--noise", type=float, default=5., help="Standard deviation of the readings (mm)")
+    parser.add_argument("--exit", action="store_true", help="Quit once every reading was consumed")
+    args = parser.parse_args(argv)
+
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv[:1])
+    mw = QtWidgets.QMainWindow()
+    lt = main.LineTrim(mw, main.version_number, line_length_filename=args.glider,
+                       project_filename=os.path.join(tempfile.mkdtemp(prefix="linetrim-fake-"), "fake.ltf"))
+    app.aboutToQuit.connect(lt.autosave.stop)
+    app.aboutToQuit.connect(lt.measurement_bridge.stop)
+    mw.show()
+    device = start_fake_device(lt, args.rate, args.noise, seed=0)
+
+    if args.exit:
+        def poll():
+            if not device.running and len(lt.measurement_bridge.queue) == 0:
+                app.quit()
+        timer = QtCore.QTimer()
+        timer.timeout.connect(poll)
+        timer.start(100)
+    app.exec_()
+    if device.error is not None:
+        print("Device error: %s"%device.error)
+        return 1
+    print("%i of %i lines measured"%(lt.table.n_measured, lt.table.measured.size))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_fake_device())
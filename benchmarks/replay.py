@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Measurement replay and throughput benchmark.
+
+Every glider of data/gliders is loaded in the real LineTrim window (offscreen
+Qt platform), then a measurement stream is replayed through the keyboard
+path (lineEdit_Measurement + updateMeasurement). The stream is synthetic
+(theoretical length plus noise), or recorded when --project is given, and
+includes cancellations (values under min_val_back) and rejected readings
+(further than valid_difference from the theoretical length). Sound is
+turned off, so that audio playback is neither timed nor required.
+
+Latency percentiles are reported per stage:
+
+- parse: reading the glider specification file
+- input: whole handling of one entered value
+- model: LineTable update
+- deviation: statistics and trim solver
+- update: update of the view items (PainterView.update)
+- view: scheduling of the repaint of the changed areas (PainterView.draw)
+- present: Qt event processing until the last update is on screen (see
+  present())
+- save: scheduling of the autosave on the UI thread
+- journal: appending the reading to the measurement journal
+- snapshot: writing a full project file
+
+With --check, the script fails when the p95 of a stage exceeds the stored
+baseline (baseline.json) by more than the given factor. Timings depend on
+the machine: run --update-baseline once on the machine used for the checks.
+
+Usage (from the repository root)::
+
+    python benchmarks/replay.py [--check] [--update-baseline] [--project file.ltf]
+"""
+
+import argparse
+import functools
+import glob
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(root, "src"))
+
+import numpy as np
+from PyQt5 import QtWidgets
+
+import main
+from core.spec_file import load_spec
+from core.project_file import dump_project, load_project
+
+baseline_filename = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+stage_list = ["parse", "input", "model", "deviation", "update", "view", "present", "save", "journal", "snapshot"]
+
+
+class StageTimer(object):
+    def __init__(self):
+        self.samples = dict((stage, list()) for stage in stage_list)
+
+    def wrap(self, stage, function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.samples[stage].append(time.perf_counter() - t0)
+        return wrapper
+
+    def summary(self):
+        result = dict()
+        for stage, samples in self.samples.items():
+            if len(samples) == 0: continue
+            ms = 1e3*np.array(samples)
+            result[stage] = dict(n=len(ms), p50=float(np.percentile(ms, 50)), p95=float(np.percentile(ms, 95)),
+                                 p99=float(np.percentile(ms, 99)), max=float(ms.max()))
+        return result
+
+
+def synthetic_stream(table, seed=0, noise=5., cancel_every=17, reject_every=11):
+    """
+    Values entered in the order the cursor walks the glider (Center to tip),
+    with a cancellation (two values under min_val_back) and a rejected
+    reading from time to time.
+    """
+    rng = np.random.default_rng(seed)
+    events = list()
+    for side in range(table.measured.shape[1]):
+        for row in range(len(table.row_names)):
+            number = None
+            for i in row_lines(table, row):
+                if table.number[i] != number:
+                    events.append(("goto", (row, int(table.number[i]), side)))
+                number = table.number[i]+1
+                ref = table.reference[i, side]
+                n = len(events)
+                if n % reject_every == 0:
+                    events.append(("value", ref + 2*main.valid_difference))
+                events.append(("value", float(np.round(ref + rng.normal(0., noise)))))
+                if n % cancel_every == 0:
+                    events.append(("value", 0.5*main.min_val_back))
+                    events.append(("value", 0.5*main.min_val_back))
+                    events.append(("value", float(np.round(ref + rng.normal(0., noise)))))
+    return events
+
+
+def row_lines(table, row):
+    """Indices of the lines of a row by increasing number."""
+    indices = np.flatnonzero(table.row == row)
+    return indices[np.argsort(table.number[indices], kind="stable")].tolist()
+
+
+def recorded_stream(table, project):
+    """Values of a recorded project, for the lines existing in table."""
+    recorded = project["table"]
+    events = list()
+    for side in range(table.measured.shape[1]):
+        for row in range(len(table.row_names)):
+            number = None
+            for i in row_lines(table, row):
+                if table.number[i] != number:
+                    events.append(("goto", (row, int(table.number[i]), side)))
+                j = recorded.index.get(table.keys[i], -1)
+                if j >= 0 and recorded.measured[j, side] != 0:
+                    events.append(("value", recorded.measured[j, side]))
+                    number = table.number[i]+1
+                else:
+                    number = None
+    return events
+
+
+def present(app, view, timeout=1.):
+    """Process the Qt events until the view has painted its last update."""
+    app.processEvents()
+    deadline = time.perf_counter() + timeout
+    while view.pending and time.perf_counter() < deadline:
+        time.sleep(0.0002)
+        app.processEvents()
+
+
+def replay(app, filename, project=None, repeat_parse=20):
+    timer = StageTimer()
+    parse = timer.wrap("parse", load_spec)
+    for _ in range(repeat_parse):
+        parse(filename)
+
+    tmp_dir = tempfile.mkdtemp(prefix="linetrim-bench-")
+    mw = QtWidgets.QMainWindow()
+    lt = main.LineTrim(mw, main.version_number, line_length_filename=filename,
+                       project_filename=os.path.join(tmp_dir, "bench.ltf"))
+    lt.sound = False
+    mw.resize(1600, 900)
+    mw.show()
+    app.processEvents()
+
+    table = lt.table
+    table.set_measurement = timer.wrap("model", table.set_measurement)
+    lt.showStatistics = timer.wrap("deviation", lt.showStatistics)
+    lt.autoSave = timer.wrap("save", lt.autoSave)
+    lt.autosave.record = timer.wrap("journal", lt.autosave.record)
+    present_view = timer.wrap("present", functools.partial(present, app, lt.view))
+    lt.view.update = timer.wrap("update", lt.view.update)
+    lt.view.draw = timer.wrap("view", lt.view.draw)
+    update_measurement = timer.wrap("input", lt.updateMeasurement)
+    snapshot = timer.wrap("snapshot", dump_project)
+
+    if project is None:
+        events = synthetic_stream(table)
+    else:
+        events = recorded_stream(table, project)
+    t0 = time.perf_counter()
+    n_values = 0
+    for kind, value in events:
+        if kind == "goto":
+            row, number, side = value
+            lt.comboBox_Side.setCurrentIndex(side)
+            lt.comboBox_Row.setCurrentIndex(row)
+            lt.comboBox_Number.setCurrentIndex(number-1)
+        else:
+            lt.lineEdit_Measurement.setText("%i"%value)
+            update_measurement()
+            n_values += 1
+        present_view()
+        if n_values % 10 == 0:
+            snapshot(lt.projectData(), io.BytesIO())
+    elapsed = time.perf_counter() - t0
+    lt.autosave.stop()
+    mw.close()
+    result = timer.summary()
+    result["throughput"] = n_values/elapsed
+    return result
+
+
+def check(results, baseline, factor, margin=0.5):
+    failures = list()
+    for glider, stages in results.items():
+        for stage, stats in stages.items():
+            if stage == "throughput" or not stage in baseline.get(glider, {}):
+                continue
+            limit = baseline[glider][stage]*factor + margin
+            if stats["p95"] > limit:
+                failures.append("%s %s: p95 %0.2f ms > %0.2f ms"%(glider, stage, stats["p95"], limit))
+    return failures
+
+
+def main_benchmark(argv=None):
+    parser = argparse.ArgumentParser(description="Replay measurement streams through LineTrim and time each stage.")
+    parser.add_argument("--gliders", nargs="+", default=sorted(glob.glob(os.path.join(root, "data", "gliders", "*.txt"))))
+    parser.add_argument("--project", default=None, help="Recorded project (.ltf) to replay instead of a synthetic stream")
+    parser.add_argument("--check", action="store_true", help="Fail if a stage regresses past the baseline")
+    parser.add_argument("--factor", type=float, default=1.5, help="Allowed p95 ratio to the baseline")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv[:1])
+    project = None if args.project is None else load_project(args.project)
+    results = dict()
+    for filename in args.gliders:
+        glider = os.path.basename(filename)[:-4]
+        results[glider] = replay(app, filename, project)
+        print("%s: %0.1f readings/s"%(glider, results[glider]["throughput"]))
+        for stage in stage_list:
+            if stage in results[glider]:
+                stats = results[glider][stage]
+                print("  %-10s n=%5i  p50 %7.2f ms  p95 %7.2f ms  p99 %7.2f ms  max %7.2f ms"%(stage, stats["n"], stats["p50"], stats["p95"], stats["p99"], stats["max"]))
+
+    if args.update_baseline:
+        baseline = dict((glider, dict((stage, stats["p95"]) for stage, stats in stages.items() if stage != "throughput"))
+                        for glider, stages in results.items())
+        with open(baseline_filename, "w") as f: json.dump(baseline, f, indent=1, sort_keys=True)
+        print("Baseline updated")
+    if args.check:
+        with open(baseline_filename, "r") as f: baseline = json.load(f)
+        failures = check(results, baseline, args.factor)
+        for failure in failures:
+            print("REGRESSION %s"%failure)
+        return 1 if failures else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_benchmark())
@@ -7,13 +7,10 @@ REM Activate Anaconda base environment
 call conda activate base
 echo Conda base environment activated
 
-REM Run the connect.py script from hardware/leica_disto/ in a separate window
-start "Leica Disto Connect" cmd /k "conda activate base && python "%~dp0..\hardware\leica_disto\connect.py""
-
 REM Change to project root and set PYTHONPATH
 cd /d "%~dp0.."
 set PYTHONPATH=%CD%
 
-REM Run the main application
+REM Run the main application, reading the DISTO directly
 cd src
-python main.py
\ No newline at end of file
+python main.py --disto
\ No newline at end of file
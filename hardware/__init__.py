@@ -0,0 +1 @@
+# Hardware integrations of LineTrim
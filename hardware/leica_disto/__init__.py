@@ -0,0 +1 @@
+# Leica DISTO Bluetooth LE connection
@@ -2,63 +2,52 @@
 # -*- coding: utf-8 -*-
 """
 Connect to Leica DISTO via Bluetooth and send measurements as keyboard input
+
+LineTrim can also read the DISTO directly, without keyboard simulation, with
+'python main.py --disto' (see source.py).
+
+From the repository root::
+
+    python -m hardware.leica_disto.connect
 """
 import asyncio
-import struct
-from bleak import BleakScanner, BleakClient
+from bleak import BleakClient
 from pynput.keyboard import Controller, Key
 
-DISTO_NAME = "DISTO"
+from .protocol import decode_measurement, find_disto, notify_characteristics
 
 keyboard = Controller()
 
 def on_measure(sender, data):
-    try:
-        # Convert float 32 to meters
-        val_m = struct.unpack('<f', data)[0]
-
-        # Convert to mm
-        val_mm = int(round(val_m * 1000))
-
-        # Convert to string
-        text = str(val_mm)
+    val_mm = decode_measurement(data)
+    if val_mm is None:
+        print("Raw data:", data)
+        return
 
-        # Simulate keyboard typing
-        for c in text:
-            keyboard.press(c)
-            keyboard.release(c)
+    # Convert to string
+    text = str(val_mm)
 
-        # Enter key
-        keyboard.press(Key.enter)
-        keyboard.release(Key.enter)
+    # Simulate keyboard typing
+    for c in text:
+        keyboard.press(c)
+        keyboard.release(c)
 
-        print(f"Measurement sent to keyboard: {text} mm")
+    # Enter key
+    keyboard.press(Key.enter)
+    keyboard.release(Key.enter)
 
-    except Exception:
-        print("Raw data:", data)
+    print(f"Measurement sent to keyboard: {text} mm")
 
 async def main():
-    devices = await BleakScanner.discover(timeout=5)
-    disto = next((d for d in devices if d.name and DISTO_NAME in d.name), None)
+    disto = await find_disto()
     if disto is None:
         print("DISTO not found")
         return
 
     async with BleakClient(disto) as client:
         print("Connected to DISTO")
-        services = client.services
-
-        chars = []
-        for service in services:
-            # Skip standard GATT services (16-bit UUIDs in the 0000XXXX-0000-1000-8000-00805f9b34fb format)
-            service_uuid = service.uuid.lower()
-            if service_uuid.startswith("0000") and service_uuid.endswith("-0000-1000-8000-00805f9b34fb"):
-                continue
-            
-            for char in service.characteristics:
-                if "notify" in char.properties or "indicate" in char.properties:
-                    chars.append(char)
 
+        chars = notify_characteristics(client)
         if not chars:
             print("No notify/indicate characteristic found")
             return
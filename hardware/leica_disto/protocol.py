@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""
+Leica DISTO Bluetooth LE protocol, shared by connect.py and source.py
+"""
+import struct
+
+DISTO_NAME = "DISTO"
+
+
+def decode_measurement(data):
+    """Convert a DISTO notification (float 32, meters) to mm, None if not a distance."""
+    if len(data) != 4:
+        return None
+    return round(struct.unpack('<f', data)[0] * 1000)
+
+
+def notify_characteristics(client):
+    chars = []
+    for service in client.services:
+        # Skip standard GATT services (16-bit UUIDs in the 0000XXXX-0000-1000-8000-00805f9b34fb format)
+        service_uuid = service.uuid.lower()
+        if service_uuid.startswith("0000") and service_uuid.endswith("-0000-1000-8000-00805f9b34fb"):
+            continue
+        for char in service.characteristics:
+            if "notify" in char.properties or "indicate" in char.properties:
+                chars.append(char)
+    return chars
+
+
+async def find_disto(timeout=5):
+    from bleak import BleakScanner
+    devices = await BleakScanner.discover(timeout=timeout)
+    return next((d for d in devices if d.name and DISTO_NAME in d.name), None)
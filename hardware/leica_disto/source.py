@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Leica DISTO measurement source feeding LineTrim directly (no keyboard typing)
+"""
+import asyncio
+
+from core.measurement import MeasurementSource
+
+from .protocol import decode_measurement, find_disto, notify_characteristics
+
+
+class DistoSource(MeasurementSource):
+    """Connect to a DISTO over Bluetooth LE and push readings to a MeasurementQueue."""
+    name = "disto"
+
+    def __init__(self, log=print):
+        super(DistoSource, self).__init__()
+        self.log = log
+
+    def run(self):
+        asyncio.run(self._main())
+
+    async def _main(self):
+        from bleak import BleakClient
+        disto = await find_disto()
+        if disto is None:
+            self.log("DISTO not found")
+            return
+        async with BleakClient(disto) as client:
+            chars = notify_characteristics(client)
+            if not chars:
+                self.log("No notify/indicate characteristic found")
+                return
+            for char in chars:
+                try:
+                    await client.start_notify(char.uuid, self._onNotify)
+                except Exception as e:
+                    self.log("Error subscribing to %s: %s"%(char.uuid, e))
+            self.log("Connected to DISTO")
+            while self.running and client.is_connected:
+                await asyncio.sleep(0.2)
+
+    def _onNotify(self, sender, data):
+        value = decode_measurement(data)
+        if value is not None:
+            self.queue.put(value, self.name)
@@ -19,14 +19,14 @@ setup(
     long_description=read_file('README.md'),
     long_description_content_type='text/markdown',
     author='Loic',
-    packages=find_packages(),
+    packages=find_packages(exclude=['tests']),
     package_dir={'': '.'},
     install_requires=[
         'PyQt5>=5.9.2',
         'matplotlib>=3.0.0',
         'numpy>=1.18.0',
     ],
-    python_requires='>=3.6',
+    python_requires='>=3.7',
     entry_points={
         'console_scripts': [
             'linetrim=src.main:main',
@@ -35,13 +35,12 @@ setup(
     include_package_data=True,
     package_data={
         'resources': ['images/*'],
-        'data': ['gliders/*', 'profiles/*'],
+        'data': ['gliders/*'],
     },
     classifiers=[
         'Development Status :: 3 - Alpha',
         'Intended Audience :: End Users/Desktop',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.6',
         'Programming Language :: Python :: 3.7',
         'Programming Language :: Python :: 3.8',
         'Programming Language :: Python :: 3.9',
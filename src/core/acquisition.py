@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+Multi-sample acquisition of the length of a line.
+
+Laser readings of a stretched line are noisy and a single bad shot should
+not become the stored value. An Acquisition collects the readings of the
+line being measured and keeps a robust estimate as they arrive:
+
+- the readings are kept sorted, so the median is read in the middle of the
+  list after an O(log n) insertion; the median absolute deviation takes one
+  pass over the few readings of the line
+- the spread is the median absolute deviation scaled to a standard
+  deviation (MAD x 1.4826); it is floored at the resolution of the meter in
+  the rejection limit only, the estimate reports it unfloored (0 for a
+  single reading or identical ones)
+- from the third reading on, a reading further than outlier_threshold
+  spreads from the median is rejected, and the estimate only uses the
+  readings close enough to the median, so an early bad shot is dropped
+  as soon as the others outvote it
+
+The line is complete once samples consistent readings are collected and the
+standard error of their median is under stable_error, or after max_samples
+readings in any case (not stable then). The spread of the consistent
+readings is stored along with the value as its confidence. With samples=1
+the first reading is accepted at once.
+"""
+
+import bisect
+
+import numpy as np
+
+default_samples = 1
+mad_scale = 1.4826
+# Rejection distance to the median, in spreads
+outlier_threshold = 3.5
+# Resolution of the meter (mm), lower bound of the spread used for rejection
+min_spread = 1.
+# Largest standard error of the median (mm) of a complete line
+stable_error = 2.
+# Standard error of the median of normal readings relative to the one of the mean
+median_error_ratio = 1.2533
+
+# Results of Acquisition.add()
+SAMPLE, OUTLIER, DONE = "sample", "outlier", "done"
+
+
+class Acquisition(object):
+    """Readings of one line (index, side) and their robust estimate."""
+    def __init__(self, samples=default_samples, max_samples=None, threshold=outlier_threshold, stable_error=stable_error):
+        self.samples = samples
+        self.max_samples = 2*samples+2 if max_samples is None else max_samples
+        self.threshold = threshold
+        self.stable_error = stable_error
+        self.reset()
+
+    def reset(self, cell=None):
+        """Start the acquisition of line cell (index, side)."""
+        self.cell = cell
+        self.readings = list()      # sorted
+        self.n_rejected = 0
+        self.stable = False
+
+    def __len__(self):
+        return len(self.readings) + self.n_rejected
+
+    def _statistics(self, values):
+        """(median, spread) of sorted values."""
+        n = len(values)
+        median = 0.5*(values[(n-1)//2] + values[n//2])
+        return median, mad_scale*float(np.median(np.abs(np.asarray(values) - median)))
+
+    @property
+    def inliers(self):
+        """Readings consistent with the median."""
+        if len(self.readings) < 3:
+            return self.readings
+        median, spread = self._statistics(self.readings)
+        limit = self.threshold*max(spread, min_spread)
+        low = bisect.bisect_left(self.readings, median - limit)
+        high = bisect.bisect_right(self.readings, median + limit)
+        return self.readings[low:high]
+
+    @property
+    def estimate(self):
+        """(value, unfloored spread) of the consistent readings, (0, 0) without reading."""
+        inliers = self.inliers
+        if len(inliers) == 0:
+            return 0., 0.
+        return self._statistics(inliers)
+
+    def add(self, value):
+        """
+        Add a reading, returns OUTLIER if it was rejected, DONE once the line
+        is complete (see estimate and stable), SAMPLE else.
+        """
+        if len(self.readings) >= 3:
+            median, spread = self._statistics(self.readings)
+            if abs(value - median) > self.threshold*max(spread, min_spread):
+                self.n_rejected += 1
+                return DONE if len(self) >= self.max_samples else OUTLIER
+        bisect.insort(self.readings, value)
+        inliers = self.inliers
+        if len(inliers) >= self.samples:
+            spread = self._statistics(inliers)[1]
+            self.stable = median_error_ratio*spread/np.sqrt(len(inliers)) <= self.stable_error
+            if self.stable:
+                return DONE
+        return DONE if len(self) >= self.max_samples else SAMPLE
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+Incremental, asynchronous autosave of LineTrim projects.
+
+Each accepted measurement is appended to a small journal next to the project
+file (``<project>.journal``, one JSON event per line). Full snapshots are
+debounced and coalesced: only the latest one is written, by a background
+thread, after the project stayed untouched for ``delay`` seconds or after
+``snapshot_every`` journal events. Snapshots are written atomically
+(temporary file + rename) and the journal is then trimmed to the events the
+snapshot does not contain yet. Snapshots hold the edit history (see
+core/history.py) as well; undos and redos are journaled as the value they
+restore, tagged with their operation, so that the history is rebuilt on
+top of the one of the snapshot. When a store is given (see
+core/fleet_store.py), every snapshot written is recorded in it as well.
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+
+from .project_file import dump_project
+
+journal_suffix = ".journal"
+
+
+def write_atomic(filename, project, dump=dump_project):
+    """Write a project to a temporary file and rename it over filename."""
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, tmp_filename = tempfile.mkstemp(prefix=".ltf-", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            dump(project, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_filename, filename)
+    except BaseException:
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+        raise
+
+
+def read_journal(filename):
+    """Yield the measurement events journaled for the project filename."""
+    journal_filename = filename + journal_suffix
+    if not os.path.isfile(journal_filename):
+        return
+    with open(journal_filename, "r") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # Last line may be truncated by a crash during the append
+                break
+
+
+def replay_journal(filename, table, history=None):
+    """
+    Apply journaled measurements on top of a loaded LineTable, return their
+    number. The edits are pushed, undone and redone in history if given,
+    restored from the same snapshot.
+    """
+    n = 0
+    for event in read_journal(filename):
+        cell = table.parse_side_key(event.get("key", ""))
+        if cell is not None:
+            if history is not None:
+                op = event.get("op")
+                if op == "undo":
+                    history.undo()
+                elif op == "redo":
+                    history.redo()
+                else:
+                    history.push(cell[0], cell[1], table.measured[cell], event["value"], table.spread[cell], event.get("spread", 0.))
+            table.set_measurement(cell[0], cell[1], event["value"], event.get("spread", 0.))
+            n += 1
+    return n
+
+
+class AutoSaver(object):
+    """Background writer of project snapshots and measurement journals."""
+    def __init__(self, delay=2., snapshot_every=50, dump=dump_project, store=None):
+        self.delay = delay
+        self.snapshot_every = snapshot_every
+        self.dump = dump
+        self.store = store
+        self.last_error = None
+        self._condition = threading.Condition()
+        self._snapshot = None           # (filename, project, seq) waiting to be written
+        self._deadline = None
+        self._events = list()           # (filename, seq, line) waiting to be appended
+        self._journaled = dict()        # filename -> [(seq, line), ...] not yet in a snapshot
+        self._seq = 0
+        self._busy = False
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="LineTrimAutoSave", daemon=True)
+        self._thread.start()
+
+    def record(self, filename, key, value, op=None, spread=0.):
+        """
+        Journal a single measurement and the spread of its readings, costs
+        one small append on the worker thread. op is "undo" or "redo" when
+        the value comes from the history.
+        """
+        event = dict(t=time.time(), key=key, value=value)
+        if spread != 0: event["spread"] = spread
+        if op is not None: event["op"] = op
+        line = json.dumps(event) + "\n"
+        with self._condition:
+            self._seq += 1
+            self._events.append((filename, self._seq, line))
+            self._condition.notify()
+
+    def schedule(self, filename, project, delay=None):
+        """
+        Ask for a snapshot of project, replacing any snapshot not written yet.
+
+        The project dictionary must not be modified afterwards by the caller.
+        """
+        if delay is None: delay = self.delay
+        with self._condition:
+            self._snapshot = (filename, project, self._seq)
+            if len(self._journaled.get(filename, ())) + len(self._events) >= self.snapshot_every:
+                delay = 0.
+            self._deadline = time.monotonic() + delay
+            self._condition.notify()
+
+    def flush(self, timeout=None):
+        """Write everything pending now and wait for the worker to be idle."""
+        with self._condition:
+            if self._snapshot is not None:
+                self._deadline = time.monotonic()
+            self._condition.notify()
+            return self._condition.wait_for(lambda: not self._busy and not self._events and self._snapshot is None, timeout)
+
+    def stop(self):
+        self.flush()
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._running and not self._events and (self._snapshot is None or time.monotonic() < self._deadline):
+                    timeout = None if self._snapshot is None else max(0., self._deadline - time.monotonic())
+                    self._condition.wait(timeout)
+                if not self._running and not self._events and self._snapshot is None:
+                    return
+                events, self._events = self._events, list()
+                snapshot = None
+                if self._snapshot is not None and time.monotonic() >= self._deadline:
+                    snapshot, self._snapshot, self._deadline = self._snapshot, None, None
+                self._busy = True
+            try:
+                self._appendEvents(events)
+                if snapshot is not None:
+                    self._writeSnapshot(*snapshot)
+                self.last_error = None
+            except Exception as e:
+                self.last_error = e
+            finally:
+                with self._condition:
+                    self._busy = False
+                    self._condition.notify_all()
+
+    def _appendEvents(self, events):
+        by_file = dict()
+        for filename, seq, line in events:
+            by_file.setdefault(filename, list()).append((seq, line))
+        for filename, lines in by_file.items():
+            with open(filename + journal_suffix, "a") as f:
+                f.write("".join(line for seq, line in lines))
+            with self._condition:
+                self._journaled.setdefault(filename, list()).extend(lines)
+
+    def _writeSnapshot(self, filename, project, seq):
+        write_atomic(filename, project, self.dump)
+        # Keep in the journal only the events recorded after the snapshot
+        with self._condition:
+            remaining = [(s, line) for s, line in self._journaled.pop(filename, ()) if s > seq]
+            if remaining:
+                self._journaled[filename] = remaining
+        journal_filename = filename + journal_suffix
+        if remaining:
+            write_atomic(journal_filename, "".join(line for s, line in remaining), lambda text, f: f.write(text.encode()))
+        elif os.path.exists(journal_filename):
+            os.remove(journal_filename)
+        if self.store is not None:
+            self.store.record(filename, project)
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Disk cache of data derived from source files.
+
+Entries are named after a hash of their source, usually the content hash of
+the source file (see file_hash()), so an edited file is parsed again while a
+file which was only touched or copied is recognised. The cache is only an accelerator: any
+failure to read or write it falls back to the loader.
+
+Entries read with read_cache() are marked as recently used (modification
+time), so that prune_cache() can bound a family of entries by dropping the
+least recently used ones.
+"""
+
+import hashlib
+import os
+import tempfile
+
+cache_dir = os.environ.get("LINETRIM_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "linetrim"))
+
+
+def file_hash(filename):
+    """sha1 of the content of filename."""
+    sha = hashlib.sha1()
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(1<<16), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def cache_path(name):
+    return os.path.join(cache_dir, name)
+
+
+def write_cache(name, write, mode="wb"):
+    """Atomically create the cache entry name with write(f), ignoring failures."""
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, mode) as f:
+                write(f)
+            os.replace(tmp, cache_path(name))
+        except Exception:
+            os.remove(tmp)
+            raise
+    except (OSError, ValueError, TypeError):
+        return False
+    return True
+
+
+def read_cache(name, read, mode="rb"):
+    """read(f) of the cache entry name, marked as recently used, None if missing or unreadable."""
+    path = cache_path(name)
+    try:
+        with open(path, mode) as f:
+            value = read(f)
+        os.utime(path)
+    except (OSError, ValueError, KeyError):
+        return None
+    return value
+
+
+def prune_cache(prefix, max_entries):
+    """Remove the least recently used entries whose name starts with prefix past max_entries."""
+    try:
+        entries = [entry for entry in os.scandir(cache_dir) if entry.name.startswith(prefix)]
+        if len(entries) <= max_entries:
+            return 0
+        entries.sort(key=lambda entry: entry.stat().st_mtime_ns)
+        for entry in entries[:len(entries)-max_entries]:
+            os.remove(entry.path)
+    except OSError:
+        return 0
+    return len(entries)-max_entries
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+Cascade tree of the lines of a glider.
+
+Every line of a LineTable is a segment hanging from its parent, the segment
+of the lower cascade it is attached to, or from the riser (parent -1). The
+attachment points on the canopy are the ends of the segments without
+children, and what is trimmed is the path from the riser to each of them:
+the sum of the segments along the path. Tables without parents are flat,
+every line being its own path.
+
+The tree is stored as flat arrays. paths holds, for every segment, the
+indices of the segments from it down to the riser, padded with a sentinel
+index, so the path sums of any per segment values are a single gather and
+sum. contains[i, j] tells whether segment j is on the path of segment i:
+a new measurement of a shared segment updates the lengths of all the paths
+through it in one vectorized operation.
+
+From the src directory, the paths of a specification are listed with::
+
+    python -m core.cascade ../data/gliders/Supair_Savage_S.txt
+"""
+
+import sys
+
+import numpy as np
+
+
+class CascadeTree(object):
+    """Parent/children structure of the segments, as flat arrays."""
+    def __init__(self, parent):
+        parent = np.asarray(parent, dtype=np.int32)
+        n = len(parent)
+        self.parent = parent
+        columns = [np.arange(n, dtype=np.int32)]
+        ancestor = parent.copy()
+        while np.any(ancestor >= 0):
+            if len(columns) > n:
+                raise ValueError("the parent lines form a loop")
+            columns.append(np.where(ancestor >= 0, ancestor, n))
+            ancestor = np.where(ancestor >= 0, parent[np.maximum(ancestor, 0)], -1)
+        # Segments from each one down to the riser, n past the root
+        self.paths = np.column_stack(columns) if n > 0 else np.zeros((0, 1), dtype=np.int32)
+        self.depth = np.count_nonzero(self.paths < n, axis=1) - 1
+        n_children = np.bincount(parent[parent >= 0], minlength=n)
+        self.is_leaf = n_children == 0
+        self.leaves = np.flatnonzero(self.is_leaf)
+        self.contains = np.zeros((n, n+1), dtype=bool)
+        self.contains[np.repeat(np.arange(n), self.paths.shape[1]), self.paths.ravel()] = True
+        self.contains = self.contains[:, :n]
+
+    @classmethod
+    def from_table(cls, table):
+        return cls(table.parent)
+
+    def __len__(self):
+        return len(self.parent)
+
+    @property
+    def is_flat(self):
+        return not np.any(self.parent >= 0)
+
+    def path_sums(self, values):
+        """Sums of per segment values (n, ...) along the path of every segment."""
+        values = np.asarray(values)
+        padded = np.concatenate([values, np.zeros((1,)+values.shape[1:], dtype=values.dtype)])
+        return padded[self.paths].sum(axis=1)
+
+    def path(self, i):
+        """Indices of the segments from the riser up to segment i."""
+        path = self.paths[i]
+        return path[path < len(self)][::-1]
+
+    def through(self, j):
+        """Indices of the attachment points whose path runs through segment j."""
+        return np.flatnonzero(self.contains[:, j] & self.is_leaf)
+
+
+class PathLengths(object):
+    """
+    Riser to segment lengths of a LineTable, theoretical and measured, kept
+    up to date as segments are measured.
+
+    A path is measured once all its segments are. Every reading carries the
+    offset of the measurement setup, so the deviation of a path subtracts
+    it once per segment.
+    """
+    def __init__(self, table, tree=None):
+        self.table = table
+        self.tree = CascadeTree.from_table(table) if tree is None else tree
+        self.reset()
+
+    def reset(self):
+        """Recompute every path from the table, e.g. after loading."""
+        table, tree = self.table, self.tree
+        self.reference = tree.path_sums(table.reference)
+        self.measured = tree.path_sums(table.measured)
+        self.missing = tree.path_sums((table.measured == 0).astype(np.int32))
+        self.n_segments = (tree.depth+1)[:, None]
+
+    def set_measurement(self, i, side, value, spread=0.):
+        """Set a segment measurement in the table and update the paths through it."""
+        old = self.table.measured[i, side]
+        self.table.set_measurement(i, side, value, spread)
+        rows = self.tree.contains[:, i]
+        self.measured[rows, side] += value - old
+        self.missing[rows, side] += int(value == 0) - int(old == 0)
+
+    @property
+    def is_measured(self):
+        return self.missing == 0
+
+    def deviation(self, offset=None):
+        """Deviation (n, side) of every path, NaN where a segment is not measured."""
+        if offset is None: offset = self.table.offset
+        return np.where(self.is_measured, self.measured - self.reference - offset*self.n_segments, np.nan)
+
+    def attachment_deviation(self, offset=None):
+        """Deviation (n_attachments, side) of the paths to the attachment points."""
+        return self.deviation(offset)[self.tree.leaves]
+
+
+if __name__ == "__main__":
+    from .spec_file import load_spec, SpecError
+
+    if len(sys.argv) != 2:
+        print("Usage: python -m core.cascade spec.txt")
+        sys.exit(2)
+    try:
+        table = load_spec(sys.argv[1])
+    except (OSError, SpecError) as e:
+        print(e)
+        sys.exit(1)
+    tree = CascadeTree.from_table(table)
+    lengths = PathLengths(table, tree)
+    if tree.is_flat:
+        print("No cascade in %s, every line is attached to the riser."%sys.argv[1])
+    for i in tree.leaves.tolist():
+        path = " > ".join(table.names[j] for j in tree.path(i).tolist())
+        print("%-30s %s"%(path, " / ".join("%.0f"%length for length in lengths.reference[i])))
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+Import of manufacturer line charts (XLS workbooks or CSV sheets).
+
+The check lengths are read from the table of the sheet whose header row
+holds the row names (A, B, C, D, K...) to the right of an empty cell, each
+following row starting with the line number in that column, e.g. the
+"Corrected check lengths" table of the Ozone charts::
+
+          A     B     C     D     K
+    1   6564  6471  6558  6674  7594
+    2   6512  6418  6506  6623  7274
+
+Empty cells are lines which do not exist. Every sheet of a workbook is a
+size; each one is written as a specification file (see core/spec_file.py),
+or all of them in a single multi-size file. Reading XLS files requires the
+optional xlrd package.
+
+From the src directory::
+
+    python -m core.chart_import "../data/gliders/source/Buzz Z3 Line Chart.xls" --name Ozone_BuzzZ3 -o ../data/gliders
+"""
+
+import argparse
+import csv
+import os
+import re
+import sys
+
+from .model import LineTable
+from .spec_file import write_spec
+
+_row_name_pattern = re.compile(r"^[A-Za-z]{1,3}$")
+
+
+class ChartError(ValueError):
+    pass
+
+
+def _number(cell):
+    if isinstance(cell, float):
+        return cell
+    try:
+        return float(str(cell).strip())
+    except ValueError:
+        return None
+
+
+def read_xls(filename):
+    """Yield (sheet name, rows of cell values) for every sheet of a workbook."""
+    try:
+        import xlrd
+    except ImportError:
+        raise ChartError("Reading %s requires the xlrd package (pip install xlrd)"%filename)
+    book = xlrd.open_workbook(filename, on_demand=True)
+    try:
+        for name in book.sheet_names():
+            sheet = book.sheet_by_name(name)
+            yield name, (sheet.row_values(r) for r in range(sheet.nrows))
+            book.unload_sheet(name)
+    finally:
+        book.release_resources()
+
+
+def read_csv(filename):
+    """Yield the single sheet of a CSV file, named after the file."""
+    with open(filename, "r", newline="") as f:
+        sample = f.read(4096)
+        f.seek(0)
+        delimiter = max(",;\t", key=sample.count)
+        yield os.path.splitext(os.path.basename(filename))[0], csv.reader(f, delimiter=delimiter)
+
+
+def _header(cells):
+    """(number column, [(column, row name)]) if cells is a header row, else None."""
+    for start in range(1, len(cells)):
+        if str(cells[start-1]).strip() != "":
+            continue
+        names = list()
+        for col in range(start, len(cells)):
+            text = str(cells[col]).strip()
+            if not _row_name_pattern.match(text):
+                break
+            names.append((col, text))
+        if len(names) >= 2:
+            return start-1, names
+    return None
+
+
+def parse_sheet(rows, sheet="sheet"):
+    """LineTable of the check length table of a sheet, rows being lists of cells."""
+    header = None
+    row, number, length = list(), list(), list()
+    for cells in rows:
+        if header is None:
+            header = _header(cells)
+            continue
+        col, names = header
+        n = _number(cells[col]) if col < len(cells) else None
+        if n is None or n != int(n) or n <= 0:
+            if len(number) > 0:
+                break
+            continue
+        for k, (c, name) in enumerate(names):
+            val = _number(cells[c]) if c < len(cells) else None
+            if val is not None and val > 0:
+                row.append(k)
+                number.append(int(n))
+                length.append(val)
+    if header is None or len(row) == 0:
+        raise ChartError("No check length table found in %s"%sheet)
+    # Drop the columns without any line (e.g. an unused E row)
+    names = [name for c, name in header[1]]
+    used = sorted(set(row))
+    remap = dict((k, i) for i, k in enumerate(used))
+    return LineTable([names[k] for k in used], [remap[k] for k in row], number, length)
+
+
+def read_chart(filename):
+    """Yield (size, LineTable) for every sheet of an XLS or CSV chart."""
+    reader = read_csv if filename.lower().endswith(".csv") else read_xls
+    for sheet, rows in reader(filename):
+        yield sheet.strip(), parse_sheet(rows, "%s [%s]"%(filename, sheet))
+
+
+def import_chart(filename, output, name=None, combined=False):
+    """
+    Write the specification files of a chart, one per size named
+    <name>_<size>.txt in the output directory, or a single multi-size file
+    if combined. Returns the written filenames.
+    """
+    if name is None:
+        name = os.path.splitext(os.path.basename(filename))[0].replace(" ", "_")
+    comment = "Imported from %s"%os.path.basename(filename)
+    written = list()
+    if combined:
+        target = output if output.endswith(".txt") else os.path.join(output, "%s.txt"%name)
+        with open(target, "w") as f:
+            for size, table in read_chart(filename):
+                write_spec(f, table, size=size, comment=comment if len(written) == 0 else None)
+                written.append(target)
+        return sorted(set(written))
+    for size, table in read_chart(filename):
+        target = os.path.join(output, "%s_%s.txt"%(name, size))
+        with open(target, "w") as f:
+            write_spec(f, table, comment="%s, sheet %s"%(comment, size))
+        written.append(target)
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert a manufacturer line chart (XLS, CSV) to specification files.")
+    parser.add_argument("chart")
+    parser.add_argument("-o", "--output", default=".", help="Output directory, or .txt file with --combined")
+    parser.add_argument("--name", help="Prefix of the files, e.g. Ozone_BuzzZ3")
+    parser.add_argument("--combined", action="store_true", help="Write every size in a single file")
+    args = parser.parse_args(argv)
+    try:
+        for filename in import_chart(args.chart, args.output, args.name, args.combined):
+            print("Written %s"%filename)
+    except (OSError, ChartError) as e:
+        print(e)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
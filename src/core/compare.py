@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+Comparison of several measurement sessions of the same glider.
+
+Sessions are selected from the project headers only; the bodies of the
+selected projects are then read and aligned on the union of their line keys
+into arrays indexed by (session, line, side), NaN where a line was not
+measured:
+
+- deviation: deviation of each session relative to its own offset
+- drift(a, b): deviation of session b minus deviation of session a (the
+  change of the trim between two sessions, "delta of delta")
+- trend(): per line least-squares slope of measured minus theoretical
+  length over time (mm per 100 days), negative when the line shrinks
+
+From the src directory::
+
+    python -m core.compare ../projects ../projects/autosave --match SA-SAV-S-2007-145
+"""
+
+import os
+import re
+import sys
+import time
+
+import numpy as np
+
+from .model import LineTable, side_list
+from .project_file import LazyProject, ProjectFileError
+
+project_suffix = ".ltf"
+# Unit of the trends, in days
+trend_period = 100.
+
+_date_pattern = re.compile(r"^(\d{4}-\d{2}-\d{2})")
+
+
+def session_time(project):
+    """
+    Session date of a LazyProject as a timestamp: the date prefix of the file
+    name when there is one (legacy files lost their date), else the header.
+    """
+    match = _date_pattern.match(os.path.basename(project.filename))
+    if match is not None:
+        return time.mktime(time.strptime(match.group(1), "%Y-%m-%d"))
+    return time.mktime(time.strptime(project.header["date"], "%Y-%m-%d %H:%M:%S"))
+
+
+def _normalize(name):
+    return re.sub(r"[^0-9a-z]", "", name.lower())
+
+
+def session_glider(project):
+    """
+    Glider model of a session, from the header or, for legacy files which do
+    not record it, from the file name ('<date>_<glider>.ltf' or
+    '<date>-<glider>_-_<identification>.ltf').
+    """
+    if project.header.get("glider"):
+        return project.header["glider"]
+    name = os.path.splitext(os.path.basename(project.filename))[0]
+    name = _date_pattern.sub("", name).lstrip("-_")
+    return name.split("_-_")[0]
+
+
+class NamedHeader(object):
+    """Stand-in of a LazyProject holding only a file name and a header, for session_time() and session_glider()."""
+    def __init__(self, filename, header):
+        self.filename = filename
+        self.header = header
+
+
+def wing_name(header):
+    """Glider and serial number of a session, e.g. 'Supair Savage S - SA-SAV-S-2007-145'."""
+    parts = [part.strip() for part in header.get("identification", "").split(" - ")]
+    return " - ".join(parts[:2])
+
+
+def project_files(paths):
+    """Project files of the files and directories given."""
+    filenames = list()
+    for path in paths:
+        if os.path.isdir(path):
+            filenames.extend(os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith(project_suffix))
+        else:
+            filenames.append(path)
+    return filenames
+
+
+def find_sessions(paths, glider=None, match=None):
+    """
+    LazyProjects of the files and directories given, of which only the
+    headers are read, filtered by glider model and by a text contained in
+    the identification or file name, sorted by session date.
+    """
+    sessions = list()
+    for filename in project_files(paths):
+        try:
+            project = LazyProject(filename)
+        except (OSError, ValueError, ProjectFileError):
+            continue
+        header = project.header
+        if glider is not None and _normalize(session_glider(project)) != _normalize(glider):
+            continue
+        if match is not None and not match.lower() in (header.get("identification", "")+" "+os.path.basename(filename)).lower():
+            continue
+        sessions.append(project)
+    sessions.sort(key=session_time)
+    return sessions
+
+
+def session_gliders(sessions):
+    """Glider models of sessions, names differing only by case or punctuation counted once."""
+    gliders = dict()
+    for session in sessions:
+        name = session_glider(session)
+        gliders.setdefault(_normalize(name), name)
+    return sorted(gliders.values())
+
+
+class Comparison(object):
+    """Sessions of a glider aligned on the union of their lines."""
+    def __init__(self, sessions):
+        self.sessions = list(sessions)
+        if len(self.sessions) == 0:
+            raise ValueError("No session to compare")
+        self.filenames = [session.filename for session in self.sessions]
+        self.identifications = [session.header.get("identification", "") for session in self.sessions]
+        self.times = np.array([session_time(session) for session in self.sessions])
+
+        bodies = [session.body for session in self.sessions]
+        self.keys = np.unique(np.concatenate([body["keys"] for body in bodies])) if len(bodies) > 0 else np.array([], dtype=str)
+        n_sessions, n_lines, n_sides = len(bodies), len(self.keys), len(side_list)
+        self.measured = np.full((n_sessions, n_lines, n_sides), np.nan)
+        self.reference = np.full((n_lines, n_sides), np.nan)
+        self.row_names = list()
+        rows = np.full(n_lines, -1, dtype=np.int16)
+        numbers = np.zeros(n_lines, dtype=np.int16)
+        for s, (session, body) in enumerate(zip(self.sessions, bodies)):
+            index = np.searchsorted(self.keys, body["keys"])
+            measured = np.asarray(body["measured"], dtype=np.float64)
+            self.measured[s, index] = np.where(measured != 0, measured, np.nan)
+            reference = body["reference"] if "reference" in body else np.repeat(body["line_length"][:, None], n_sides, axis=1)
+            self.reference[index] = reference
+            # Row indices of this session in the merged row names
+            for name in session.header["row_names"]:
+                if not name in self.row_names: self.row_names.append(name)
+            row_map = np.array([self.row_names.index(name) for name in session.header["row_names"]]+[-1], dtype=np.int16)
+            rows[index] = row_map[body["row"]]
+            numbers[index] = body["number"]
+        self.row = rows
+        self.number = numbers
+
+        raw = self.measured - self.reference[None]
+        finite = np.isfinite(raw).reshape(n_sessions, -1)
+        count = finite.sum(axis=1)
+        total = np.where(finite, raw.reshape(n_sessions, -1), 0.).sum(axis=1)
+        self.offset = np.where(count > 0, total/np.maximum(count, 1), np.nan)
+        self.raw_deviation = raw
+        self.deviation = raw - self.offset[:, None, None]
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def table(self):
+        """LineTable of the merged lines, with the theoretical lengths only."""
+        return LineTable(self.row_names, self.row, self.number, np.nan_to_num(self.reference))
+
+    def drift(self, a=0, b=-1):
+        """Change of the deviation of every line from session a to session b, NaN if not measured in both."""
+        return self.deviation[b] - self.deviation[a]
+
+    def trend(self):
+        """
+        Slope of measured minus theoretical length over time per line and
+        side (mm per trend_period days), NaN with less than two sessions.
+        """
+        days = (self.times - (self.times[0] if len(self.times) > 0 else 0.)) / 86400.
+        y = self.raw_deviation
+        w = np.isfinite(y)
+        x = np.broadcast_to(days[:, None, None], y.shape)
+        n = w.sum(axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            x_mean = np.where(w, x, 0.).sum(axis=0)/n
+            y_mean = np.where(w, y, 0.).sum(axis=0)/n
+            dx = np.where(w, x - x_mean, 0.)
+            dy = np.where(w, y - y_mean, 0.)
+            slope = (dx*dy).sum(axis=0)/(dx*dx).sum(axis=0)
+        slope[n < 2] = np.nan
+        return trend_period*slope
+
+    def offset_trend(self):
+        """Slope of the session offsets (mm per trend_period days), the overall shrinkage."""
+        valid = np.isfinite(self.offset)
+        if np.count_nonzero(valid) < 2 or np.ptp(self.times[valid]) == 0:
+            return np.nan
+        return trend_period*np.polyfit(self.times[valid]/86400., self.offset[valid], 1)[0]
+
+    def summary(self, a=0, b=-1):
+        """Text summary of the sessions and of the largest drifts between a and b."""
+        lines = list()
+        for s in range(len(self)):
+            lines.append("%s  offset %+6.1f mm  %s"%(time.strftime("%Y-%m-%d", time.localtime(self.times[s])), self.offset[s], self.identifications[s]))
+        if len(self) >= 2:
+            drift = self.drift(a, b)
+            lines.append("Offset trend: %+.1f mm / %i days"%(self.offset_trend(), trend_period))
+            finite = np.isfinite(drift)
+            if finite.any():
+                order = np.argsort(-np.abs(np.where(finite, drift, 0.)), axis=None)[:10]
+                lines.append("Largest drifts between sessions %i and %i:"%(a % len(self), b % len(self)))
+                for flat in order:
+                    i, side = np.unravel_index(flat, drift.shape)
+                    if not finite[i, side]: break
+                    lines.append("  %s_%s  %+6.1f mm"%(self.keys[i], side_list[side], drift[i, side]))
+        return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Compare the measurement sessions of a glider.")
+    parser.add_argument("paths", nargs="+", help="Project files or directories")
+    parser.add_argument("--glider", help="Glider model, e.g. Supair_Savage_S")
+    parser.add_argument("--match", help="Text of the identification or file name, e.g. a serial number")
+    parser.add_argument("-o", "--output", help="Render the drift between the first and last sessions (pdf, png)")
+    args = parser.parse_args()
+    t0 = time.perf_counter()
+    sessions = find_sessions(args.paths, args.glider, args.match)
+    if len(sessions) == 0:
+        sys.exit("No matching session")
+    gliders = session_gliders(sessions)
+    if len(gliders) > 1:
+        sys.exit("The sessions are of different gliders (%s), select one with --glider"%", ".join(gliders))
+    comparison = Comparison(sessions)
+    print(comparison.summary())
+    print("%i session(s) loaded in %0.1f ms"%(len(comparison), 1e3*(time.perf_counter()-t0)))
+    if args.output is not None and len(comparison) >= 2:
+        from render.compare_view import render_drift
+        render_drift(comparison, args.output)
+        print("Written %s"%args.output)
@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+"""
+Export of the measurements of project files for external analysis.
+
+Every line and side of every session becomes a row: run number of the
+export, file (path relative to the exported root, with / separators),
+date, glider, identification, line key, side, theoretical, measured (empty
+or NaN when not measured), deviation relative to the session offset, and
+offset.
+
+The export is a pipeline of generators: the project files are read one at
+a time into per session column arrays, which are gathered into chunks of at
+most chunk_rows rows and handed to the writer, so only one session and one
+chunk are in memory whatever the size of the archive. The output directory
+holds:
+
+- csv: sessions.csv, written chunk by chunk with the csv module
+- parquet, arrow: one file per run (sessions-<n>.parquet or .arrow), one
+  row group / record batch per chunk, together a dataset readable by
+  pyarrow.dataset or pandas (requires the pyarrow package)
+- .export.json: exported root, number of runs and rows, and the size,
+  modification time and content hash of every exported project file
+
+An incremental export only appends the sessions added or changed since the
+last run; the rows of a changed file are appended again with the next run
+number, so that the rows of the highest run of a file supersede the others.
+verify_export() reads every output file back and checks its columns and
+its number of rows against the manifest. From the src directory::
+
+    python -m core.export ../projects ../projects/autosave -o ../exports --format csv --incremental
+    python -m core.export -o ../exports --verify
+"""
+
+import argparse
+import csv
+import glob
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from . import cache
+from .compare import project_files, session_time, session_glider
+from .model import side_list
+from .project_file import LazyProject, ProjectFileError
+
+formats = ["csv", "parquet", "arrow"]
+text_columns = ["file", "date", "glider", "identification", "line", "side"]
+number_columns = ["theoretical", "measured", "deviation", "offset"]
+columns = ["run"] + text_columns + number_columns
+manifest_name = ".export.json"
+# Change when the columns change: the next export then rewrites everything
+manifest_version = 2
+csv_name = "sessions.csv"
+default_chunk_rows = 50000
+
+
+class ExportError(Exception):
+    pass
+
+
+def session_columns(project, root, run=1):
+    """Column arrays of the rows of a LazyProject, line by line, left then right side."""
+    table = project.table()
+    n = len(table)
+    measured = np.where(table.mask, table.measured, np.nan)
+    filename = os.path.relpath(os.path.abspath(project.filename), root).replace(os.sep, "/")
+    return dict(run=np.full(2*n, run, dtype=np.int64),
+                file=np.full(2*n, filename, dtype=object),
+                date=np.full(2*n, time.strftime("%Y-%m-%d", time.localtime(session_time(project))), dtype=object),
+                glider=np.full(2*n, session_glider(project), dtype=object),
+                identification=np.full(2*n, project.header.get("identification", ""), dtype=object),
+                line=np.repeat(np.array(table.keys, dtype=object), 2),
+                side=np.tile(np.array(side_list, dtype=object), n),
+                theoretical=table.reference.ravel(),
+                measured=measured.ravel(),
+                deviation=(measured - table.reference - table.offset).ravel(),
+                offset=np.full(2*n, table.offset))
+
+
+def read_sessions(filenames, root, run=1, done=None, log=print):
+    """
+    Yield the column arrays of the sessions of the project files, skipping
+    the unreadable ones; done(filename) is called once a file was read.
+    """
+    for filename in filenames:
+        try:
+            project_columns = session_columns(LazyProject(filename), root, run)
+        except (OSError, ValueError, KeyError, ProjectFileError) as e:
+            log("Skipped %s: %s"%(filename, e))
+            continue
+        if done is not None:
+            done(filename)
+        yield project_columns
+
+
+def chunked(sessions, chunk_rows=default_chunk_rows):
+    """Gather the column arrays of sessions into chunks of at most chunk_rows rows."""
+    pending, n_pending = list(), 0
+    for session in sessions:
+        start, n = 0, len(session["line"])
+        while start < n:
+            take = min(n-start, chunk_rows-n_pending)
+            pending.append(dict((name, array[start:start+take]) for name, array in session.items()))
+            n_pending += take
+            start += take
+            if n_pending == chunk_rows:
+                yield dict((name, np.concatenate([part[name] for part in pending])) for name in columns)
+                pending, n_pending = list(), 0
+    if n_pending > 0:
+        yield dict((name, np.concatenate([part[name] for part in pending])) for name in columns)
+
+
+class CsvWriter(object):
+    """Rows appended to a CSV file, with a header line when the file is new."""
+    def __init__(self, filename, append=False):
+        new = not (append and os.path.isfile(filename))
+        self.file = open(filename, "w" if new else "a", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.file)
+        if new:
+            self.writer.writerow(columns)
+
+    def write(self, chunk):
+        numbers = [np.char.mod("%.1f", chunk[name]).astype(object) for name in number_columns]
+        for values in numbers:
+            values[values == "nan"] = ""
+        self.writer.writerows(zip(*([chunk["run"]] + [chunk[name] for name in text_columns] + numbers)))
+
+    def close(self):
+        self.file.close()
+
+
+def import_pyarrow(fmt):
+    """The pyarrow module, optional: only needed by the Parquet and Arrow formats."""
+    try:
+        import pyarrow
+    except ImportError:
+        raise ExportError("The %s format requires the pyarrow package (pip install pyarrow)"%fmt)
+    return pyarrow
+
+
+class ArrowWriter(object):
+    """Chunks written as the row groups of a Parquet file or the record batches of an Arrow file."""
+    def __init__(self, filename, fmt):
+        pyarrow = import_pyarrow(fmt)
+        self.pa = pyarrow
+        self.schema = pyarrow.schema([("run", pyarrow.int64())] +
+                                     [(name, pyarrow.string()) for name in text_columns] +
+                                     [(name, pyarrow.float64()) for name in number_columns])
+        if fmt == "parquet":
+            import pyarrow.parquet
+            self.writer = pyarrow.parquet.ParquetWriter(filename, self.schema)
+        else:
+            import pyarrow.ipc
+            self.sink = pyarrow.OSFile(filename, "wb")
+            self.writer = pyarrow.ipc.new_file(self.sink, self.schema)
+
+    def write(self, chunk):
+        self.writer.write_table(self.pa.Table.from_pydict(dict((name, chunk[name]) for name in columns), schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+        if hasattr(self, "sink"):
+            self.sink.close()
+
+
+def _fileEntry(filename):
+    stat = os.stat(filename)
+    return dict(size=stat.st_size, mtime=stat.st_mtime, hash=cache.file_hash(filename))
+
+
+def _isExported(entry, filename):
+    if entry is None:
+        return False
+    stat = os.stat(filename)
+    if entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+        return True
+    return entry["hash"] == cache.file_hash(filename)
+
+
+def _outputFiles(output_dir, fmt):
+    if fmt == "csv":
+        return [os.path.join(output_dir, csv_name)]
+    return sorted(glob.glob(os.path.join(output_dir, "sessions-*.%s"%fmt)))
+
+
+def export_sessions(filenames, output_dir, fmt="csv", incremental=False, chunk_rows=default_chunk_rows, log=print, root=None):
+    """
+    Export the sessions of the project files to output_dir, only those added
+    or changed since the last run if incremental. The file column is the
+    path relative to root, by default the one of the previous exports or
+    the common directory of the files. Returns the exported files.
+    """
+    if not fmt in formats:
+        raise ExportError("Unknown export format '%s'"%fmt)
+    if fmt != "csv":
+        import_pyarrow(fmt)
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_filename = os.path.join(output_dir, manifest_name)
+    manifest = None
+    if incremental and os.path.isfile(manifest_filename):
+        with open(manifest_filename, "r") as f: manifest = json.load(f)
+        if manifest.get("version") != manifest_version:
+            log("'%s' holds an export of older columns, exporting everything again"%output_dir)
+            manifest, incremental = None, False
+        elif manifest["format"] != fmt:
+            raise ExportError("'%s' holds a %s export, not %s"%(output_dir, manifest["format"], fmt))
+        elif root is not None and os.path.abspath(root) != manifest["root"]:
+            raise ExportError("'%s' holds an export of the files of '%s', not '%s'"%(output_dir, manifest["root"], root))
+    if manifest is None:
+        incremental = False
+        if root is None:
+            root = os.path.commonpath([os.path.dirname(os.path.abspath(filename)) for filename in filenames]) if len(filenames) > 0 else "."
+        manifest = dict(version=manifest_version, format=fmt, root=os.path.abspath(root), run=0, rows=0, files=dict())
+    files = manifest["files"]
+    todo = [filename for filename in filenames if not (incremental and _isExported(files.get(os.path.abspath(filename)), filename))]
+    if len(todo) == 0:
+        return list()
+
+    run = manifest["run"] + 1
+    if fmt == "csv":
+        writer = CsvWriter(os.path.join(output_dir, csv_name), append=incremental)
+    else:
+        parts = _outputFiles(output_dir, fmt)
+        if not incremental:
+            for part in parts: os.remove(part)
+            parts = list()
+        writer = ArrowWriter(os.path.join(output_dir, "sessions-%05i.%s"%(len(parts), fmt)), fmt)
+    exported, rows = list(), 0
+    try:
+        for chunk in chunked(read_sessions(todo, manifest["root"], run, exported.append, log), chunk_rows):
+            writer.write(chunk)
+            rows += len(chunk["run"])
+    finally:
+        writer.close()
+    for filename in exported:
+        files[os.path.abspath(filename)] = _fileEntry(filename)
+    manifest["run"], manifest["rows"] = run, manifest["rows"] + rows
+    with open(manifest_filename, "w") as f: json.dump(manifest, f, indent=1)
+    return exported
+
+
+def verify_export(output_dir):
+    """
+    Read every file of the export in output_dir back, check their columns
+    and their total number of rows against the manifest. Returns the number
+    of rows, raises ExportError when the export does not match.
+    """
+    manifest_filename = os.path.join(output_dir, manifest_name)
+    if not os.path.isfile(manifest_filename):
+        raise ExportError("'%s' holds no export"%output_dir)
+    with open(manifest_filename, "r") as f: manifest = json.load(f)
+    fmt = manifest["format"]
+    rows = 0
+    for filename in _outputFiles(output_dir, fmt):
+        if fmt == "csv":
+            with open(filename, "r", newline="", encoding="utf-8") as f:
+                reader = csv.reader(f)
+                names = next(reader, [])
+                for row in reader:
+                    if len(row) != len(columns):
+                        raise ExportError("%s: row %i has %i columns instead of %i"%(filename, rows+1, len(row), len(columns)))
+                    rows += 1
+        else:
+            pyarrow = import_pyarrow(fmt)
+            if fmt == "parquet":
+                import pyarrow.parquet
+                data = pyarrow.parquet.ParquetFile(filename)
+                names = data.schema_arrow.names
+                batches = (data.read_row_group(k) for k in range(data.num_row_groups))
+            else:
+                import pyarrow.ipc
+                data = pyarrow.ipc.open_file(pyarrow.memory_map(filename))
+                names = data.schema.names
+                batches = (data.get_batch(k) for k in range(data.num_record_batches))
+            for batch in batches:
+                rows += batch.num_rows
+        if list(names) != columns:
+            raise ExportError("%s: columns %s instead of %s"%(filename, ", ".join(names), ", ".join(columns)))
+    if rows != manifest["rows"]:
+        raise ExportError("'%s' holds %i rows, the manifest %i"%(output_dir, rows, manifest["rows"]))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the measurements of LineTrim projects to CSV, Parquet or Arrow files.")
+    parser.add_argument("paths", nargs="*", help="Project files (.ltf) or directories of project files")
+    parser.add_argument("-o", "--output", default="exports", help="Output directory")
+    parser.add_argument("--format", default="csv", choices=formats, help="Output format")
+    parser.add_argument("-i", "--incremental", action="store_true", help="Only append the sessions added or changed since the last export")
+    parser.add_argument("--root", help="Directory the file column is relative to (default: common directory of the paths)")
+    parser.add_argument("--chunk-rows", type=int, default=default_chunk_rows, help="Rows written at once")
+    parser.add_argument("--verify", action="store_true", help="Read the export back and check it against its manifest")
+    args = parser.parse_args(argv)
+    if len(args.paths) == 0 and not args.verify:
+        parser.error("no project to export")
+
+    try:
+        if len(args.paths) > 0:
+            t0 = time.perf_counter()
+            exported = export_sessions(project_files(args.paths), args.output, args.format, args.incremental, args.chunk_rows, root=args.root)
+            print("%i session(s) exported to %s in %0.1f s"%(len(exported), args.output, time.perf_counter()-t0))
+        if args.verify:
+            print("%i rows read back from %s"%(verify_export(args.output), args.output))
+    except (OSError, ValueError, ExportError) as e:
+        print(e)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
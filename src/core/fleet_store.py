@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+"""
+Local SQLite store of the measurement sessions of every glider.
+
+The project files stay the reference; the store indexes their content so
+that questions across the whole archive (e.g. which Ozone Geo5 S wings have
+B lines more than 20 mm short) are answered by one indexed query instead of
+opening every file. Three tables:
+
+- gliders: one row per glider model (manufacturer, model, size)
+- sessions: one row per project file, with its identification, date,
+  offset and the modification time and size used to skip unchanged files
+- measurements: one row per measured line and side, with the theoretical
+  and measured lengths and the deviation relative to the session offset
+
+The archive is imported in batched transactions, and the autosave writes
+every snapshot it saves (see AutoSaver). From the src directory::
+
+    python -m core.fleet_store ingest ../projects ../projects/autosave
+    python -m core.fleet_store lines --glider Ozone_Geo5_S --row B --below -20
+    python -m core.fleet_store sessions --glider Supair_Savage_S
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+import numpy as np
+
+from .compare import NamedHeader, project_files, session_glider, session_time, wing_name
+from .glider_library import describe
+from .model import side_list
+from .project_file import LazyProject, ProjectFileError
+
+store_version = 1
+default_name = "fleet.sqlite"
+# Number of project files per transaction of an import
+batch_size = 200
+
+_schema = """
+CREATE TABLE IF NOT EXISTS gliders (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    manufacturer TEXT NOT NULL,
+    model TEXT NOT NULL,
+    size TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    glider_id INTEGER NOT NULL REFERENCES gliders(id),
+    filename TEXT NOT NULL UNIQUE,
+    identification TEXT NOT NULL,
+    wing TEXT NOT NULL,
+    date TEXT NOT NULL,
+    mtime_ns INTEGER,
+    file_size INTEGER,
+    offset REAL,
+    n_measured INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS measurements (
+    session_id INTEGER NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,
+    line TEXT NOT NULL,
+    row_name TEXT NOT NULL,
+    number INTEGER NOT NULL,
+    side INTEGER NOT NULL,
+    reference REAL NOT NULL,
+    measured REAL NOT NULL,
+    deviation REAL NOT NULL,
+    PRIMARY KEY (session_id, line, side)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS gliders_model ON gliders(manufacturer, model, size);
+CREATE INDEX IF NOT EXISTS sessions_glider ON sessions(glider_id, date);
+CREATE INDEX IF NOT EXISTS sessions_wing ON sessions(wing, date);
+CREATE INDEX IF NOT EXISTS measurements_row ON measurements(row_name, deviation);
+"""
+
+
+class FleetStore(object):
+    """
+    Connection to a store file, usable from several threads (the autosave
+    worker writes while the UI thread queries).
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(filename, check_same_thread=False)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        version, = self.connection.execute("PRAGMA user_version").fetchone()
+        if version > store_version:
+            raise ValueError("Fleet store version %i is newer than supported version %i"%(version, store_version))
+        with self.connection:
+            self.connection.executescript(_schema)
+            self.connection.execute("PRAGMA user_version = %i"%store_version)
+        self._glider_ids = dict()
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
+
+    def _gliderId(self, name):
+        if not name in self._glider_ids:
+            manufacturer, model, size = describe(name)
+            self.connection.execute("INSERT OR IGNORE INTO gliders (name, manufacturer, model, size) VALUES (?, ?, ?, ?)",
+                                    (name, manufacturer, model, size))
+            self._glider_ids[name], = self.connection.execute("SELECT id FROM gliders WHERE name = ?", (name,)).fetchone()
+        return self._glider_ids[name]
+
+    def _writeSession(self, filename, header, glider, date, table_arrays, stat):
+        """Replace the session of filename, within the caller's transaction."""
+        keys = table_arrays["keys"]
+        measured = np.asarray(table_arrays["measured"], dtype=np.float64)
+        if "reference" in table_arrays:
+            reference = np.asarray(table_arrays["reference"], dtype=np.float64)
+        else:
+            reference = np.repeat(np.asarray(table_arrays["line_length"], dtype=np.float64)[:, None], measured.shape[1], axis=1)
+        mask = measured != 0
+        raw = measured - reference
+        offset = float(raw[mask].mean()) if mask.any() else None
+        row_names = header["row_names"]
+
+        self.connection.execute("DELETE FROM sessions WHERE filename = ?", (filename,))
+        cursor = self.connection.execute(
+            "INSERT INTO sessions (glider_id, filename, identification, wing, date, mtime_ns, file_size, offset, n_measured) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (self._gliderId(glider), filename, header.get("identification", ""), wing_name(header), date,
+             stat.st_mtime_ns if stat is not None else None, stat.st_size if stat is not None else None,
+             offset, int(np.count_nonzero(mask))))
+        session_id = cursor.lastrowid
+        lines, sides = np.nonzero(mask)
+        rows, numbers = table_arrays["row"], table_arrays["number"]
+        deviation = raw - (offset or 0.)
+        self.connection.executemany(
+            "INSERT INTO measurements (session_id, line, row_name, number, side, reference, measured, deviation) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            ((session_id, str(keys[i]), row_names[rows[i]] if rows[i] >= 0 else "", int(numbers[i]), int(side),
+              float(reference[i, side]), float(measured[i, side]), float(deviation[i, side]))
+             for i, side in zip(lines.tolist(), sides.tolist())))
+        return session_id
+
+    def _isCurrent(self, filename, stat):
+        row = self.connection.execute("SELECT mtime_ns, file_size FROM sessions WHERE filename = ?", (filename,)).fetchone()
+        return row is not None and row[0] == stat.st_mtime_ns and row[1] == stat.st_size
+
+    def record(self, filename, project):
+        """
+        Store a project dictionary (as written by dump_project) saved as
+        filename, e.g. right after the autosave wrote it.
+        """
+        filename = os.path.abspath(filename)
+        table = project["table"]
+        header = dict(identification=project.get("identification", ""), glider=project.get("glider", ""),
+                      date=project.get("date") or time.strftime("%Y-%m-%d %H:%M:%S"), row_names=table.row_names)
+        glider, date = _session(NamedHeader(filename, header))
+        stat = os.stat(filename) if os.path.isfile(filename) else None
+        with self._lock, self.connection:
+            self._writeSession(filename, header, glider, date, table.arrays(), stat)
+
+    def ingest(self, paths, force=False):
+        """
+        Import the project files and directories given, in transactions of
+        batch_size files. Files whose modification time and size did not
+        change since their import are skipped unless force. Returns
+        (imported, skipped, errors) with errors a dictionary filename -> message.
+        """
+        imported, skipped, errors = 0, 0, dict()
+        filenames = [os.path.abspath(filename) for filename in project_files(paths)]
+        for start in range(0, len(filenames), batch_size):
+            with self._lock, self.connection:
+                for filename in filenames[start:start+batch_size]:
+                    try:
+                        stat = os.stat(filename)
+                        if not force and self._isCurrent(filename, stat):
+                            skipped += 1
+                            continue
+                        session = LazyProject(filename)
+                        glider, date = _session(session)
+                        self._writeSession(filename, session.header, glider, date, session.body, stat)
+                        imported += 1
+                    except (OSError, ValueError, KeyError, ProjectFileError) as e:
+                        errors[filename] = str(e)
+        return imported, skipped, errors
+
+    def prune(self):
+        """Remove the sessions whose file no longer exists, returns their number."""
+        with self._lock, self.connection:
+            missing = [(filename,) for filename, in self.connection.execute("SELECT filename FROM sessions")
+                       if not os.path.isfile(filename)]
+            self.connection.executemany("DELETE FROM sessions WHERE filename = ?", missing)
+        return len(missing)
+
+    def _select(self, sql, parameters):
+        with self._lock:
+            return self.connection.execute(sql, parameters).fetchall()
+
+    def gliders(self):
+        """(name, number of sessions, number of wings) of every glider model."""
+        return self._select("SELECT g.name, COUNT(s.id), COUNT(DISTINCT s.wing) FROM gliders g "
+                            "LEFT JOIN sessions s ON s.glider_id = g.id GROUP BY g.id ORDER BY g.manufacturer, g.model, g.size", ())
+
+    def sessions(self, glider=None, wing=None):
+        """(date, glider, wing, offset, measured sides, filename) of the sessions, by date."""
+        where, parameters = self._filters(glider=glider, wing=wing)
+        return self._select("SELECT s.date, g.name, s.wing, s.offset, s.n_measured, s.filename FROM sessions s "
+                            "JOIN gliders g ON g.id = s.glider_id%s ORDER BY s.date"%where, parameters)
+
+    def lines(self, glider=None, wing=None, row=None, side=None, below=None, above=None, latest=True):
+        """
+        Measured lines matching the filters, as (date, glider, wing, line,
+        side name, reference, measured, deviation) sorted by deviation.
+        below/above bound the deviation (mm, e.g. below=-20 for lines more
+        than 20 mm short); with latest, only the last session of each wing.
+        """
+        where, parameters = self._filters(glider=glider, wing=wing, row=row, side=side, below=below, above=above, latest=latest)
+        rows = self._select("SELECT s.date, g.name, s.wing, m.line, m.side, m.reference, m.measured, m.deviation "
+                            "FROM measurements m JOIN sessions s ON s.id = m.session_id JOIN gliders g ON g.id = s.glider_id"
+                            "%s ORDER BY m.deviation"%where, parameters)
+        return [row[:4] + (side_list[row[4]],) + row[5:] for row in rows]
+
+    def _filters(self, glider=None, wing=None, row=None, side=None, below=None, above=None, latest=False):
+        conditions, parameters = list(), list()
+        if glider is not None:
+            conditions.append("g.name = ?")
+            parameters.append(glider)
+        if wing is not None:
+            conditions.append("s.wing LIKE ?")
+            parameters.append("%%%s%%"%wing)
+        if row is not None:
+            conditions.append("m.row_name = ?")
+            parameters.append(row)
+        if side is not None:
+            conditions.append("m.side = ?")
+            parameters.append(side_list.index(side) if side in side_list else int(side))
+        if below is not None:
+            conditions.append("m.deviation < ?")
+            parameters.append(below)
+        if above is not None:
+            conditions.append("m.deviation > ?")
+            parameters.append(above)
+        if latest:
+            conditions.append("s.date = (SELECT MAX(t.date) FROM sessions t WHERE t.wing = s.wing AND t.glider_id = s.glider_id)")
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+        return where, parameters
+
+    def explain(self, sql, parameters=()):
+        """Query plan of a statement, to check that it runs from the indexes."""
+        return [row[-1] for row in self._select("EXPLAIN QUERY PLAN " + sql, parameters)]
+
+
+def _session(project):
+    """(glider, date) stored for a LazyProject, the same whether recorded or ingested."""
+    return session_glider(project), time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(session_time(project)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fleet-wide store of the measurement sessions.")
+    parser.add_argument("--store", default=os.path.join("..", "projects", default_name), help="Store file (default: %(default)s)")
+    commands = parser.add_subparsers(dest="command")
+    ingest = commands.add_parser("ingest", help="Import project files and directories")
+    ingest.add_argument("paths", nargs="+")
+    ingest.add_argument("--force", action="store_true", help="Import the unchanged files again")
+    ingest.add_argument("--prune", action="store_true", help="Remove the sessions whose file was deleted")
+    commands.add_parser("gliders", help="List the glider models")
+    sessions = commands.add_parser("sessions", help="List the sessions")
+    lines = commands.add_parser("lines", help="Find measured lines")
+    for command in (sessions, lines):
+        command.add_argument("--glider", help="Glider model, e.g. Ozone_Geo5_S")
+        command.add_argument("--wing", help="Text of the glider and serial number")
+    lines.add_argument("--row", help="Row name, e.g. B")
+    lines.add_argument("--side", choices=side_list)
+    lines.add_argument("--below", type=float, help="Deviation below (mm), e.g. -20")
+    lines.add_argument("--above", type=float, help="Deviation above (mm)")
+    lines.add_argument("--all-sessions", action="store_true", help="Not only the last session of each wing")
+    lines.add_argument("--plan", action="store_true", help="Print the query plan")
+    args = parser.parse_args(argv)
+
+    store = FleetStore(args.store)
+    t0 = time.perf_counter()
+    if args.command == "ingest":
+        imported, skipped, errors = store.ingest(args.paths, args.force)
+        removed = store.prune() if args.prune else 0
+        print("%i session(s) imported, %i unchanged, %i removed in %0.1f ms"%(imported, skipped, removed, 1e3*(time.perf_counter()-t0)))
+        for filename, message in errors.items():
+            print("%s: %s"%(filename, message))
+    elif args.command == "gliders":
+        for name, n_sessions, n_wings in store.gliders():
+            print("%-28s %3i session(s) %3i wing(s)"%(name, n_sessions, n_wings))
+    elif args.command == "sessions":
+        for date, glider, wing, offset, n_measured, filename in store.sessions(args.glider, args.wing):
+            print("%s  %-24s %-40s offset %s  %3i sides  %s"%(date[:10], glider, wing, "%+6.1f"%offset if offset is not None else "     -",
+                                                              n_measured, os.path.basename(filename)))
+    elif args.command == "lines":
+        if args.plan:
+            where, parameters = store._filters(args.glider, args.wing, args.row, args.side, args.below, args.above, not args.all_sessions)
+            for step in store.explain("SELECT m.line FROM measurements m JOIN sessions s ON s.id = m.session_id "
+                                      "JOIN gliders g ON g.id = s.glider_id" + where, parameters):
+                print("plan: %s"%step)
+        results = store.lines(args.glider, args.wing, args.row, args.side, args.below, args.above, not args.all_sessions)
+        for date, glider, wing, line, side, reference, measured, deviation in results:
+            print("%s  %-40s %5s %-5s %7.0f %7.0f %+6.1f mm"%(date[:10], wing or glider, line, side, reference, measured, deviation))
+        print("%i line(s) in %0.1f ms"%(len(results), 1e3*(time.perf_counter()-t0)))
+    else:
+        parser.print_help()
+    store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
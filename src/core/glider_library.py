@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+Library of the glider specifications of data/gliders.
+
+The directory is scanned once and every specification is parsed into a
+LineTable whose arrays are stored in the disk cache under the hash of the
+file content. The index of the library (modification time, size, hash and
+description of every file) is cached as well, so that a later scan only
+stats the files and parses the changed ones, and selecting a glider is a
+lookup of its arrays.
+
+File names are read as Manufacturer_Model_Size, e.g. Ozone_BuzzZ3_S.txt.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sys
+from collections import namedtuple
+
+import numpy as np
+
+from . import cache
+from .model import LineTable
+from .spec_file import load_spec
+
+index_version = 2
+spec_suffix = ".txt"
+
+# Sizes in increasing order, numeric sizes (e.g. 23, 25) are sorted after
+size_list = ["XXS", "XS", "S", "SM", "MS", "M", "ML", "L", "XL", "XXL"]
+size_pattern = re.compile(r"^(%s|\d{2,3})$"%"|".join(size_list), re.IGNORECASE)
+
+GliderEntry = namedtuple("GliderEntry", ["name", "manufacturer", "model", "size", "filename", "hash", "n_lines", "row_names"])
+
+
+def describe(name):
+    """(manufacturer, model, size) of a specification named e.g. 'Ozone_BuzzZ3_S'."""
+    parts = name.split("_")
+    size = parts.pop() if len(parts) > 1 and size_pattern.match(parts[-1]) else ""
+    manufacturer = parts.pop(0) if len(parts) > 1 else ""
+    return manufacturer, " ".join(parts), size
+
+
+def size_rank(size):
+    if size.upper() in size_list:
+        return (0, size_list.index(size.upper()))
+    if size.isdigit():
+        return (1, int(size))
+    return (2, 0)
+
+
+def sort_key(entry):
+    return (entry.manufacturer.lower(), entry.model.lower(), size_rank(entry.size), entry.name)
+
+
+class GliderLibrary(object):
+    """
+    Index of the specifications of a directory, parsed with parser(filename)
+    which returns a LineTable.
+    """
+    def __init__(self, directory, parser=load_spec):
+        self.directory = os.path.abspath(directory)
+        self.parser = parser
+        self.entries = dict()       # filename -> GliderEntry
+        self.errors = dict()        # filename -> message of the last parse failure
+        self.tree = dict()          # manufacturer -> model -> list of entries by size
+        self.scanned = False
+        self.n_parsed = 0
+        self._records = None        # filename -> cached index record
+        self._dirty = False
+        self._tables = dict()       # hash -> LineTable
+        self._search_keys = dict()  # filename -> lower case words of the entry
+        digest = hashlib.sha1(self.directory.encode("utf-8")).hexdigest()[:16]
+        self.index_name = "library-%s.json"%digest
+
+    def _readIndex(self):
+        try:
+            with open(cache.cache_path(self.index_name), "r") as f:
+                index = json.load(f)
+            if index.get("version") == index_version:
+                return index["files"]
+        except (OSError, ValueError, KeyError):
+            pass
+        return dict()
+
+    def _writeIndex(self):
+        if self._dirty:
+            index = dict(version=index_version, files=self._records)
+            cache.write_cache(self.index_name, lambda f: json.dump(index, f), mode="w")
+            self._dirty = False
+
+    def _specName(self, digest):
+        return "spec-%s.npz"%digest
+
+    def _storeTable(self, digest, table):
+        self._tables[digest] = table
+        cache.write_cache(self._specName(digest), lambda f: np.savez(f, row_names=np.array(table.row_names, dtype=str),
+                                                                      **table.arrays(measured=False)))
+
+    def _loadTable(self, digest):
+        if not digest in self._tables:
+            with np.load(cache.cache_path(self._specName(digest)), allow_pickle=False) as data:
+                arrays = dict((name, data[name]) for name in data.files)
+            self._tables[digest] = LineTable.from_arrays(arrays.pop("row_names").tolist(), arrays)
+        return self._tables[digest]
+
+    def _isCached(self, digest):
+        return digest in self._tables or os.path.isfile(cache.cache_path(self._specName(digest)))
+
+    def update(self, filename):
+        """
+        Entry of a specification file, parsed again only if its content
+        changed since it was cached. Raises the parser errors.
+        """
+        filename = os.path.abspath(filename)
+        if self._records is None:
+            self._records = self._readIndex()
+        stat = os.stat(filename)
+        key = [stat.st_mtime_ns, stat.st_size]
+        record = self._records.get(filename)
+        if record is None or record["stat"] != key or not self._isCached(record["hash"]):
+            digest = cache.file_hash(filename)
+            if record is None or record["hash"] != digest or not self._isCached(digest):
+                table = self.parser(filename)
+                self._storeTable(digest, table)
+                self.n_parsed += 1
+                name = os.path.splitext(os.path.basename(filename))[0]
+                manufacturer, model, size = describe(name)
+                record = dict(name=name, manufacturer=manufacturer, model=model, size=size,
+                              n_lines=len(table), row_names=table.row_names)
+            record = dict(record, stat=key, hash=digest)
+            self._records[filename] = record
+            self._dirty = True
+        self.errors.pop(filename, None)
+        entry = GliderEntry(filename=filename, **dict((field, record[field]) for field in GliderEntry._fields if field != "filename"))
+        self._addEntry(entry)
+        return entry
+
+    def _addEntry(self, entry):
+        self.entries[entry.filename] = entry
+        self._search_keys[entry.filename] = " ".join([entry.manufacturer, entry.model, entry.size, entry.name]).lower()
+
+    def scan(self):
+        """Index every specification of the directory, returns the number of files parsed."""
+        n_parsed = self.n_parsed
+        if self._records is None:
+            self._records = self._readIndex()
+        known = dict(self._records)
+        self.entries, self._search_keys = dict(), dict()
+        for dirpath, dirnames, filenames in os.walk(self.directory):
+            dirnames.sort()
+            for name in sorted(filenames):
+                if not name.endswith(spec_suffix):
+                    continue
+                filename = os.path.join(dirpath, name)
+                try:
+                    self.update(filename)
+                except Exception as e:
+                    self.errors[filename] = str(e)
+        # Forget the files which disappeared from the directory
+        for filename in known:
+            if filename.startswith(self.directory+os.path.sep) and not filename in self.entries:
+                del self._records[filename]
+                self._dirty = True
+        self.tree = dict()
+        for entry in sorted(self.entries.values(), key=sort_key):
+            self.tree.setdefault(entry.manufacturer, dict()).setdefault(entry.model, list()).append(entry)
+        self._writeIndex()
+        self.scanned = True
+        return self.n_parsed - n_parsed
+
+    def search(self, text=""):
+        """Entries containing every word of text, sorted by manufacturer, model and size."""
+        if not self.scanned:
+            self.scan()
+        words = text.lower().split()
+        return sorted((entry for filename, entry in self.entries.items() if all(word in self._search_keys[filename] for word in words)), key=sort_key)
+
+    def table(self, filename):
+        """New LineTable of a specification file, from the cache when up to date."""
+        entry = self.update(filename)
+        self._writeIndex()
+        return self._loadTable(entry.hash).copy()
+
+
+if __name__ == "__main__":
+    library = GliderLibrary(sys.argv[1] if len(sys.argv) > 1 else os.path.join("..", "data", "gliders"))
+    print("%i specification(s) parsed"%library.scan())
+    for filename, message in library.errors.items():
+        print("%s: %s"%(filename, message))
+    for entry in library.search(" ".join(sys.argv[2:])):
+        print("%-12s %-16s %-4s %4i lines  %s"%(entry.manufacturer, entry.model, entry.size, entry.n_lines, entry.filename))
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+Undo/redo history of the measurement edits of a session.
+
+Every edit stores the line (index, side), the value it replaced and the
+value it stored, 0 meaning no measurement, with the spreads of their
+readings. Edits are kept in a ring buffer
+of fixed capacity (preallocated arrays), so push, undo, redo and access to
+any edit are O(1) and the memory is bounded: past the capacity, the oldest
+edits are forgotten. Undoing then editing drops the edits which could have
+been redone, as in any editor.
+
+The table itself always holds the current values, so moving to any line to
+measure it again needs no replay. The history is saved with every project
+snapshot (arrays(), restore()), and the autosave journal records the undos
+and redos along with the measurements made since: replay_journal() applies
+them on top of the restored history after a crash.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+default_capacity = 1000
+# Prefix of the history arrays in a project file body
+array_prefix = "history_"
+_fields = ["index", "side", "old", "new", "old_spread", "new_spread"]
+
+Edit = namedtuple("Edit", ["index", "side", "old", "new", "old_spread", "new_spread"])
+
+
+class History(object):
+    """Bounded history of the measurement edits of a LineTable."""
+    def __init__(self, capacity=default_capacity):
+        self.capacity = capacity
+        self._index = np.zeros(capacity, dtype=np.int32)
+        self._side = np.zeros(capacity, dtype=np.int8)
+        self._old = np.zeros(capacity, dtype=np.float64)
+        self._new = np.zeros(capacity, dtype=np.float64)
+        self._old_spread = np.zeros(capacity, dtype=np.float64)
+        self._new_spread = np.zeros(capacity, dtype=np.float64)
+        self.clear()
+
+    def clear(self):
+        self._start = 0         # slot of the oldest edit
+        self._size = 0          # number of edits kept
+        self._applied = 0       # number of edits applied, the others can be redone
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def can_undo(self):
+        return self._applied > 0
+
+    @property
+    def can_redo(self):
+        return self._applied < self._size
+
+    def __getitem__(self, k):
+        """Edit k, from the oldest kept one."""
+        if k < 0: k += self._size
+        if not 0 <= k < self._size:
+            raise IndexError("edit %i out of the history"%k)
+        slot = (self._start + k)%self.capacity
+        return Edit(int(self._index[slot]), int(self._side[slot]), float(self._old[slot]), float(self._new[slot]),
+                    float(self._old_spread[slot]), float(self._new_spread[slot]))
+
+    def push(self, index, side, old, new, old_spread=0., new_spread=0.):
+        """Record an edit of line (index, side) from old to new, and of the spreads of their readings."""
+        if self._applied == self.capacity:
+            # Full: forget the oldest edit
+            self._start = (self._start + 1)%self.capacity
+            self._applied -= 1
+        slot = (self._start + self._applied)%self.capacity
+        self._index[slot], self._side[slot] = index, side
+        self._old[slot], self._new[slot] = old, new
+        self._old_spread[slot], self._new_spread[slot] = old_spread, new_spread
+        self._applied += 1
+        self._size = self._applied
+
+    def arrays(self):
+        """Copy of the kept edits as arrays named array_prefix + field, oldest first, with the number applied."""
+        slots = (self._start + np.arange(self._size))%self.capacity
+        arrays = dict((array_prefix + field, getattr(self, "_" + field)[slots]) for field in _fields)
+        arrays[array_prefix + "applied"] = np.array(self._applied)
+        return arrays
+
+    def restore(self, arrays):
+        """Replace the edits by those of arrays(), keeping the most recent ones past the capacity."""
+        self.clear()
+        size = len(arrays[array_prefix + "index"])
+        applied = int(arrays[array_prefix + "applied"])
+        start = max(0, size - self.capacity)
+        for field in _fields:
+            getattr(self, "_" + field)[:size-start] = arrays[array_prefix + field][start:]
+        self._size = size - start
+        self._applied = max(0, applied - start)
+
+    def undo(self):
+        """Step back, returns the edit to revert (set its old value and spread) or None."""
+        if not self.can_undo:
+            return None
+        self._applied -= 1
+        return self[self._applied]
+
+    def redo(self):
+        """Step forward, returns the edit to apply again (set its new value and spread) or None."""
+        if not self.can_redo:
+            return None
+        self._applied += 1
+        return self[self._applied-1]
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+In-process measurement sources.
+
+A source (laser meter, fake device...) runs in its own thread and pushes
+readings into a MeasurementQueue. Each reading gets a sequence number and a
+timestamp; the consumer (the UI thread) is woken up by the queue callback
+and drains every pending reading at once, so bursts are never interleaved
+with keyboard input or lost.
+"""
+
+import collections
+import itertools
+import threading
+import time
+
+import numpy as np
+
+Measurement = collections.namedtuple("Measurement", ["value", "timestamp", "seq", "source"])
+
+
+class MeasurementQueue(object):
+    """Thread-safe FIFO of Measurement, values in mm, unbounded so that no reading is dropped."""
+    def __init__(self, on_put=None):
+        self.on_put = on_put
+        self._queue = collections.deque()
+        self._lock = threading.Lock()
+        self._seq = itertools.count(1)
+
+    def put(self, value, source="", timestamp=None):
+        if timestamp is None: timestamp = time.time()
+        with self._lock:
+            measurement = Measurement(float(value), timestamp, next(self._seq), source)
+            self._queue.append(measurement)
+        if self.on_put is not None:
+            self.on_put()
+        return measurement
+
+    def get_all(self):
+        """Remove and return every pending measurement, oldest first."""
+        with self._lock:
+            measurements = list(self._queue)
+            self._queue.clear()
+        return measurements
+
+    def __len__(self):
+        return len(self._queue)
+
+
+class MeasurementSource(object):
+    """Base class of the sources feeding a MeasurementQueue from a thread."""
+    name = "source"
+
+    def __init__(self):
+        self.queue = None
+        self.thread = None
+        self.running = False
+        self.error = None
+
+    def start(self, queue):
+        self.queue = queue
+        self.running = True
+        self.thread = threading.Thread(target=self._runSafe, name=self.name, daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=2.):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    def _runSafe(self):
+        try:
+            self.run()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.running = False
+
+    def run(self):
+        raise NotImplementedError
+
+
+class FakeDevice(MeasurementSource):
+    """Stream the given values (mm) at a fixed rate, for tests and benchmarks."""
+    name = "fake"
+
+    def __init__(self, values, rate=10.):
+        super(FakeDevice, self).__init__()
+        self.values = values
+        self.rate = rate
+
+    def run(self):
+        period = 1./self.rate if self.rate > 0 else 0.
+        next_time = time.perf_counter()
+        for value in self.values:
+            if not self.running:
+                break
+            if period > 0:
+                next_time += period
+                delay = next_time - time.perf_counter()
+                if delay > 0: time.sleep(delay)
+            self.queue.put(value, self.name)
+
+
+def synthetic_readings(table, noise=5., order=None, seed=None):
+    """
+    Readings (mm) of every line of a LineTable, theoretical length plus
+    normal noise, in the given order of (index, side), line by line by default.
+    """
+    rng = np.random.default_rng(seed)
+    if order is None:
+        order = [(i, side) for side in range(table.measured.shape[1]) for i in range(len(table))]
+    for i, side in order:
+        yield float(np.round(table.reference[i, side] + rng.normal(0., noise)))
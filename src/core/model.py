@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+"""
+Array-backed model of the lines of a glider.
+
+Every line is a row of a table: row index, number in the row, theoretical
+length, and measured length for each side. Lines are addressed by integer
+coordinates (index, side); the string keys such as 'A03' or 'A03_Left' are
+only used at the boundaries (display, files) through a dictionary lookup.
+
+A line may have a different theoretical length on each side (asymmetric
+wings); line_length is then the mean of the two sides and reference holds
+the length of each side. Lines also carry a display name, 'A03' by default,
+a cascade level (0 when unknown) and the index of their parent, the line of
+the lower cascade they hang from (-1 for lines attached to the riser or
+when unknown, see core/cascade.py). The spread of the readings of a
+measured length (see core/acquisition.py) is kept as its confidence, 0 when
+unknown. The number of cells and the aspect
+ratio of the wing are kept when the specification gives them (None else).
+
+The deviation of a line is its measured minus theoretical length, relative
+to the mean of this difference over all measured lines (the offset). The
+table keeps the running sum and count of the differences so that a new
+measurement updates the offset in O(1).
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+# Sides of the wing
+side_list = ["Left", "Right"]
+
+# Tolerance on the deviation (mm)
+tolerance = 24.
+
+
+def line_key(row_name, number):
+    return "%s%02i"%(row_name.replace(" ", "_"), number)
+
+
+class LineTable(object):
+    """
+    Theoretical and measured lengths of the lines of a glider, line_length
+    being one length per line or one per line and side.
+    """
+    def __init__(self, row_names, row, number, line_length, measured=None, spread=None, names=None, level=None, parent=None, cells=None, aspect_ratio=None):
+        self.row_names = list(row_names)
+        self.row = np.asarray(row, dtype=np.int16)
+        self.number = np.asarray(number, dtype=np.int16)
+        line_length = np.asarray(line_length, dtype=np.float64)
+        if line_length.ndim == 2:
+            self.reference = line_length.reshape(-1, len(side_list)).copy()
+        else:
+            self.reference = np.repeat(line_length[:, None], len(side_list), axis=1)
+        self.line_length = self.reference.mean(axis=1)
+        if measured is None:
+            measured = np.zeros((len(self.line_length), len(side_list)))
+        self.measured = np.array(measured, dtype=np.float64).reshape(len(self.line_length), len(side_list))
+        self.spread = np.zeros_like(self.measured) if spread is None else np.array(spread, dtype=np.float64).reshape(self.measured.shape)
+        self.raw_deviation = np.zeros_like(self.measured)
+        self._sum = 0.
+        self._count = 0
+        # Incremented on every change of the measurements, to key derived results
+        self.revision = 0
+        self.keys = [line_key(self.row_names[r], n) if r >= 0 else "?%02i"%n for r, n in zip(self.row.tolist(), self.number.tolist())]
+        self.index = dict((key, i) for i, key in enumerate(self.keys))
+        self.names = list(self.keys) if names is None else [str(name) for name in names]
+        self.level = np.zeros(len(self.keys), dtype=np.int8) if level is None else np.asarray(level, dtype=np.int8)
+        self.parent = np.full(len(self.keys), -1, dtype=np.int32) if parent is None else np.asarray(parent, dtype=np.int32)
+        self.cells = None if cells is None else int(cells)
+        self.aspect_ratio = None if aspect_ratio is None else float(aspect_ratio)
+        # (row, number) -> index, -1 where there is no line
+        self.grid = np.full((len(self.row_names), self.max_number+1), -1, dtype=np.int32)
+        valid = self.row >= 0
+        self.grid[self.row[valid], self.number[valid]] = np.arange(len(self.keys))[valid]
+        self.recompute()
+
+    @classmethod
+    def empty(cls):
+        return cls([], [], [], [])
+
+    @classmethod
+    def from_rows(cls, row_names, rows):
+        """Build a table from one list of theoretical lengths per row."""
+        row, number, line_length = list(), list(), list()
+        for i, lengths in enumerate(rows):
+            row.extend([i]*len(lengths))
+            number.extend(range(1, len(lengths)+1))
+            line_length.extend(lengths)
+        return cls(row_names, row, number, line_length)
+
+    @classmethod
+    def from_dicts(cls, line_length, measured_line_length, row_names):
+        """Build a table from the string-keyed dictionaries of legacy projects."""
+        keys = list(line_length)
+        row, number = list(), list()
+        for key in keys:
+            r, n = split_key(key, row_names)
+            row.append(r)
+            number.append(n)
+        table = cls(row_names, row, number, [line_length[key] for key in keys])
+        for i, key in enumerate(keys):
+            for j, side in enumerate(side_list):
+                table.measured[i, j] = measured_line_length.get("%s_%s"%(key, side), 0.)
+        return table
+
+    @classmethod
+    def from_arrays(cls, row_names, arrays):
+        """Build a table from the arrays written by arrays(), optional ones may be missing."""
+        line_length = arrays["reference"] if "reference" in arrays else arrays["line_length"]
+        return cls(row_names, arrays["row"], arrays["number"], line_length, arrays.get("measured"), arrays.get("spread"),
+                   names=arrays["names"].tolist() if "names" in arrays else None,
+                   level=arrays.get("level"), parent=arrays.get("parent"),
+                   cells=arrays.get("cells"), aspect_ratio=arrays.get("aspect_ratio"))
+
+    def arrays(self, measured=True):
+        """
+        Column arrays of the table. The per side lengths, names, levels and
+        parents are only included when they differ from the defaults, the
+        number of cells and aspect ratio (0-d arrays) when known.
+        """
+        arrays = dict(keys=np.array(self.keys, dtype=str), row=self.row, number=self.number, line_length=self.line_length)
+        if measured:
+            arrays["measured"] = self.measured
+            if np.any(self.spread != 0):
+                arrays["spread"] = self.spread
+        if self.is_asymmetric:
+            arrays["reference"] = self.reference
+        if self.names != self.keys:
+            arrays["names"] = np.array(self.names, dtype=str)
+        if np.any(self.level != 0):
+            arrays["level"] = self.level
+        if np.any(self.parent >= 0):
+            arrays["parent"] = self.parent
+        if self.cells is not None:
+            arrays["cells"] = np.array(self.cells)
+        if self.aspect_ratio is not None:
+            arrays["aspect_ratio"] = np.array(self.aspect_ratio)
+        return arrays
+
+    def copy(self):
+        return LineTable(self.row_names, self.row, self.number, self.reference, self.measured, self.spread, names=self.names, level=self.level,
+                         parent=self.parent, cells=self.cells, aspect_ratio=self.aspect_ratio)
+
+    def __len__(self):
+        return len(self.line_length)
+
+    @property
+    def max_number(self):
+        if len(self.number) == 0: return 0
+        return int(self.number.max())
+
+    @property
+    def row_size(self):
+        """Number of lines in each row."""
+        valid = self.row >= 0
+        return [int(n) for n in np.bincount(self.row[valid], minlength=len(self.row_names))]
+
+    @property
+    def is_asymmetric(self):
+        return bool(np.any(self.reference != self.reference[:, :1]))
+
+    @property
+    def mask(self):
+        """True where a length has been measured."""
+        return self.measured != 0
+
+    def find(self, row, number):
+        """Index of the line (row, number), -1 if it does not exist."""
+        if 0 <= row < self.grid.shape[0] and 0 <= number < self.grid.shape[1]:
+            return int(self.grid[row, number])
+        return -1
+
+    def side_key(self, i, side):
+        return "%s_%s"%(self.keys[i], side_list[side])
+
+    def parse_side_key(self, skey):
+        """Return (index, side) of a key such as 'A03_Left', None if unknown."""
+        key, _, side = skey.rpartition("_")
+        if key in self.index and side in side_list:
+            return self.index[key], side_list.index(side)
+        return None
+
+    def set_measurement(self, i, side, value, spread=0.):
+        """
+        Store a measured length (0 to clear it) and the spread of its
+        readings, and update the offset in O(1).
+        """
+        self.revision += 1
+        self.spread[i, side] = spread if value != 0 else 0.
+        if self.measured[i, side] != 0:
+            self._sum -= self.raw_deviation[i, side]
+            self._count -= 1
+        self.measured[i, side] = value
+        if value != 0:
+            self.raw_deviation[i, side] = value - self.reference[i, side]
+            self._sum += self.raw_deviation[i, side]
+            self._count += 1
+        else:
+            self.raw_deviation[i, side] = 0.
+
+    def recompute(self):
+        """Vectorized recomputation of the differences and running sums, e.g. after loading."""
+        self.revision += 1
+        mask = self.mask
+        self.raw_deviation = np.where(mask, self.measured - self.reference, 0.)
+        self._sum = float(self.raw_deviation.sum())
+        self._count = int(np.count_nonzero(mask))
+
+    @property
+    def n_measured(self):
+        return self._count
+
+    @property
+    def offset(self):
+        """Mean difference between measured and theoretical lengths."""
+        if self._count == 0: return 0.
+        return self._sum / self._count
+
+    def deviation_of(self, i, side):
+        if self.measured[i, side] == 0: return 0.
+        return self.raw_deviation[i, side] - self.offset
+
+    @property
+    def deviation(self):
+        """Deviation of every line relative to the offset, 0 where not measured."""
+        return np.where(self.mask, self.raw_deviation - self.offset, 0.)
+
+    def statistics(self, tolerance=tolerance):
+        """Deviation statistics of the table, see compute_statistics()."""
+        return compute_statistics(self, tolerance)
+
+
+# Statistics of a group of lines, arrays indexed by the group
+GroupStatistics = namedtuple("GroupStatistics", ["count", "mean", "std", "max_abs", "out_of_tolerance"])
+Statistics = namedtuple("Statistics", ["offset", "row_side", "row", "side", "symmetry", "total"])
+
+
+def _group_statistics(values, groups, n_groups, tolerance):
+    count = np.bincount(groups, minlength=n_groups)
+    total = np.bincount(groups, weights=values, minlength=n_groups)
+    total_sq = np.bincount(groups, weights=values*values, minlength=n_groups)
+    out = np.bincount(groups, weights=np.abs(values) > tolerance, minlength=n_groups).astype(int)
+    max_abs = np.zeros(n_groups)
+    np.maximum.at(max_abs, groups, np.abs(values))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(count > 0, total/count, 0.)
+        std = np.sqrt(np.maximum(np.where(count > 0, total_sq/count, 0.) - mean**2, 0.))
+    return GroupStatistics(count, mean, std, max_abs, out)
+
+
+def compute_statistics(table, tolerance=tolerance):
+    """
+    Deviation statistics (count, mean, std, max |deviation|, number out of
+    tolerance) per row and side, per row, per side and for the whole glider,
+    plus the left/right symmetry per row: the deviation of the left line
+    minus that of the right line, over the lines measured on both sides, so
+    that an asymmetric specification does not show as an asymmetric trim.
+
+    All groups are reduced from the same flattened arrays with bincount.
+    """
+    n_rows = len(table.row_names)
+    n_sides = len(side_list)
+    mask = table.mask & (table.row >= 0)[:, None]
+    deviation = table.raw_deviation - table.offset
+    line, side = np.nonzero(mask)
+    values = deviation[line, side]
+    row = table.row[line].astype(np.intp)
+
+    row_side = _group_statistics(values, row*n_sides + side, n_rows*n_sides, tolerance)
+    row_side = GroupStatistics(*[a.reshape(n_rows, n_sides) for a in row_side])
+    by_row = _group_statistics(values, row, n_rows, tolerance)
+    by_side = _group_statistics(values, side, n_sides, tolerance)
+    total = _group_statistics(values, np.zeros(len(values), dtype=np.intp), 1, tolerance)
+
+    both = mask.all(axis=1)
+    symmetry = _group_statistics(table.raw_deviation[both, 0] - table.raw_deviation[both, 1],
+                                 table.row[both].astype(np.intp), n_rows, tolerance)
+    return Statistics(table.offset, row_side, by_row, by_side, symmetry, total)
+
+
+def split_key(key, row_names):
+    """Return (row index, number) of a line key such as 'Br03', (-1, 0) if unknown."""
+    best = None
+    for i, row_name in enumerate(row_names):
+        for name in (row_name, row_name.replace(" ", "_")):
+            rest = key[len(name):]
+            if key.startswith(name) and rest.isdigit() and (best is None or len(name) > best[2]):
+                best = (i, int(rest), len(name))
+    if best is None:
+        return -1, 0
+    return best[0], best[1]
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+Measurement order of the lines of a glider.
+
+A traversal is the sequence of the lines (index, side) of a LineTable in
+one measurement order, precomputed once so that it only visits lines which
+exist: rows of different lengths and gaps in the numbering are skipped. The
+lines of the first side come before those of the other side, or both sides
+of a line follow each other when interleaved.
+
+Orders:
+
+- Center to tip / Tip to center: row by row, numbers up or down
+- Leading to trailing edge / Trailing to leading edge: number by number,
+  rows up or down
+- Serpentine: row by row, numbers alternately up and down, so that the
+  operator never walks back along the wing
+- Cascade first: cascade level by level (lines without level last), then
+  row by row
+
+The next line is two array reads. Measured lines are skipped through
+"next unmeasured" pointers compressed as they are followed, so skipping is
+O(1) amortized; clearing a measurement rebuilds them in one vectorized pass.
+
+Every order can be walked end to end on specification files with check_orders,
+from the src directory::
+
+    python -m core.ordering ../data/gliders/*.txt
+"""
+
+import numpy as np
+
+order_names = ["Center to tip", "Tip to center", "Leading to trailing edge", "Trailing to leading edge",
+               "Serpentine", "Cascade first"]
+
+
+def line_order(table, order):
+    """Indices of the lines of a LineTable in the given order."""
+    row, number = table.row, table.number
+    if order == "Center to tip":
+        keys = (number, row)
+    elif order == "Tip to center":
+        keys = (-number, row)
+    elif order == "Leading to trailing edge":
+        keys = (row, number)
+    elif order == "Trailing to leading edge":
+        keys = (-row, number)
+    elif order == "Serpentine":
+        keys = (np.where(row%2 == 0, number, -number), row)
+    elif order == "Cascade first":
+        keys = (number, row, np.where(table.level > 0, table.level, np.iinfo(np.int8).max))
+    else:
+        raise ValueError("Unknown order '%s'"%order)
+    # np.lexsort sorts by the last key first
+    return np.lexsort(keys)
+
+
+class Traversal(object):
+    """Precomputed sequence of the lines (index, side) of a LineTable."""
+    def __init__(self, table, order, first_side=0, interleave=False):
+        lines = line_order(table, order)
+        n = len(lines)
+        if interleave:
+            self.index = np.repeat(lines, 2)
+            self.side = np.tile([first_side, 1-first_side], n)
+        else:
+            self.index = np.concatenate([lines, lines])
+            self.side = np.repeat([first_side, 1-first_side], n)
+        self.position = np.full((len(table), 2), -1, dtype=np.int64)
+        self.position[self.index, self.side] = np.arange(len(self.index))
+        self.reset(table.measured)
+
+    def __len__(self):
+        return len(self.index)
+
+    def reset(self, measured):
+        """Rebuild the pointers to the next unmeasured line from the measured lengths."""
+        n = len(self.index)
+        self._free = measured[self.index, self.side] == 0
+        candidates = np.where(np.append(self._free, True), np.arange(n+1), n)
+        self._next = np.minimum.accumulate(candidates[::-1])[::-1]
+
+    def set_measured(self, i, side, measured):
+        """Follow a change of the measurement of line (index, side)."""
+        k = self.position[i, side]
+        if self._free[k] == (not measured):
+            return
+        if measured:
+            self._free[k] = False
+            self._next[k] = k+1
+        else:
+            self._free[k] = True
+            # Pointers before k may jump over it: rebuild them
+            head = self._next[:k+1]
+            head[head > k] = k
+
+    def _find(self, k):
+        """Position of the first unmeasured line from position k, len(self) if none."""
+        root = k
+        while self._next[root] != root:
+            root = self._next[root]
+        while self._next[k] != root:
+            self._next[k], k = root, self._next[k]
+        return root
+
+    def next(self, cell=None, skip_measured=True):
+        """
+        Line (index, side) following cell, the first one if cell is None.
+        Skipping measured lines, the search goes on from the start of the
+        sequence once at its end. None when there is no line to measure.
+        """
+        k = 0 if cell is None or self.position[cell] < 0 else self.position[cell]+1
+        if skip_measured:
+            k = self._find(k)
+            if k == len(self) and cell is not None:
+                k = self._find(0)
+        if k >= len(self) or (cell is not None and k == self.position[cell]):
+            return None
+        return int(self.index[k]), int(self.side[k])
+
+
+class Navigator(object):
+    """
+    Traversals of a LineTable for every order, built on first use and kept
+    in sync. A sweep keeps the side it started on as its first side until
+    it reaches the end of its order.
+    """
+    def __init__(self, table):
+        self.table = table
+        self.first_side = None
+        self._traversals = dict()
+
+    def traversal(self, order, first_side=0, interleave=False):
+        key = (order, first_side, interleave)
+        if not key in self._traversals:
+            self._traversals[key] = Traversal(self.table, order, first_side, interleave)
+        return self._traversals[key]
+
+    def next(self, cell, order, interleave=False, skip_measured=True):
+        """Line to measure after cell (index, side), see Traversal.next."""
+        if self.first_side is None:
+            self.first_side = 0 if cell is None else cell[1]
+        line = self.traversal(order, self.first_side, interleave).next(cell, skip_measured)
+        if line is None:
+            self.first_side = None
+        return line
+
+    def set_measured(self, i, side):
+        """To be called after the measurement of line (index, side) was set or cleared."""
+        measured = self.table.measured[i, side] != 0
+        for traversal in self._traversals.values():
+            traversal.set_measured(i, side, measured)
+
+
+def check_orders(table):
+    """
+    Walk every order from the first line of each side, interleaved or not,
+    measuring the lines (skip_measured) or not, as the application does.
+    Returns the descriptions of the walks which do not visit every line once
+    and end.
+    """
+    errors = list()
+    for order in order_names:
+        first = int(line_order(table, order)[0])
+        for interleave in (False, True):
+            for skip_measured in (False, True):
+                for side in (0, 1):
+                    walk = table.copy()
+                    walk.measured[:] = 0
+                    navigator = Navigator(walk)
+                    cell, visited = (first, side), list()
+                    while cell is not None and len(visited) <= walk.measured.size:
+                        visited.append(cell)
+                        if skip_measured:
+                            walk.measured[cell] = 1.
+                            navigator.set_measured(*cell)
+                        cell = navigator.next(cell, order, interleave, skip_measured)
+                    if cell is not None or len(set(visited)) != len(visited) or len(visited) != walk.measured.size:
+                        errors.append("%s, side %i%s%s: %i of %i lines visited%s"%(order, side, ", interleaved" if interleave else "",
+                                                                                    ", skipping measured" if skip_measured else "",
+                                                                                    len(set(visited)), walk.measured.size,
+                                                                                    "" if cell is None else ", no end"))
+    return errors
+
+
+if __name__ == "__main__":
+    import sys
+    from .spec_file import load_spec, SpecError
+
+    status = 0
+    for filename in sys.argv[1:]:
+        try:
+            errors = check_orders(load_spec(filename))
+        except (OSError, SpecError) as e:
+            errors = [str(e)]
+        print("%s: %s"%(filename, "ok" if len(errors) == 0 else "%i error(s)"%len(errors)))
+        for error in errors:
+            print("    %s"%error)
+        status = status or len(errors) > 0
+    sys.exit(int(status))
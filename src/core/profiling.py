@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+Lightweight timing of the measurement hot path.
+
+Spans are recorded in a fixed size ring buffer of the module profiler. When
+the profiler is disabled, span() returns a shared no-op context manager so
+the instrumented code only pays for one attribute lookup.
+"""
+
+import collections
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+
+class _NullSpan(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+_null_span = _NullSpan()
+
+
+class _Span(object):
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.profiler.add(self.name, self.start, time.perf_counter()-self.start)
+        return False
+
+
+class Profiler(object):
+    """
+    Record (name, start, duration, thread id) spans, times in seconds from
+    time.perf_counter().
+    """
+    def __init__(self, maxlen=20000):
+        self.enabled = False
+        self.events = collections.deque(maxlen=maxlen)
+        self.origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def span(self, name):
+        """Context manager timing its block under name."""
+        if not self.enabled:
+            return _null_span
+        return _Span(self, name)
+
+    def add(self, name, start, duration):
+        with self._lock:
+            self.events.append((name, start, duration, threading.get_ident()))
+
+    def clear(self):
+        with self._lock:
+            self.events.clear()
+        self.origin = time.perf_counter()
+
+    def durations(self, name, last=None):
+        """Durations of the spans called name, last ones only if given."""
+        with self._lock:
+            values = [duration for n, start, duration, tid in self.events if n == name]
+        if last is not None:
+            values = values[-last:]
+        return np.array(values)
+
+    def summary(self, name, last=500):
+        """(last, p95) durations of name in seconds, None if never recorded."""
+        values = self.durations(name, last)
+        if values.size == 0:
+            return None
+        return values[-1], float(np.percentile(values, 95))
+
+    def export_chrome_trace(self, filename):
+        """
+        Write the recorded spans as Chrome trace events (chrome://tracing,
+        Perfetto), returns the number of events written.
+        """
+        with self._lock:
+            events = list(self.events)
+        pid = os.getpid()
+        trace = [dict(name=name, ph="X", cat="linetrim", pid=pid, tid=tid,
+                      ts=round(1e6*(start-self.origin), 1), dur=round(1e6*duration, 1))
+                 for name, start, duration, tid in events]
+        with open(filename, "w") as f:
+            json.dump(dict(traceEvents=trace, displayTimeUnit="ms"), f)
+        return len(trace)
+
+
+class PhaseTimer(object):
+    """Wall clock time of named phases, e.g. the application startup."""
+    def __init__(self, t0=None):
+        self.t0 = time.perf_counter() if t0 is None else t0
+        self.phases = list()
+
+    def phase(self, name):
+        """Context manager timing its block as phase name."""
+        return _Phase(self, name)
+
+    def mark(self, name, start):
+        """Record the phase name started at start and ending now."""
+        self.phases.append((name, time.perf_counter()-start))
+
+    def total(self):
+        return time.perf_counter()-self.t0
+
+    def summary(self):
+        phases = ", ".join("%s %i ms"%(name, 1e3*duration) for name, duration in self.phases)
+        return "%i ms (%s)"%(1e3*self.total(), phases)
+
+
+class _Phase(object):
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.timer.mark(self.name, self.start)
+        return False
+
+
+profiler = Profiler()
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+Versioned LineTrim project file (.ltf).
+
+Layout of a file::
+
+    LTF <schema version>\\n
+    <header length, uint32 little endian>
+    <header, UTF-8 JSON>
+    <body, NumPy .npz archive>
+
+The header (identification, glider model, date, counts) can be read without
+touching the body. The body stores the lines column-wise: key, row index,
+number in the row, theoretical length and measured length per side, plus
+the optional per side theoretical lengths, names, cascade levels and parent
+lines when they are given by the specification, and the undo/redo history
+of the session when there is one (History.arrays(), arrays named
+history_*).
+
+Legacy project files were raw pickles of a dictionary; they are read with a
+restricted unpickler and can be converted once with migrate() or from the
+command line (from the src directory)::
+
+    python -m core.project_file ../projects ../projects/autosave
+"""
+
+import io
+import json
+import os
+import pickle
+import struct
+import sys
+import time
+
+import numpy as np
+
+from .history import array_prefix as history_prefix
+from .model import LineTable, side_list
+
+magic = b"LTF"
+schema_version = 2
+legacy_suffix = ".pickle.bak"
+
+
+class ProjectFileError(Exception):
+    pass
+
+
+def dump_project(project, f):
+    """
+    Write a project to a binary file object.
+
+    A project is a dictionary with the LineTable of the glider ('table'),
+    the 'identification' text and the 'glider' model name, and optionally
+    the session 'date' ("%Y-%m-%d %H:%M:%S", now by default) and
+    'history' (History.arrays()).
+    """
+    table = project["table"]
+    header = dict(format="LineTrim project",
+                  version=schema_version,
+                  identification=project.get("identification", ""),
+                  glider=project.get("glider", ""),
+                  date=project.get("date") or time.strftime("%Y-%m-%d %H:%M:%S"),
+                  row_names=table.row_names,
+                  sides=side_list,
+                  n_lines=table.measured.size,
+                  n_measured=int(np.count_nonzero(table.measured)))
+    body = io.BytesIO()
+    arrays = table.arrays()
+    arrays.update(project.get("history") or {})
+    np.savez(body, **arrays)
+    header_bytes = json.dumps(header).encode("utf-8")
+    f.write(b"%s %i\n"%(magic, schema_version))
+    f.write(struct.pack("<I", len(header_bytes)))
+    f.write(header_bytes)
+    f.write(body.getvalue())
+
+
+def is_legacy(filename):
+    with open(filename, "rb") as f:
+        return not f.read(len(magic)) == magic
+
+
+def _read_header(f):
+    first_line = f.readline(32)
+    if not first_line.startswith(magic):
+        raise ProjectFileError("Not a LineTrim project file")
+    version = int(first_line[len(magic):])
+    if version > schema_version:
+        raise ProjectFileError("Project file version %i is newer than supported version %i"%(version, schema_version))
+    length, = struct.unpack("<I", f.read(4))
+    return json.loads(f.read(length).decode("utf-8"))
+
+
+def read_header(filename):
+    """Read only the header of a project file."""
+    if is_legacy(filename):
+        project = load_legacy(filename)
+        table = project["table"]
+        return dict(format="LineTrim project",
+                    version=1,
+                    identification=project["identification"],
+                    glider=project["glider"],
+                    date=time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(os.path.getmtime(filename))),
+                    row_names=table.row_names,
+                    sides=side_list,
+                    n_lines=table.measured.size,
+                    n_measured=int(np.count_nonzero(table.measured)))
+    with open(filename, "rb") as f:
+        return _read_header(f)
+
+
+def read_body(filename):
+    """Read the column arrays of a project file as a dictionary of arrays."""
+    with open(filename, "rb") as f:
+        _read_header(f)
+        with np.load(io.BytesIO(f.read()), allow_pickle=False) as body:
+            return dict((name, body[name]) for name in body.files)
+
+
+class LazyProject(object):
+    """Project file whose body is only read when first needed."""
+    def __init__(self, filename):
+        self.filename = filename
+        self.header = read_header(filename)
+        self._body = None
+
+    @property
+    def body(self):
+        if self._body is None:
+            if self.header["version"] < schema_version:
+                table = load_legacy(self.filename)["table"]
+                self._body = table.arrays()
+            else:
+                self._body = read_body(self.filename)
+        return self._body
+
+    def table(self):
+        body = self.body
+        return LineTable.from_arrays(self.header["row_names"], body)
+
+    def history(self):
+        """Arrays of the undo/redo history (see History.restore()), None if not saved."""
+        arrays = dict((name, array) for name, array in self.body.items() if name.startswith(history_prefix))
+        return arrays or None
+
+    def project(self):
+        return dict(table=self.table(),
+                    identification=self.header["identification"],
+                    glider=self.header.get("glider", ""),
+                    date=self.header.get("date"),
+                    history=self.history())
+
+
+def load_project(filename):
+    """Load a project file (current or legacy format)."""
+    return LazyProject(filename).project()
+
+
+class _LegacyUnpickler(pickle.Unpickler):
+    # Legacy projects only hold builtin containers, floats and strings
+    allowed = {("numpy.core.multiarray", "scalar"), ("numpy._core.multiarray", "scalar"), ("numpy", "dtype")}
+
+    def find_class(self, module, name):
+        if (module, name) in self.allowed:
+            return super(_LegacyUnpickler, self).find_class(module, name)
+        raise ProjectFileError("Forbidden object '%s.%s' in legacy project file"%(module, name))
+
+
+def load_legacy(filename):
+    """Read a legacy pickle project without executing arbitrary code, return it as a project."""
+    with open(filename, "rb") as f:
+        try:
+            project = _LegacyUnpickler(f).load()
+        except (pickle.UnpicklingError, EOFError) as e:
+            raise ProjectFileError("'%s' is not a LineTrim project: %s"%(filename, e))
+    if not isinstance(project, dict) or not "line_length" in project:
+        raise ProjectFileError("'%s' is not a LineTrim project"%filename)
+    line_length = dict((key, float(val)) for key, val in project["line_length"].items())
+    measured_line_length = dict((key, float(val)) for key, val in project["measured_line_length"].items())
+    return dict(table=LineTable.from_dicts(line_length, measured_line_length, project["row_names"]),
+                identification=project["identification"],
+                glider=project.get("glider", ""))
+
+
+def migrate(filename, backup=True):
+    """Convert a legacy pickle project to the current format, return True if converted."""
+    if not is_legacy(filename):
+        return False
+    project = load_legacy(filename)
+    mtime = os.path.getmtime(filename)
+    project["date"] = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(mtime))
+    if backup:
+        with open(filename, "rb") as src, open(filename + legacy_suffix, "wb") as dst:
+            dst.write(src.read())
+    tmp_filename = filename + ".tmp"
+    with open(tmp_filename, "wb") as f:
+        dump_project(project, f)
+    os.replace(tmp_filename, filename)
+    # Keep the session date of the original file
+    os.utime(filename, (mtime, mtime))
+    return True
+
+
+def migrate_directory(path, backup=True):
+    converted = list()
+    for name in sorted(os.listdir(path)):
+        filename = os.path.join(path, name)
+        if name.endswith(".ltf") and os.path.isfile(filename) and migrate(filename, backup):
+            converted.append(filename)
+    return converted
+
+
+if __name__ == "__main__":
+    for path in sys.argv[1:]:
+        for filename in migrate_directory(path):
+            print("Converted %s"%filename)
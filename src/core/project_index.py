@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+Summaries of the project files, for the project browser.
+
+A summary holds what tells sessions apart without opening them:
+identification, glider, session date, measured and total line counts and
+the largest deviation. Legacy project files have to be read entirely to
+get it, so the part which only depends on the file content (header fields,
+counts, deviation) is kept in the disk cache under the hash of the content,
+the least recently used entries being pruned past max_summaries. The
+session date and glider are derived from the file name first (see
+core.compare), so they are computed again for every file: byte-identical
+sessions saved under different names share a cache entry, not a date.
+
+From the src directory::
+
+    python -m core.project_index ../projects ../projects/autosave
+"""
+
+import json
+import os
+import sys
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from . import cache
+from .compare import NamedHeader, project_files, session_time, session_glider
+from .project_file import LazyProject, ProjectFileError
+
+summary_prefix = "summary-"
+# Version of the cached content summaries, part of their name
+summary_version = 2
+max_summaries = 2000
+
+ProjectSummary = namedtuple("ProjectSummary", ["identification", "glider", "date", "n_measured", "n_lines", "max_deviation"])
+
+
+def list_projects(paths):
+    """Project files of the files and directories given, newest first (file names start with the date)."""
+    return sorted(project_files(paths), key=os.path.basename, reverse=True)
+
+
+def content_summary(project):
+    """
+    Part of the summary of a LazyProject which only depends on the file
+    content, as a dictionary: header fields and counts, max_deviation NaN if
+    no line is measured.
+    """
+    table = project.table()
+    deviation = np.abs(table.deviation[table.mask])
+    header = project.header
+    return dict(header=dict(identification=header.get("identification", ""), glider=header.get("glider", ""), date=header["date"]),
+                n_measured=table.n_measured,
+                n_lines=int(table.measured.size),
+                max_deviation=float(deviation.max()) if len(deviation) > 0 else float("nan"))
+
+
+def file_summary(filename, content):
+    """ProjectSummary of a project file from its content summary, date and glider read from the file name first."""
+    session = NamedHeader(filename, content["header"])
+    return ProjectSummary(identification=content["header"]["identification"],
+                          glider=session_glider(session),
+                          date=time.strftime("%Y-%m-%d", time.localtime(session_time(session))),
+                          n_measured=content["n_measured"],
+                          n_lines=content["n_lines"],
+                          max_deviation=content["max_deviation"])
+
+
+def summarize(project):
+    """ProjectSummary of a LazyProject, max_deviation NaN if no line is measured."""
+    return file_summary(project.filename, content_summary(project))
+
+
+def _readContent(f):
+    content = json.load(f)
+    if content["max_deviation"] is None:
+        content["max_deviation"] = float("nan")
+    return content
+
+
+def _writeContent(f, content):
+    content = dict(content)
+    if np.isnan(content["max_deviation"]):
+        content["max_deviation"] = None
+    json.dump(content, f)
+
+
+def project_summary(filename, digest=None):
+    """
+    (summary, project) of a project file: the content summary comes from the
+    cache when the same content was summarized before, whatever the name of
+    the file, project is the LazyProject if the file had to be read, None
+    else. Raises the reading errors.
+    """
+    if digest is None:
+        digest = cache.file_hash(filename)
+    name = "%sv%i-%s.json"%(summary_prefix, summary_version, digest)
+    content = cache.read_cache(name, _readContent, mode="r")
+    if content is not None:
+        return file_summary(filename, content), None
+    project = LazyProject(filename)
+    content = content_summary(project)
+    if cache.write_cache(name, lambda f: _writeContent(f, content), mode="w"):
+        cache.prune_cache(summary_prefix, max_summaries)
+    return file_summary(filename, content), project
+
+
+def summary_text(summary):
+    """One line description of the counts and deviation of a summary."""
+    text = "%s - %i/%i measured"%(summary.date, summary.n_measured, summary.n_lines)
+    if not np.isnan(summary.max_deviation):
+        text += " - max |Δ| %.0f mm"%summary.max_deviation
+    return text
+
+
+if __name__ == "__main__":
+    for filename in list_projects(sys.argv[1:]):
+        try:
+            summary, project = project_summary(filename)
+        except (OSError, ValueError, ProjectFileError) as e:
+            print("%s: %s"%(filename, e))
+            continue
+        print("%s\n    %s\n    %s"%(filename, summary.identification, summary_text(summary)))
@@ -0,0 +1,341 @@
+# -*- coding: utf-8 -*-
+"""
+Local server publishing the measurement session to other screens.
+
+The server runs an asyncio event loop in its own thread, bound to localhost
+or to the workshop LAN, and serves:
+
+- GET /             a web view of the glider lines colored by deviation
+- GET /state        the full session state as JSON
+- GET /events       Server-Sent Events: the full state once, then small
+                    diffs (changed measurements, offset, active line)
+- POST /measurement a reading from a second input device, as a JSON
+                    {"value": mm} or a plain number, with ?token=<token>
+
+The UI thread only calls publish(), which compares the measured lengths
+with the last published ones and hands the diff to the event loop; the
+encoding and the writes to the clients happen in the server thread. A
+client which cannot keep up has its pending diffs dropped and receives the
+full state again instead, so slow clients never hold memory or slow down
+the others.
+
+As a MeasurementSource, the server pushes the posted readings into the
+measurement queue of the application, like the laser meter does.
+"""
+
+import asyncio
+import json
+import secrets
+import threading
+import urllib.parse
+
+import numpy as np
+
+from .measurement import MeasurementSource
+from .model import side_list, tolerance
+
+default_port = 8750
+# Diffs buffered per client before it is resynchronized with the full state
+client_backlog = 256
+max_request_size = 65536
+
+_status_text = {200: "OK", 204: "No Content", 400: "Bad Request", 403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed"}
+
+
+class SessionServer(MeasurementSource):
+    """Publish the session to read-only clients and accept readings posted with the token."""
+    name = "web"
+
+    def __init__(self, host="127.0.0.1", port=default_port, token=None):
+        super(SessionServer, self).__init__()
+        self.host = host
+        self.port = port
+        self.token = secrets.token_urlsafe(8) if token is None else token
+        self.ready = threading.Event()
+        self.n_clients = 0
+        self._loop = None
+        self._stopped = None
+        self._clients = set()
+        self._state = None              # owned by the server thread
+        self._seq = 0
+        # Last published values, owned by the UI thread
+        self._keys = None
+        self._measured = None
+        self._offset = None
+        self._active = None
+        self._identification = None
+
+    @property
+    def url(self):
+        return "http://%s:%i/"%(self.host, self.port)
+
+    # UI thread
+
+    def publish(self, table, active=None, identification="", rebuilt=False):
+        """
+        Send what changed since the last call, or the full state if the
+        lines of the table changed (rebuilt). Cheap: one vectorized
+        comparison of the measured lengths.
+        """
+        if self._loop is None:
+            return
+        active_key = table.side_key(*active) if active is not None else None
+        if rebuilt or self._keys is not table.keys or self._measured is None or self._measured.shape != table.measured.shape:
+            state = dict(type="state", identification=identification, row_names=list(table.row_names), keys=list(table.keys),
+                         names=list(table.names), row=table.row.tolist(), number=table.number.tolist(),
+                         reference=table.reference.tolist(), measured=table.measured.tolist(), offset=table.offset,
+                         active=active_key, sides=side_list, tolerance=tolerance)
+            diff = state
+        else:
+            diff = dict(type="diff")
+            changed = np.flatnonzero(np.any(table.measured != self._measured, axis=1))
+            if len(changed) > 0:
+                diff["measured"] = dict((table.keys[i], table.measured[i].tolist()) for i in changed.tolist())
+            if table.offset != self._offset:
+                diff["offset"] = table.offset
+            if active_key != self._active:
+                diff["active"] = active_key
+            if identification != self._identification:
+                diff["identification"] = identification
+            if len(diff) == 1:
+                return
+        self._keys = table.keys
+        self._measured = table.measured.copy()
+        self._offset = table.offset
+        self._active = active_key
+        self._identification = identification
+        try:
+            self._loop.call_soon_threadsafe(self._broadcast, diff)
+        except (AttributeError, RuntimeError):
+            pass    # server stopping
+
+    def stop(self, timeout=2.):
+        self.running = False
+        if self._loop is not None and self._stopped is not None:
+            self._loop.call_soon_threadsafe(self._stopped.set)
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    # Server thread
+
+    def run(self):
+        try:
+            asyncio.run(self._serve())
+        finally:
+            self.ready.set()
+
+    async def _serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = server.sockets[0].getsockname()[1]
+        self.ready.set()
+        async with server:
+            await self._stopped.wait()
+            # End the event streams, the server waits for its connections to close
+            for queue in list(self._clients):
+                queue.put_nowait(None)
+        self._loop = None
+
+    def _broadcast(self, diff):
+        if diff["type"] == "state":
+            self._state = diff
+        elif self._state is not None:
+            self._applyDiff(diff)
+        self._seq += 1
+        diff["seq"] = self._seq
+        message = self._event(diff)
+        for queue in self._clients:
+            if queue.full():
+                # Too slow: forget its backlog, the full state replaces it
+                while not queue.empty(): queue.get_nowait()
+                queue.put_nowait(self._event(dict(self._state, seq=self._seq)))
+            else:
+                queue.put_nowait(message)
+
+    def _applyDiff(self, diff):
+        state = self._state
+        if "measured" in diff:
+            index = dict((key, i) for i, key in enumerate(state["keys"])) if not "_index" in state else state["_index"]
+            state["_index"] = index
+            for key, values in diff["measured"].items():
+                state["measured"][index[key]] = values
+        for name in ("offset", "active", "identification"):
+            if name in diff:
+                state[name] = diff[name]
+
+    def _event(self, data):
+        data = dict((key, val) for key, val in data.items() if not key.startswith("_"))
+        return ("event: %s\ndata: %s\n\n"%(data["type"], json.dumps(data, separators=(",", ":")))).encode("utf-8")
+
+    async def _handle(self, reader, writer):
+        try:
+            request = await reader.readuntil(b"\r\n\r\n")
+            lines = request.decode("latin-1").split("\r\n")
+            method, target, _ = lines[0].split(" ", 2)
+            headers = dict((name.strip().lower(), val.strip()) for name, _, val in (line.partition(":") for line in lines[1:] if line))
+            url = urllib.parse.urlsplit(target)
+            query = urllib.parse.parse_qs(url.query)
+            if url.path == "/events" and method == "GET":
+                await self._stream(writer)
+            elif url.path == "/state" and method == "GET":
+                state = dict(self._state or dict(type="state"), seq=self._seq)
+                body = json.dumps(dict((key, val) for key, val in state.items() if not key.startswith("_"))).encode("utf-8")
+                await self._respond(writer, 200, body, "application/json")
+            elif url.path == "/" and method == "GET":
+                await self._respond(writer, 200, page.encode("utf-8"), "text/html; charset=utf-8")
+            elif url.path == "/measurement":
+                length = int(headers.get("content-length", 0))
+                if method != "POST":
+                    await self._respond(writer, 405)
+                elif query.get("token", [""])[0] != self.token:
+                    await self._respond(writer, 403)
+                elif not 0 < length <= max_request_size:
+                    await self._respond(writer, 400)
+                else:
+                    await self._receive(writer, await reader.readexactly(length), writer.get_extra_info("peername"))
+            else:
+                await self._respond(writer, 404)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, status, body=b"", content_type="text/plain"):
+        if status != 200 and len(body) == 0:
+            body = _status_text[status].encode("utf-8")
+        writer.write(b"HTTP/1.1 %i %s\r\nContent-Type: %s\r\nContent-Length: %i\r\nConnection: close\r\n\r\n"%(
+            status, _status_text[status].encode("utf-8"), content_type.encode("utf-8"), len(body)) + body)
+        await writer.drain()
+
+    async def _receive(self, writer, body, peer):
+        try:
+            data = json.loads(body)
+            value = float(data["value"] if isinstance(data, dict) else data)
+        except (ValueError, KeyError, TypeError):
+            await self._respond(writer, 400)
+            return
+        if self.queue is not None:
+            self.queue.put(value, "%s %s"%(self.name, peer[0] if peer else ""))
+        await self._respond(writer, 204)
+
+    async def _stream(self, writer):
+        queue = asyncio.Queue(client_backlog)
+        if self._state is not None:
+            queue.put_nowait(self._event(dict(self._state, seq=self._seq)))
+        self._clients.add(queue)
+        self.n_clients = len(self._clients)
+        try:
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\nConnection: keep-alive\r\n\r\n")
+            while True:
+                # Send what accumulated meanwhile in one write
+                messages = [await queue.get()]
+                while not queue.empty():
+                    messages.append(queue.get_nowait())
+                writer.write(b"".join(message for message in messages if message is not None))
+                await writer.drain()
+                if None in messages:
+                    break
+        finally:
+            self._clients.discard(queue)
+            self.n_clients = len(self._clients)
+
+
+def parse_address(text, default_host="127.0.0.1"):
+    """(host, port) of 'host:port', 'host', ':port' or ''."""
+    host, _, port = text.rpartition(":") if ":" in text else (text, "", "")
+    return host or default_host, int(port) if port else default_port
+
+
+page = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><meta name="viewport" content="width=device-width">
+<title>Line Trim</title>
+<style>
+body { font-family: sans-serif; margin: 1em; }
+h1 { font-size: 1.2em; }
+table { border-collapse: collapse; margin-bottom: 1em; }
+td { border: 1px solid #999; padding: 2px 4px; text-align: center; font-size: 0.8em; min-width: 3em; }
+td.active { outline: 3px solid black; }
+td.side { font-weight: bold; }
+#status { color: #666; }
+</style></head>
+<body>
+<h1 id="title">Line Trim</h1>
+<div id="status">Connecting...</div>
+<div id="rows"></div>
+<script>
+var state = null, index = {}, cells = {};
+function jet(t) {
+  t = Math.min(1, Math.max(0, t));
+  var c = [4*t-3, 4*t-2, 4*t-1].map(function (v) { return Math.round(255*Math.min(1, Math.max(0, 1.5-Math.abs(v)))); });
+  return "rgb(" + c.join(",") + ")";
+}
+function element(tag, text, className) {
+  var e = document.createElement(tag);
+  if (text !== undefined) e.textContent = text;
+  if (className !== undefined) e.className = className;
+  return e;
+}
+function build() {
+  index = {};
+  cells = {};
+  var rows = document.getElementById("rows");
+  while (rows.firstChild) rows.removeChild(rows.firstChild);
+  state.row_names.forEach(function (name, r) {
+    var lines = [];
+    state.keys.forEach(function (key, i) { if (state.row[i] == r) lines.push(i); });
+    lines.sort(function (a, b) { return state.number[a] - state.number[b]; });
+    var table = element("table");
+    state.sides.forEach(function (sideName, side) {
+      var tr = element("tr");
+      tr.appendChild(element("td", name + " " + sideName, "side"));
+      lines.forEach(function (i) {
+        var cell = element("td");
+        cells[state.keys[i]] = cells[state.keys[i]] || [];
+        cells[state.keys[i]][side] = cell;
+        tr.appendChild(cell);
+      });
+      table.appendChild(tr);
+    });
+    rows.appendChild(table);
+  });
+  state.keys.forEach(function (key, i) { index[key] = i; });
+  refresh();
+}
+function refresh() {
+  document.getElementById("title").textContent = state.identification;
+  var n = 0;
+  state.keys.forEach(function (key, i) {
+    state.sides.forEach(function (sideName, side) {
+      var cell = cells[key][side], m = state.measured[i][side], value;
+      cell.className = (state.active == key + "_" + sideName) ? "active" : "";
+      if (m != 0) {
+        var dev = m - state.reference[i][side] - state.offset;
+        cell.style.background = jet((dev + state.tolerance)/(2*state.tolerance));
+        value = (dev >= 0 ? "+" : "") + Math.round(dev);
+        n++;
+      } else {
+        cell.style.background = "";
+        value = Math.round(state.reference[i][side]);
+      }
+      while (cell.firstChild) cell.removeChild(cell.firstChild);
+      cell.appendChild(document.createTextNode(state.names[i]));
+      cell.appendChild(element("br"));
+      cell.appendChild(document.createTextNode(value));
+    });
+  });
+  document.getElementById("status").textContent = n + " sides measured, offset " + state.offset.toFixed(1) + " mm";
+}
+var source = new EventSource("/events");
+source.addEventListener("state", function (e) { state = JSON.parse(e.data); build(); });
+source.addEventListener("diff", function (e) {
+  if (state === null) return;
+  var diff = JSON.parse(e.data);
+  for (var key in (diff.measured || {})) state.measured[index[key]] = diff.measured[key];
+  ["offset", "active", "identification"].forEach(function (name) { if (name in diff) state[name] = diff[name]; });
+  refresh();
+});
+source.onerror = function () { document.getElementById("status").textContent = "Disconnected, retrying..."; };
+</script>
+</body></html>
+"""
@@ -0,0 +1,333 @@
+# -*- coding: utf-8 -*-
+"""
+Glider specification files (.txt), read in one streaming pass.
+
+Layout of a file::
+
+    # comment, also allowed after a value
+    [S]                     optional, start of a size in a multi-size chart
+    cells=48                optional number of cells of the wing
+    aspect_ratio=5.3        optional projected aspect ratio of the wing
+    *A                      start of a row
+    6220                    next line of the row, same length on both sides
+    6180 6185               left and right lengths
+    -                       no line at this position (0 is accepted as well)
+    A13 5811                named line, numbered from the digits of its name
+    A14 5848 level=2        cascade level of the line (0 if not given)
+    A1a 2150 parent=AM1     line hanging from the line named AM1 of a lower
+                            cascade (see core/cascade.py), which may be
+                            defined anywhere in the same size
+
+Lengths are in mm. The values are accumulated in typed arrays rather than
+Python lists, so large charts with many sizes are parsed in a single pass.
+Every problem is reported with its line number: errors are collected over
+the whole file and raised together as a SpecError, warnings are appended to
+the diagnostics list given by the caller.
+"""
+
+import array
+import re
+import sys
+from collections import namedtuple
+
+import numpy as np
+
+from .cascade import CascadeTree
+from .model import LineTable
+
+# Plausible line lengths (mm), values outside only raise a warning
+min_length, max_length = 100., 20000.
+# Relative left/right difference above which an asymmetry is reported
+max_asymmetry = 0.05
+# Attributes of a line and their types
+attributes = dict(level=int, parent=str)
+# Attributes of the wing, alone on their line, and their types
+glider_attributes = dict(cells=int, aspect_ratio=float)
+
+_name_pattern = re.compile(r"^[A-Za-z][\w.]*?(\d+)?$")
+
+
+class Diagnostic(namedtuple("Diagnostic", ["filename", "line", "severity", "message"])):
+    def __str__(self):
+        return "%s:%i: %s: %s"%(self.filename, self.line, self.severity, self.message)
+
+
+class SpecError(ValueError):
+    """Errors of a specification file, diagnostics holds one Diagnostic per problem."""
+    def __init__(self, diagnostics):
+        self.diagnostics = list(diagnostics)
+        message = str(self.diagnostics[0])
+        if len(self.diagnostics) > 1:
+            message += " (and %i more error%s)"%(len(self.diagnostics)-1, "s" if len(self.diagnostics) > 2 else "")
+        super(SpecError, self).__init__(message)
+
+
+class _Section(object):
+    """Lines of one size, accumulated in typed arrays."""
+    def __init__(self, size):
+        self.size = size
+        self.row_names = list()
+        self.row_lines = list()    # number of lines per row, for the empty row check
+        self.row = array.array("h")
+        self.number = array.array("h")
+        self.left = array.array("d")
+        self.right = array.array("d")
+        self.level = array.array("b")
+        self.parents = dict()      # line index -> (parent name, line number)
+        self.names = None          # only created once a line is named
+        self.glider = dict()       # glider attribute -> value
+        self.next_number = 1
+        self.numbers = set()
+
+    def table(self):
+        reference = np.column_stack([np.frombuffer(self.left, dtype=np.float64),
+                                     np.frombuffer(self.right, dtype=np.float64)]) if len(self.left) > 0 else np.zeros((0, 2))
+        table = LineTable(self.row_names, np.frombuffer(self.row, dtype=np.int16), np.frombuffer(self.number, dtype=np.int16),
+                          reference, level=np.frombuffer(self.level, dtype=np.int8), **self.glider)
+        if self.names is not None:
+            table.names = [key if name is None else name for name, key in zip(self.names, table.keys)]
+        return table
+
+
+def iter_specs(f, filename="<spec>", diagnostics=None):
+    """
+    Parse the lines of a specification file object, yielding (size, LineTable)
+    for each size as soon as it is complete, size being "" for files without
+    [size] sections. Raises SpecError at the end of the file if any error was
+    found; warnings are appended to diagnostics.
+    """
+    errors = list()
+    if diagnostics is None:
+        diagnostics = list()
+
+    def report(line, severity, message):
+        diagnostic = Diagnostic(filename, line, severity, message)
+        if severity == "error":
+            errors.append(diagnostic)
+        else:
+            diagnostics.append(diagnostic)
+
+    def close(section, line):
+        for name, n in zip(section.row_names, section.row_lines):
+            if n == 0:
+                report(line, "warning", "row %s has no line"%name)
+        if len(section.row) == 0:
+            report(line, "error", "no line in %s"%("size %s"%section.size if section.size else "the file"))
+        table = section.table()
+        if section.parents:
+            index = dict((name, i) for i, name in enumerate(table.names))
+            index.update((key, i) for i, key in enumerate(table.keys) if not key in index)
+            for i, (name, parent_line) in section.parents.items():
+                if not name in index:
+                    report(parent_line, "error", "unknown parent line '%s'"%name)
+                elif index[name] == i:
+                    report(parent_line, "error", "line %s cannot be its own parent"%name)
+                else:
+                    table.parent[i] = index[name]
+            try:
+                CascadeTree(table.parent)
+            except ValueError as e:
+                report(line, "error", str(e))
+        return table
+
+    section = None
+    sizes = set()
+    line_number = 0
+    for line_number, text in enumerate(f, 1):
+        text = text.split("#", 1)[0].strip()
+        if len(text) == 0:
+            continue
+
+        if text.startswith("[") and text.endswith("]"):
+            size = text[1:-1].strip()
+            if size in sizes:
+                report(line_number, "error", "size %s defined twice"%size)
+            sizes.add(size)
+            if section is not None:
+                if len(errors) == 0:
+                    yield section.size, close(section, line_number)
+                else:
+                    close(section, line_number)
+            section = _Section(size)
+            continue
+        if section is None:
+            section = _Section("")
+
+        key, equal, val = text.partition("=")
+        if equal and key.strip() in glider_attributes:
+            key = key.strip()
+            try:
+                section.glider[key] = glider_attributes[key](val.strip())
+                if section.glider[key] <= 0: raise ValueError()
+            except ValueError:
+                report(line_number, "error", "%s must be a positive number, not '%s'"%(key, val.strip()))
+            continue
+
+        if text.startswith("*"):
+            name = text[1:].strip()
+            if len(name) == 0:
+                report(line_number, "error", "empty row name")
+            elif name in section.row_names:
+                report(line_number, "error", "row %s defined twice"%name)
+            section.row_names.append(name)
+            section.row_lines.append(0)
+            section.next_number = 1
+            section.numbers = set()
+            continue
+        if len(section.row_names) == 0:
+            report(line_number, "error", "value before the first row header (*RowName)")
+            continue
+
+        values, options, name = list(), dict(), None
+        valid = True
+        try:
+            # Fast path of the usual single length
+            tokens = ()
+            values.append(float(text))
+        except ValueError:
+            tokens = text.replace(",", " ").replace(";", " ").split()
+        for k, token in enumerate(tokens):
+            if "=" in token:
+                key, _, val = token.partition("=")
+                if not key in attributes:
+                    report(line_number, "warning", "unknown attribute '%s' ignored"%key)
+                    continue
+                if attributes[key] is str:
+                    options[key] = val
+                    continue
+                try:
+                    options[key] = int(val)
+                    if options[key] < 0: raise ValueError()
+                except ValueError:
+                    report(line_number, "error", "%s must be a non-negative integer, not '%s'"%(key, val))
+                    valid = False
+                continue
+            if token == "-":
+                values.append(0.)
+                continue
+            try:
+                values.append(float(token))
+            except ValueError:
+                if k == 0 and _name_pattern.match(token):
+                    name = token
+                else:
+                    report(line_number, "error", "'%s' is not a length"%token)
+                    valid = False
+        if not valid:
+            continue
+        if len(values) == 0 or len(values) > 2:
+            report(line_number, "error", "expected one length, or left and right lengths, got %i values"%len(values))
+            continue
+        if len(values) == 1:
+            values.append(values[0])
+        if name is not None:
+            digits = _name_pattern.match(name).group(1)
+            number = int(digits) if digits is not None else section.next_number
+        else:
+            number = section.next_number
+        section.next_number = number+1
+
+        if values[0] == 0 and values[1] == 0:
+            continue    # no line at this position
+        if not (np.isfinite(values[0]) and np.isfinite(values[1])) or values[0] <= 0 or values[1] <= 0:
+            report(line_number, "error", "lengths must be positive numbers")
+            continue
+        if number in section.numbers:
+            report(line_number, "error", "line %i of row %s defined twice"%(number, section.row_names[-1]))
+            continue
+        for val in values:
+            if not min_length <= val <= max_length:
+                report(line_number, "warning", "length %g mm is outside %g-%g mm, check the unit"%(val, min_length, max_length))
+                break
+        if abs(values[0]-values[1]) > max_asymmetry*min(values):
+            report(line_number, "warning", "left and right lengths differ by %g mm"%abs(values[0]-values[1]))
+
+        section.numbers.add(number)
+        section.row_lines[-1] += 1
+        if name is not None and section.names is None:
+            section.names = [None]*len(section.row)
+        if section.names is not None:
+            section.names.append(name)
+        section.row.append(len(section.row_names)-1)
+        section.number.append(number)
+        section.left.append(values[0])
+        section.right.append(values[1])
+        if "parent" in options:
+            section.parents[len(section.level)] = (options["parent"], line_number)
+        section.level.append(options.get("level", 0))
+
+    if section is None:
+        report(line_number, "error", "empty specification")
+    else:
+        table = close(section, line_number)
+    if len(errors) > 0:
+        raise SpecError(errors)
+    if section is not None:
+        yield section.size, table
+
+
+def load_specs(filename, diagnostics=None):
+    """Dictionary size -> LineTable of every size of a specification file."""
+    with open(filename, "r") as f:
+        return dict(iter_specs(f, filename, diagnostics))
+
+
+def load_spec(filename, size=None, diagnostics=None):
+    """LineTable of a specification file, of the given size or the first one."""
+    with open(filename, "r") as f:
+        for section_size, table in iter_specs(f, filename, diagnostics):
+            if size is None or section_size == size:
+                return table
+    raise SpecError([Diagnostic(filename, 0, "error", "no size %s in the file"%size)])
+
+
+def write_spec(f, table, size=None, comment=None):
+    """Write a LineTable in the specification format, gaps in the numbering as '-'."""
+    if comment is not None:
+        for line in comment.splitlines():
+            f.write("# %s\n"%line)
+    if size is not None:
+        f.write("[%s]\n"%size)
+    if table.cells is not None:
+        f.write("cells=%i\n"%table.cells)
+    if table.aspect_ratio is not None:
+        f.write("aspect_ratio=%g\n"%table.aspect_ratio)
+    for r, row_name in enumerate(table.row_names):
+        f.write("*%s\n"%row_name)
+        indices = np.flatnonzero(table.row == r)
+        indices = indices[np.argsort(table.number[indices], kind="stable")]
+        number = 1
+        for i in indices.tolist():
+            while number < table.number[i]:
+                f.write("-\n")
+                number += 1
+            left, right = table.reference[i]
+            line = "%g"%left if left == right else "%g %g"%(left, right)
+            if table.names[i] != table.keys[i]:
+                line = "%s %s"%(table.names[i], line)
+            if table.level[i] != 0:
+                line += " level=%i"%table.level[i]
+            if table.parent[i] >= 0:
+                line += " parent=%s"%table.names[table.parent[i]]
+            f.write(line+"\n")
+            number = table.number[i]+1
+
+
+if __name__ == "__main__":
+    # Check specification files: python -m core.spec_file ../data/gliders/*.txt
+    status = 0
+    for filename in sys.argv[1:]:
+        diagnostics = list()
+        try:
+            specs = load_specs(filename, diagnostics)
+            summary = ", ".join("%s%i lines"%("%s: "%size if size else "", len(table)) for size, table in specs.items())
+            print("%s: %s"%(filename, summary))
+        except SpecError as e:
+            diagnostics = e.diagnostics + diagnostics
+            status = 1
+        except OSError as e:
+            print("%s: %s"%(filename, e))
+            status = 1
+        for diagnostic in diagnostics:
+            print("  %s"%(diagnostic,))
+    sys.exit(status)
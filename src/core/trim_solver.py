@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+Trim solver: discrete loop / maillon adjustments from measured deviations.
+
+The length of a line can be changed by discrete steps: loops at the line
+attachment (``line_step`` mm each, at most ``max_line_steps`` either way)
+and shims at the riser maillon, which move every line of a row on one side
+(``riser_step`` mm each, at most ``max_riser_steps`` either way).
+
+For each side, the solver picks one riser shift per row and one loop change
+per line so that:
+
+- every measured line ends within ``tolerance`` of the reference,
+- the difference between the mean deviations of consecutive trim rows
+  (A-B, B-C...) stays within ``trim_tolerance`` of the target trim,
+- as few adjustments as possible are made.
+
+All candidate riser shifts are evaluated at once with NumPy and the row
+chain is solved by dynamic programming, so a full glider takes a few
+milliseconds. The reference length offset is re-estimated from the adjusted
+lengths until it is stable.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+from .model import side_list, tolerance
+
+# Rows which are not part of the A-B-C... trim
+brake_rows = ("Br", "K", "Brake")
+
+# Cost of an adjustment which cannot bring a line within tolerance
+infeasible_cost = 1e3
+
+Adjustment = namedtuple("Adjustment", ["label", "row", "index", "side", "length", "steps"])
+
+
+class TrimSolution(object):
+    """Result of TrimSolver.solve()"""
+    def __init__(self, table, riser, line, residual, offset, feasible, line_step, riser_step):
+        self.table = table
+        self.riser = riser          # Riser shift (mm) per (row, side)
+        self.line = line            # Loop length change (mm) per (line, side)
+        self.residual = residual    # Deviation after adjustment per (line, side)
+        self.offset = offset
+        self.feasible = feasible
+        self.line_step = line_step
+        self.riser_step = riser_step
+
+    @property
+    def n_adjustments(self):
+        return int(np.count_nonzero(self.riser) + np.count_nonzero(self.line))
+
+    def adjustments(self):
+        """List of the adjustments, risers first, as Adjustment tuples."""
+        result = list()
+        for row, side in zip(*np.nonzero(self.riser)):
+            length = float(self.riser[row, side])
+            result.append(Adjustment("%s riser %s"%(self.table.row_names[row], side_list[side]), int(row), -1, int(side),
+                                     length, int(round(length/self.riser_step))))
+        for i, side in zip(*np.nonzero(self.line)):
+            length = float(self.line[i, side])
+            result.append(Adjustment(self.table.side_key(i, side), int(self.table.row[i]), int(i), int(side),
+                                     length, int(round(length/self.line_step))))
+        return result
+
+
+class TrimSolver(object):
+    def __init__(self, line_step=5., max_line_steps=3, riser_step=5., max_riser_steps=4,
+                 tolerance=tolerance, trim_tolerance=5., target_trim=None, riser_cost=1.5, max_iter=5):
+        self.line_step = line_step
+        self.max_line_steps = max_line_steps
+        self.riser_step = riser_step
+        self.max_riser_steps = max_riser_steps
+        self.tolerance = tolerance
+        self.trim_tolerance = trim_tolerance
+        # Target mean deviation of each row relative to the first one, by row name
+        self.target_trim = dict() if target_trim is None else dict(target_trim)
+        self.riser_cost = riser_cost
+        self.max_iter = max_iter
+
+    def solve(self, table):
+        n_rows = len(table.row_names)
+        n_sides = len(side_list)
+        mask = table.mask & (table.row >= 0)[:, None]
+        riser = np.zeros((n_rows, n_sides))
+        line = np.zeros(table.measured.shape)
+        if not mask.any():
+            return TrimSolution(table, riser, line, np.zeros(line.shape), 0., True, self.line_step, self.riser_step)
+
+        # Riser candidates (mm) and corresponding fixed cost
+        candidates = self.riser_step*np.arange(-self.max_riser_steps, self.max_riser_steps+1)
+        candidate_cost = self.riser_cost*(candidates != 0)
+        row = table.row.astype(np.intp)
+        target = np.array([self.target_trim.get(name, 0.) for name in table.row_names])
+        trim = np.array([not name in brake_rows for name in table.row_names])
+
+        offset = table.offset
+        for _ in range(self.max_iter):
+            # Deviation of each line for each riser candidate: (candidate, line, side)
+            raw = table.raw_deviation - offset
+            dev = raw[None] + candidates[:, None, None]
+            steps = np.clip(np.round(-dev/self.line_step), -self.max_line_steps, self.max_line_steps)
+            steps[np.abs(dev) <= self.tolerance] = 0
+            residual = dev + steps*self.line_step
+            cost = (steps != 0) + infeasible_cost*(np.abs(residual) > self.tolerance)
+            cost = np.where(mask[None], cost, 0.)
+            residual = np.where(mask[None], residual, 0.)
+
+            # Per (candidate, row, side) cost and mean residual
+            group_cost = np.zeros((len(candidates), n_rows, n_sides))
+            group_sum = np.zeros((len(candidates), n_rows, n_sides))
+            np.add.at(group_cost, (slice(None), row), cost)
+            np.add.at(group_sum, (slice(None), row), residual)
+            count = np.zeros((n_rows, n_sides))
+            np.add.at(count, row, mask)
+            group_mean = group_sum/np.maximum(count, 1)[None]
+            group_cost += candidate_cost[:, None, None]
+            # Rows without measurement do not move
+            group_cost[:, count == 0] = np.where(candidates == 0, 0., infeasible_cost)[:, None]
+
+            choice = self._chain(group_cost, group_mean, count, target, trim)
+            riser = candidates[choice]
+            pick = choice[row[:, None], np.arange(n_sides)[None, :]]
+            line = np.where(mask, np.take_along_axis(steps, pick[None], axis=0)[0]*self.line_step, 0.)
+            adjusted = np.where(mask, table.raw_deviation + riser[row] + line, 0.)
+            new_offset = adjusted[mask].mean()
+            if abs(new_offset - offset) < 0.5:
+                break
+            offset = new_offset
+
+        residual = np.where(mask, adjusted - new_offset, 0.)
+        row_mean = (np.bincount(row[np.nonzero(mask)[0]], weights=residual[mask], minlength=n_rows) /
+                    np.maximum(np.bincount(row[np.nonzero(mask)[0]], minlength=n_rows), 1))
+        feasible = bool(np.all(np.abs(residual) <= self.tolerance))
+        trim_rows = np.nonzero(trim & (count.sum(axis=1) > 0))[0]
+        if len(trim_rows) > 1:
+            diff = np.diff(row_mean[trim_rows]) - np.diff(target[trim_rows])
+            feasible &= bool(np.all(np.abs(diff) <= self.trim_tolerance))
+        return TrimSolution(table, riser, line, residual, float(new_offset), feasible, self.line_step, self.riser_step)
+
+    def _chain(self, group_cost, group_mean, count, target, trim):
+        """
+        Choose one candidate per (row, side) minimizing the cost, with a
+        penalty when the mean difference between consecutive trim rows is
+        outside the trim tolerance (Viterbi over the rows).
+        """
+        n_candidates, n_rows, n_sides = group_cost.shape
+        choice = np.argmin(group_cost, axis=0)
+        chain = [r for r in range(n_rows) if trim[r] and count[r].sum() > 0]
+        if len(chain) < 2:
+            return choice
+        for side in range(n_sides):
+            total = group_cost[:, chain[0], side].copy()
+            back = list()
+            for prev, cur in zip(chain[:-1], chain[1:]):
+                diff = group_mean[:, prev, side][:, None] - group_mean[:, cur, side][None, :]
+                penalty = infeasible_cost*(np.abs(diff - (target[prev]-target[cur])) > self.trim_tolerance)
+                step = total[:, None] + penalty
+                back.append(np.argmin(step, axis=0))
+                total = step[back[-1], np.arange(n_candidates)] + group_cost[:, cur, side]
+            k = int(np.argmin(total))
+            for r, b in zip(reversed(chain), reversed([None] + back)):
+                choice[r, side] = k
+                if b is not None: k = int(b[k])
+        return choice
@@ -4,15 +4,25 @@
 Line Trim - Python app dedicated to trimming of paraglider line length
 """
 
-from PyQt5 import QtGui, QtWidgets, QtMultimedia
+import os, sys, time
+startup_t0 = time.perf_counter()
+
+from PyQt5 import QtCore, QtGui, QtWidgets
 from ui.line_trim_ui import Ui_LineTrim
-import os, pickle, sys, time
 
-from ui.figure_widget import FigureWidget
 import numpy as np
 
-import matplotlib
-import matplotlib.pyplot as plt
+from core.model import LineTable, side_list
+from core.glider_library import GliderLibrary
+from core.trim_solver import TrimSolver
+from ui.measurement_bridge import MeasurementBridge
+from core.autosave import AutoSaver, replay_journal
+from core.history import History
+from core.ordering import Navigator, order_names
+from core.cascade import CascadeTree, PathLengths
+from core.acquisition import Acquisition, DONE, OUTLIER
+from core.project_file import load_project, is_legacy, migrate
+from core.profiling import profiler, PhaseTimer
 
 version_number = "0.1"
 root = os.path.sep.join(os.path.abspath(__file__).split(os.path.sep)[:-2])
@@ -20,115 +30,215 @@ root = os.path.sep.join(os.path.abspath(__file__).split(os.path.sep)[:-2])
 # Maximum allowed difference to consider the measurement valid
 valid_difference = 800.
 
-# Colorbar definition
-tolerance = 24.
-cmap = plt.cm.get_cmap('jet')
-dev_style = lambda x : dict(ec=cmap((x+tolerance)/(2*tolerance))[:3], fc=cmap((x+tolerance)/(2*tolerance))[:3], pad=2)
-
-# Style of the value on figure
-th_style = dict(ec=(0., 0., 0.), fc=(0.9, 0.9, 0.9), pad=3)
-meas_style = dict(ec=(1.,1.,1.), fc=(1.,1.,1.), pad=2)
-active_style = dict(facecolor='tomato', pad = 2)
-
 # Sides of the wing
-side_list = ["Left", "Right"]
 side_icon_list = ["toggle-left.png", "toggle-right.png"]
 
-# Evolution mode
-evo_list = [("Center to tip", (0, 1)),
-            ("Tip to center", (0, -1)),
-            ("Leading to trailing edge", (1, 0)),
-            ("Trailing  to leading edge", (-1, 0)),]
-evo_icon_list = ["maximize-2.png", "minimize-2.png", "arrow-up-left.png", "arrow-down-right.png"]
-evo_dict = dict()
-for name, val in evo_list: evo_dict[name] = val
-min_val_back = 1000.    # Value considered as cancellation
-
-
-# Graph dimensions
-w, h = 1600, 900
-w_margin = 0.01*w
-h_margin = 0.01*h
+# Measurement orders, see core/ordering.py
+order_icon_list = ["maximize-2.png", "minimize-2.png", "arrow-up-left.png", "arrow-down-right.png", "maximize-2.png", "database.png"]
+min_val_back = 1000.    # Two values under it undo the last measurement
 
 # Sound settings
 sound_dict = {True:"Turn sound off", False:"Turn sound on"}
 
+# Span shown as frame time in the timing readout
+frame_span = "updateView"
+
+_icons = dict()
+def icon(filename):
+    """Icon of resources/images, created once."""
+    if not filename in _icons:
+        _icons[filename] = QtGui.QIcon(os.path.join(root, "resources", "images", filename))
+    return _icons[filename]
+
+
 class LineTrim(Ui_LineTrim):
-    def __init__(self, main_window, version_number):
+    def __init__(self, main_window, version_number, line_length_filename=None, project_filename=None, deferred=False, startup=None):
+        """
+        With deferred=True, the figure, the glider loading and the first
+        render are left to start(), to be called once the window is shown.
+        """
         super(Ui_LineTrim, self).__init__()
         self.version_number = version_number
         self.main_window = main_window
-        self.project_filename = None
+        self.project_filename = project_filename
+        self.line_length_filename = line_length_filename
+        self.glider_name = ""
+        self.session_date = None
+        self.startup = PhaseTimer() if startup is None else startup
+        self.view = None
+
+        with self.startup.phase("window"):
+            self.setupWindow()
+        if not deferred:
+            self.start()
 
+
+    def setupWindow(self):
+        main_window = self.main_window
         self.setupUi(main_window)
+        self.setupMenus()
         self.lineEdit_Identification.setText("Glider name, size, serial number")
         
-        self.line_length = dict()
-        self.row_size = list()
-        self.row_names = list()
-        self.offset = 0.
-        self.active = ""
+        self.table = LineTable.empty()
+        self.active = None
         self.cancel_last = False
+        self.history = History()
+        self.navigator = Navigator(self.table)
+        self.path_lengths = None
+        self.acquisition = Acquisition()
         self.sound = False
-        
-        # Initialize sounds
-        self.go_next = QtMultimedia.QSound(os.path.join(root, "resources", "sounds", "go_next.wav"))
-        self.wrong = QtMultimedia.QSound(os.path.join(root, "resources", "sounds", "wrong.wav"))
-        self.go_back = QtMultimedia.QSound(os.path.join(root, "resources", "sounds", "go_back.wav"))
+        self.autosave = AutoSaver()
+        self.trim_solver = TrimSolver()
+        self.trim_solution = None
+        self.trim_revision = None
+        self.statistics_revision = None
+        self.library = GliderLibrary(os.path.join(root, "data", "gliders"))
+        self.measurement_bridge = MeasurementBridge(self.onMeasurement, main_window)
+        self.measurement_bridge.message.connect(self.printStatus)
+        self.server = None
+        self.sounds = dict()
         
         self.switchSound()
         
-        self.measured_line_length = dict()
-        self.profile = np.loadtxt(os.path.join(root, "resources", "profiles", "Profile.txt")) 
-        
         self.main_window.setWindowTitle("Line Trim - version %s"%self.version_number) 
-        self.main_window.setWindowIcon(QtGui.QIcon(os.path.join(root, "resources", "images", "feather.png")))
+        self.main_window.setWindowIcon(icon("feather.png"))
         
-        self.figure_widget = FigureWidget(self.widget)
         self.widgetLayout = QtWidgets.QHBoxLayout(self.widget)
-        self.widgetLayout.addWidget(self.figure_widget)
-        self.figure_widget.figure.clf()
-        self.ax = self.figure_widget.figure.add_axes((0.0,0.0,1.,1.), frameon=False)
-        self.ax.get_xaxis().set_visible(False)
-        self.ax.get_yaxis().set_visible(False)
+        self.view_dirty = True
+        self.label_Statistics = QtWidgets.QLabel(self.statusbar)
+        self.statusbar.addPermanentWidget(self.label_Statistics)
+        self.label_RedrawTime = QtWidgets.QLabel(self.statusbar)
+        self.statusbar.addPermanentWidget(self.label_RedrawTime)
 
         self.comboBox_Row.addItems(["-",])
         self.comboBox_Number.addItems(["-",])
-        
-        self.setLineLength()
-
         self.comboBox_Side.addItems(side_list)
         for i, filename in enumerate(side_icon_list):
-            self.comboBox_Side.setItemIcon(i, QtGui.QIcon(os.path.join(root, "resources", "images", filename)))
-        self.comboBox_Direction.addItems([evo[0] for evo in evo_list])
-        for i, filename in enumerate(evo_icon_list):
-            self.comboBox_Direction.setItemIcon(i, QtGui.QIcon(os.path.join(root, "resources", "images", filename)))
+            self.comboBox_Side.setItemIcon(i, icon(filename))
+        self.comboBox_Direction.addItems(order_names)
+        for i, filename in enumerate(order_icon_list):
+            self.comboBox_Direction.setItemIcon(i, icon(filename))
 
-
-        self.updateView()
-        
         self.actionLoad_project.triggered.connect(self.openProject)
         self.actionLoad_project.setIcon(QtGui.QIcon(os.path.join(root, "img", "file.png")))
         self.actionLoad_line_length.triggered.connect(self.setLineLength)
-        self.actionLoad_line_length.setIcon(QtGui.QIcon(os.path.join(root, "resources", "images", "database.png")))
+        self.actionLoad_line_length.setIcon(icon("database.png"))
+        self.actionGlider_library.triggered.connect(self.chooseGlider)
+        self.actionGlider_library.setIcon(icon("database.png"))
         self.actionSaveAs_project.triggered.connect(self.saveProjectAs)
-        self.actionSaveAs_project.setIcon(QtGui.QIcon(os.path.join(root, "resources", "images", "save.png")))
+        self.actionSaveAs_project.setIcon(icon("save.png"))
         self.actionSave_project.triggered.connect(self.saveProject)
-        self.actionSave_project.setIcon(QtGui.QIcon(os.path.join(root, "resources", "images", "save.png")))
+        self.actionSave_project.setIcon(icon("save.png"))
+        self.actionCompare_sessions.triggered.connect(self.compareSessions)
+        self.actionCompare_sessions.setIcon(icon("file.png"))
         self.actionExportPDFReport.triggered.connect(self.exportPDFReport)
-        self.actionExportPDFReport.setIcon(QtGui.QIcon(os.path.join(root, "resources", "images", "camera.png")))
+        self.actionExportPDFReport.setIcon(icon("camera.png"))
+        self.actionExport_measurements.triggered.connect(self.exportMeasurements)
+        self.actionExport_measurements.setIcon(icon("save.png"))
         self.actionSound.triggered.connect(self.switchSound)
+        self.actionProfiling.triggered.connect(self.switchProfiling)
+        self.actionExportTrace.triggered.connect(self.exportTrace)
+        self.actionTrim_solution.triggered.connect(self.showTrimSolution)
+        self.actionConnect_DISTO.triggered.connect(self.connectDisto)
+        self.actionUndo.triggered.connect(self.undo)
+        self.actionUndo.setShortcut(QtGui.QKeySequence.Undo)
+        self.actionRedo.triggered.connect(self.redo)
+        self.actionRedo.setShortcut(QtGui.QKeySequence.Redo)
+        self.actionReadings_per_line.triggered.connect(self.chooseSamples)
+
+
+    def setupMenus(self):
+        """Actions and menus added to those of the Designer form (ui/line_trim_ui.py)."""
+        def action(name, text, checkable=False, checked=False):
+            new = QtWidgets.QAction(text, self.main_window)
+            new.setObjectName(name)
+            new.setCheckable(checkable)
+            new.setChecked(checked)
+            setattr(self, name, new)
+            return new
+
+        self.menuFile.insertActions(self.actionExportPDFReport, [action("actionGlider_library", "Glider library"),
+                                                                 action("actionCompare_sessions", "Compare sessions")])
+        self.menuFile.insertActions(self.actionSound, [action("actionExport_measurements", "Export measurements"),
+                                                       action("actionTrim_solution", "Trim adjustments")])
+        self.menuFile.addActions([action("actionProfiling", "Show timings", checkable=True),
+                                  action("actionExportTrace", "Export timing trace"),
+                                  action("actionConnect_DISTO", "Connect DISTO")])
+        self.menuEdit = self.menubar.addMenu("Edit")
+        self.menuEdit.setObjectName("menuEdit")
+        self.menuEdit.addActions([action("actionUndo", "Undo measurement"),
+                                  action("actionRedo", "Redo measurement")])
+        self.menuEdit.addSeparator()
+        self.menuEdit.addActions([action("actionSkip_measured", "Skip measured lines", checkable=True, checked=True),
+                                  action("actionInterleave_sides", "Alternate left and right sides", checkable=True),
+                                  action("actionReadings_per_line", "Readings per line...")])
+
+
+    def start(self):
+        """Create the figure, load the glider and draw it."""
+        startup = self.startup
+        with startup.phase("view"):
+            from ui.scene_widget import PainterView
+        with startup.phase("figure"):
+            self.view = PainterView(self.widget)
+            self.widgetLayout.addWidget(self.view.widget)
+
+        if self.line_length_filename is None:
+            self.setLineLength()
+        else:
+            with startup.phase("glider"):
+                self.setLineLength(filename=self.line_length_filename)
+
+        with startup.phase("render"):
+            self.updateView()
 
         self.comboBox_Side.currentIndexChanged.connect(self.updateView)
         self.comboBox_Row.currentIndexChanged.connect(self.updateView)
         self.comboBox_Number.currentIndexChanged.connect(self.updateView)       
 
         self.lineEdit_Measurement.returnPressed.connect(self.updateMeasurement)
+        self.lineEdit_Identification.editingFinished.connect(self.autoSave)
+        self.printStatus("Started in %s"%startup.summary(), 10000)
             
+
     def switchSound(self):
         self.sound = not self.sound
         self.actionSound.setText(sound_dict[self.sound])
-        self.actionSound.setIcon(QtGui.QIcon(os.path.join(root, "resources", "images", {True:"bell-off.png", False:"bell.png"}[self.sound])))
+        self.actionSound.setIcon(icon({True:"bell-off.png", False:"bell.png"}[self.sound]))
+
+
+    def playSound(self, name):
+        if not self.sound:
+            return
+        if not name in self.sounds:
+            from PyQt5 import QtMultimedia
+            self.sounds[name] = QtMultimedia.QSound(os.path.join(root, "resources", "sounds", "%s.wav"%name))
+        self.sounds[name].play()
+
+
+    def switchProfiling(self):
+        profiler.enabled = self.actionProfiling.isChecked()
+        if profiler.enabled:
+            profiler.clear()
+        self.showTimings()
+
+
+    def showTimings(self):
+        if not profiler.enabled:
+            self.label_RedrawTime.setText("")
+            return
+        frame = profiler.summary(frame_span)
+        if frame is None:
+            return
+        self.label_RedrawTime.setText("Frame %0.1f ms (p95 %0.1f ms) - %i lines updated"%(1e3*frame[0], 1e3*frame[1], self.view.last_changed))
+
+
+    def exportTrace(self):
+        prefered_filename = "%s-trace.json"%time.strftime("%Y-%m-%d_%H-%M-%S")
+        filename = str(QtWidgets.QFileDialog.getSaveFileName(self.main_window, "Export timing trace as", os.path.join(root, "reports", prefered_filename), filter="*.json")[0])
+        if len(filename) > 0:
+            n = profiler.export_chrome_trace(filename)
+            self.printStatus("%i timing events written to %s (open with chrome://tracing)."%(n, filename))
 
         
     def saveProjectAs(self):
@@ -141,35 +251,62 @@ class LineTrim(Ui_LineTrim):
             self.printStatus("Save as failed.")
 
 
+    def projectData(self):
+        return dict(table = self.table.copy(),
+                    identification = self.lineEdit_Identification.text(),
+                    glider = self.glider_name,
+                    date = self.session_date,
+                    history = self.history.arrays())
+
+
     def saveProject(self):
         if self.project_filename is None:
             self.saveProjectAs()
-        elif not self.project_filename is None:
-            project = dict(line_length=self.line_length,
-                           measured_line_length = self.measured_line_length,
-                           row_size = self.row_size,
-                           row_names = self.row_names,
-                           identification = self.lineEdit_Identification.text())
-            with open(self.project_filename, "wb") as f: pickle.dump(project, f)
-        else:
-            self.printStatus("You should save your project!")
+            return
+        with profiler.span("saveProject"):
+            self.autosave.schedule(self.project_filename, self.projectData(), delay=0.)
+            self.autosave.flush()
+        if self.autosave.last_error is not None:
+            self.printStatus("Project not saved: %s"%self.autosave.last_error)
+
+
+    def autoSave(self):
+        if self.project_filename is None:
+            return
+        if self.autosave.last_error is not None:
+            self.printStatus("Autosave failed: %s"%self.autosave.last_error)
+        self.autosave.schedule(self.project_filename, self.projectData())
 
 
     def openProject(self, **kwargs):
         if not "filename" in kwargs:
-            filename = str(QtWidgets.QFileDialog.getOpenFileName(self.main_window, "Select a LTF project file", os.path.join(root, "projects"), filter="*.ltf")[0])
+            from ui.project_browser import ProjectBrowserDialog
+            projects = os.path.join(root, "projects")
+            filename = ProjectBrowserDialog.getFilename([projects, os.path.join(projects, "autosave")], self.main_window)
         else:
             filename = kwargs["filename"]
-        if len(filename) > 0:
-            self.project_filename = filename
-        with open(self.project_filename, "rb") as f: project = pickle.load(f)
-        
-        self.line_length = project["line_length"]
-        self.measured_line_length = project["measured_line_length"]
-        self.row_size = project["row_size"]
-        self.row_names = project["row_names"]
+        if not filename:
+            return
+        try:
+            if is_legacy(filename) and migrate(filename):
+                self.printStatus("Project converted to the file format version 2, the original file is kept as backup.")
+            project = load_project(filename)
+        except Exception as e:
+            self.printStatus("The project '%s' is not readable: %s"%(filename, e))
+            return
+
+        self.project_filename = filename
+        self.table = project["table"]
+        self.glider_name = project["glider"]
+        self.session_date = project["date"]
         self.lineEdit_Identification.setText(project["identification"])
-        self.updateView()
+        self.history.clear()
+        if project["history"] is not None:
+            self.history.restore(project["history"])
+        if replay_journal(self.project_filename, self.table, self.history) > 0:
+            self.printStatus("Measurements recovered from the autosave journal.")
+            self.autoSave()
+        self.setComboBoxes()
 
 
     def printStatus(self, message, dt=None):
@@ -185,57 +322,118 @@ class LineTrim(Ui_LineTrim):
         else:
             filename = kwargs["filename"]
         if os.path.isfile(filename):
-            self.line_length = dict()
             try:
-                with open(filename, "r") as f: content = f.readlines()
-                self.row_size = list()
-                self.row_names = list()
-                num = 0
-                for line in content:
-                    if line.startswith("*"):
-                        if num > 0:
-                            self.row_size.append(num)
-                        row_name = line.lstrip("*").rstrip("\n")
-                        self.row_names.append(row_name)
-                        num = 0
-                    elif len(line.rstrip("\n")) > 0:
-                        num += 1
-                        key = "%s%02i"%(row_name.replace(" ","_"), num)
-                        self.line_length[key] = float(line.lstrip("\n"))
-                        for side in side_list:
-                            self.measured_line_length["%s_%s"%(key, side)] = 0. # +np.random.normal(self.line_length[key], 5)
-                    self.row_size.append(num)
+                with profiler.span("setLineLength"):
+                    self.table = self.library.table(filename)
+                self.history.clear()
                 if self.project_filename is None:
                     default_filename = "%s_%s.ltf"%(time.strftime("%Y-%m-%d"), filename.split("/")[-1][:-4])
                     self.project_filename = os.path.join(root, "projects", "autosave", default_filename)
+                    self.session_date = time.strftime("%Y-%m-%d %H:%M:%S")
                     self.lineEdit_Identification.setText("%s - Serial number..."%filename.split("/")[-1][:-4].replace("_", " "))
-            except:
-                self.printStatus("The file '%s' is not readable"%filename)
+                self.glider_name = os.path.basename(filename)[:-4]
+                self.autoSave()
+            except (OSError, ValueError) as e:
+                self.printStatus("The file '%s' is not readable: %s"%(filename, e))
         else:
             self.printStatus("The file '%s' is not recognized"%filename)
+        self.setComboBoxes()
+
+
+    def openFleetStore(self, filename=None):
+        """Record every saved project in the fleet store as well."""
+        import sqlite3
+        from core.fleet_store import FleetStore, default_name
+        if filename is None:
+            filename = os.path.join(root, "projects", default_name)
+        try:
+            self.autosave.store = FleetStore(filename)
+        except (OSError, ValueError, sqlite3.Error) as e:
+            self.printStatus("The fleet store '%s' is not usable: %s"%(filename, e))
+
+
+    def chooseGlider(self):
+        from ui.glider_library_dialog import GliderLibraryDialog
+        filename = GliderLibraryDialog.getFilename(self.library, self.main_window)
+        if filename is not None:
+            self.setLineLength(filename=filename)
+
+
+    def compareSessions(self):
+        from core.compare import find_sessions, session_gliders, Comparison
+        from ui.compare_dialog import CompareDialog
+        filenames = QtWidgets.QFileDialog.getOpenFileNames(self.main_window, "Select the sessions to compare", os.path.join(root, "projects"), filter="*.ltf")[0]
+        if len(filenames) < 2:
+            if len(filenames) == 1: self.printStatus("Select at least two sessions to compare")
+            return
+        sessions = find_sessions(filenames)
+        gliders = session_gliders(sessions)
+        if len(gliders) > 1:
+            self.printStatus("The sessions are of different gliders (%s), select sessions of a single glider"%", ".join(gliders))
+            self.playSound("wrong")
+            return
+        try:
+            comparison = Comparison(sessions)
+        except Exception as e:
+            self.printStatus("The sessions are not readable: %s"%e)
+            return
+        if len(comparison) < 2:
+            self.printStatus("Select at least two readable sessions to compare")
+            return
+        CompareDialog(comparison, self.main_window).exec_()
+
+
+    def setComboBoxes(self):
+        self.view_dirty = True
+        self.trim_solution = None
+        self.statistics_revision = None
+        self.navigator = Navigator(self.table)
+        tree = CascadeTree.from_table(self.table)
+        self.path_lengths = None if tree.is_flat else PathLengths(self.table, tree)
         self.comboBox_Row.clear()
-        self.comboBox_Row.addItems(self.row_names)
+        self.comboBox_Row.addItems(self.table.row_names)
         self.comboBox_Number.clear()
-        if len(self.row_size) > 0:
-            self.comboBox_Number.addItems([str(i+1) for i in range(max(self.row_size))])
+        self.comboBox_Number.addItems([str(i+1) for i in range(self.table.max_number)])
         self.updateView()
 
 
-    def computeDeviation(self):
-        self.deviation_line_length = dict()
-        total = 0.
-        n_dev = 0
-        for key in self.line_length:
-            for side in side_list:
-                skey = "%s_%s"%(key, side)
-                if not self.measured_line_length[skey] == 0:
-                    self.deviation_line_length[skey] = self.measured_line_length[skey] - self.line_length[key]
-                    total += self.deviation_line_length[skey]
-                    n_dev += 1
-        if n_dev > 0:
-            self.offset = total / n_dev
-            for key in self.deviation_line_length:
-                self.deviation_line_length[key] -= self.offset
+    def trimSolution(self):
+        """Trim adjustments of the table, solved again only once the measurements changed."""
+        if self.trim_solution is None or self.trim_revision != self.table.revision:
+            with profiler.span("trimSolver"):
+                self.trim_solution = self.trim_solver.solve(self.table)
+            self.trim_revision = self.table.revision
+        return self.trim_solution
+
+
+    def showStatistics(self):
+        if self.statistics_revision == self.table.revision:
+            return
+        self.statistics_revision = self.table.revision
+        with profiler.span("statistics"):
+            stats = self.table.statistics()
+        if stats.total.count[0] == 0:
+            self.label_Statistics.setText("")
+            return
+        rows = ", ".join("%s %i"%(name, val) for name, val, n in zip(self.table.row_names, stats.row.max_abs, stats.row.count) if n > 0)
+        text = "Out of tolerance: %i/%i - max |%s| per row: %s - trim: %i adjustment(s)"%(stats.total.out_of_tolerance[0], stats.total.count[0], "\u0394", rows, self.trimSolution().n_adjustments)
+        if self.path_lengths is not None:
+            deviation = self.path_lengths.attachment_deviation()
+            measured = np.isfinite(deviation)
+            if np.any(measured):
+                text += " - attachments: max |%s| %i on %i path(s)"%("\u0394", np.abs(deviation[measured]).max(), np.count_nonzero(measured))
+        self.label_Statistics.setText(text)
+
+
+    def showTrimSolution(self):
+        solution = self.trimSolution()
+        lines = ["%s: %+i mm (%+i step%s)"%(adj.label, adj.length, adj.steps, "s" if abs(adj.steps) > 1 else "") for adj in solution.adjustments()]
+        if len(lines) == 0:
+            lines = ["No adjustment needed."]
+        if not solution.feasible:
+            lines.append("\nSome lines or row trims stay out of tolerance with the available steps.")
+        lines.append("\nPositive values lengthen the line, offset after adjustment: %0.1f mm."%solution.offset)
+        QtWidgets.QMessageBox.information(self.main_window, "Trim adjustments", "\n".join(lines))
 
 
     def exportPDFReport(self):
@@ -243,134 +441,246 @@ class LineTrim(Ui_LineTrim):
         filename = str(QtWidgets.QFileDialog.getSaveFileName(self.main_window, "Export PDF report as.", os.path.join(root, "reports", prefered_filename), filter="*.pdf")[0])
         if len(filename) > 0:
             if not filename.endswith(".pdf"): filename += ".pdf"
-            matplotlib.rc('font', **{'size'   : 7})
-            fig = plt.figure(figsize=(297./25.4, 210./25.4))
-            ax = fig.add_subplot(1,1,1, frameon=False)
-            ax.get_xaxis().set_visible(False)
-            ax.get_yaxis().set_visible(False)
-            self.updateView(ax = ax)
-            fig.subplots_adjust(left=10./297, right=287./297, bottom=10./210, top=200./210 )
-            fig.savefig(filename)
-            plt.close(fig=fig)
-            matplotlib.rc('font', **{'size'   : 10})
+            from render.report import new_report_figure, render_report
+            fig, view = new_report_figure()
+            render_report(view, self.table, self.lineEdit_Identification.text(), filename)
         self.printStatus("Report %s generated."%filename)
+
+
+    def exportMeasurements(self):
+        """Append the sessions of the project directories added since the last export."""
+        from core.compare import project_files
+        from core.export import formats, export_sessions, import_pyarrow, ExportError
+        directory = str(QtWidgets.QFileDialog.getExistingDirectory(self.main_window, "Export the measurements to", os.path.join(root, "exports")))
+        if len(directory) == 0:
+            return
+        available = list(formats)
+        try:
+            import_pyarrow("parquet")
+        except ExportError:
+            available = ["csv"]
+        fmt = "csv"
+        if len(available) > 1:
+            fmt, ok = QtWidgets.QInputDialog.getItem(self.main_window, "Export measurements", "Format", available, 0, False)
+            if not ok:
+                return
+        projects = os.path.join(root, "projects")
+        try:
+            exported = export_sessions(project_files([projects, os.path.join(projects, "autosave")]), directory, fmt, incremental=True,
+                                       log=self.printStatus, root=projects)
+        except (OSError, ExportError) as e:
+            self.printStatus("The export failed: %s"%e)
+            return
+        self.printStatus("%i session(s) exported to %s."%(len(exported), directory))
     
     
     def updateView(self, **kwargs):
-        if "ax" in kwargs:
-            ax = kwargs["ax"]
-            display_active = False
+        if self.view is None:
+            return
+        with profiler.span(frame_span):
+            self._updateView()
+        self.showTimings()
+
+
+    def _updateView(self):
+        i = self.table.find(self.comboBox_Row.currentIndex(), self.comboBox_Number.currentIndex()+1)
+        if i >= 0 and self.comboBox_Side.currentIndex() >= 0:
+            self.active = (i, self.comboBox_Side.currentIndex())
         else:
-            ax = self.ax
-            display_active = True
-            self.computeDeviation()
-            self.saveProject()
-        try:
-            number = int(self.comboBox_Number.currentText())
-        except:
-            number = 0
-        self.active = "%s%02i_%s"%(self.comboBox_Row.currentText(), number, self.comboBox_Side.currentText(), )
+            self.active = None
         
         # Set focus back to measurement input after dropdown selection
-        if display_active:
-            self.lineEdit_Measurement.setFocus()
-
-        ax.cla()
-        ax.set_xlim(0,w)
-        ax.set_ylim(0,h)
-
-        # Plot background glider
-        ax.fill_between(self.profile[:,0], self.profile[:,1], self.profile[:,2], color=(0.95,0.95,0.95,))
-        ax.plot(self.profile[:,0], self.profile[:,1:], color="k", linewidth=1.)
-        for i in range(0, self.profile.shape[0]):
-            ax.plot([self.profile[i,0], self.profile[i,0]], [self.profile[i,1], self.profile[i,2]], color="k", linewidth={True:0.25, False:1.}[0<i<self.profile.shape[0]-1])
-
-        ax.text(w_margin, h_margin, "%s leading edge"%side_list[0], ha="left", va="bottom", fontsize="large", fontweight="bold", bbox=meas_style)
-        ax.text(w-w_margin, h_margin, "%s leading edge"%side_list[1], ha="right", va="bottom", fontsize="large", fontweight="bold", bbox=meas_style)
-
-        ax.text(w_margin, h-h_margin, "%s trailing edge"%side_list[0], ha="left", va="top", fontsize="large", fontweight="bold", bbox=meas_style)
-        ax.text(w-w_margin, h-h_margin, "%s trailing edge"%side_list[1], ha="right", va="top", fontsize="large", fontweight="bold", bbox=meas_style)
-
-
-        ax.text(w/2, h-h_margin, "%s - %s"%(time.strftime("%d-%m-%Y"), self.lineEdit_Identification.text()), ha="center", va="top", fontsize="x-large", fontweight="bold", bbox=meas_style)
-
-
-        ax.plot([w/2, w/2], [0., h], linestyle="--", color="k", linewidth=2.)
-        if len(self.row_size) > 0: n = max(self.row_size)
-        else: n = 2
-        w_eff = 0.5*w-w_margin
-        h_step = w_eff*1./(n)
-        h_eff = h-2*h_margin
-        v_step = h_eff*1./ (len(self.row_names)+1)
-        v_space = 0.15*v_step
-        for i, row_name in enumerate(self.row_names):
-            for j in range(1, n+1):
-                key = "%s%02i"%(row_name, j)
-                if key in self.line_length:
-                    x = {side_list[0]:0.5*w - (j-0.3)*h_step, side_list[1]:0.5*w + (j-0.3)*h_step}
-                    y = h_margin+(i+1)*v_step
-                    th_length = self.line_length[key]
-                    for side in side_list:
-                        skey = "%s_%s"%(key, side)
-                        active = display_active and self.active==skey
-                        if active:
-                            ax.plot([0, w], [y, y], linestyle ="--", linewidth=2, color="tomato")
-                            ax.plot([x[side], x[side]], [0, h], linestyle ="--", linewidth=2, color="tomato")
-                            bbox_style = active_style
-                        else:
-                            bbox_style = meas_style
-                        measured = self.measured_line_length[skey]
-                        ax.text(x[side], y+v_space, "%s-%s\n%i"%(key, side[0], th_length), ha="center", va="bottom", fontsize="small", fontstyle="italic", bbox=th_style)
-                        if not measured==0:
-                            deviation = self.deviation_line_length[skey]
-                            ax.text(x[side], y, "%i"%measured, ha="center", va="center", bbox=bbox_style)
-                            ax.text(x[side], y-v_space, "%s=%i"%(r"$\Delta$", deviation), ha="center", va="top", fontweight="bold", bbox=dev_style(deviation))
-                        elif active:
-                            ax.text(x[side], y, "--", ha="center", va="center", bbox=bbox_style)
-
-        ax.text(w/2, h_margin, "Offset = %0.1f mm"%self.offset, ha="center", va="bottom", bbox=meas_style)
-        
-        self.figure_widget.figure.canvas.draw_idle()
+        self.lineEdit_Measurement.setFocus()
+
+        rebuilt = self.view_dirty
+        if self.view_dirty:
+            self.view.build(self.table)
+            self.view_dirty = False
+        self.view.update(self.table, active=self.active, identification=self.lineEdit_Identification.text())
+        if self.server is not None:
+            self.server.publish(self.table, self.active, self.lineEdit_Identification.text(), rebuilt=rebuilt)
+        with profiler.span("draw"):
+            self.view.draw()
+        self.showStatistics()
 
 
     def updateMeasurement(self):
-        evo_row, evo_number = evo_dict[self.comboBox_Direction.currentText()]
+        with profiler.span("updateMeasurement"):
+            self._updateMeasurement()
+
+
+    def _updateMeasurement(self):
         try:
             val = float(self.lineEdit_Measurement.text()) 
             if val< 10:
                 val *= 1e3
         except:
             val = -1.
+        self.applyMeasurement(val)
+        self.lineEdit_Measurement.setText("")
+
+
+    def onMeasurement(self, measurement):
+        self.printStatus("Reading #%i from %s: %i mm"%(measurement.seq, measurement.source, measurement.value), 5000)
+        self.applyMeasurement(measurement.value)
+
+
+    def connectDisto(self):
+        # Hardware integrations live next to src/
+        if not root in sys.path: sys.path.append(root)
+        from hardware.leica_disto.source import DistoSource
+        self.measurement_bridge.addSource(DistoSource(log=self.measurement_bridge.log))
+        self.printStatus("Connecting to DISTO...", 5000)
 
+
+    def startServer(self, host="127.0.0.1", port=None):
+        """Publish the session to the web view of other screens, and accept their readings."""
+        from core.session_server import SessionServer, default_port
+        server = SessionServer(host, default_port if port is None else port)
+        self.measurement_bridge.addSource(server)
+        server.ready.wait(2.)
+        if server.error is not None:
+            self.printStatus("Server not started: %s"%server.error)
+            return
+        self.server = server
+        self.view_dirty = True
+        self.updateView()
+        self.printStatus("Session published on %s, readings posted to %smeasurement?token=%s"%(server.url, server.url, server.token))
+
+
+    def applyMeasurement(self, val):
         if 0. < val < min_val_back and self.cancel_last:
-            self.comboBox_Row.setCurrentIndex(self.comboBox_Row.currentIndex()-evo_row)
-            self.comboBox_Number.setCurrentIndex(self.comboBox_Number.currentIndex()-evo_number)
-            if self.sound: self.go_back.play()
             self.cancel_last = False
+            self.undo()
+            return
         elif 0. < val < min_val_back:
             self.cancel_last = True
-            if self.sound: self.wrong.play()
+            self.playSound("wrong")
 
-        if self.active in self.measured_line_length:
+        if self.active is not None:
             # Get the theoretical length
-            for side in side_list:
-                if self.active.endswith("_%s"%side) : ref = self.line_length[self.active[:-(len(side)+1)]]
+            ref = self.table.reference[self.active]
             if np.abs(val-ref) < valid_difference:
+                if self.acquisition.cell != self.active:
+                    self.acquisition.reset(self.active)
+                status = self.acquisition.add(val)
+                if status == OUTLIER:
+                    self.printStatus("Reading %i mm rejected, too far from the previous ones."%val, 5000)
+                    self.playSound("wrong")
+                    return
+                val, spread = self.acquisition.estimate
+                if status != DONE:
+                    self.printStatus("%s: %i/%i readings, %i \u00b1 %.1f mm"%(self.table.side_key(*self.active), len(self.acquisition.inliers), self.acquisition.samples, val, spread))
+                    return
+                if not self.acquisition.stable:
+                    self.printStatus("%s: readings spread over %.1f mm, check the line."%(self.table.side_key(*self.active), spread), 5000)
+                self.acquisition.reset()
                 # Assign value
-                self.measured_line_length[self.active] = val
+                self.history.push(self.active[0], self.active[1], self.table.measured[self.active], val, self.table.spread[self.active], spread)
+                self.setMeasurement(self.active[0], self.active[1], val, spread=spread)
                 # Move to next point
-                self.comboBox_Row.setCurrentIndex(self.comboBox_Row.currentIndex()+evo_row)
-                self.comboBox_Number.setCurrentIndex(self.comboBox_Number.currentIndex()+evo_number)
-                if self.sound: self.go_next.play()
+                cell = self.navigator.next(self.active, self.comboBox_Direction.currentText(),
+                                           self.actionInterleave_sides.isChecked(), self.actionSkip_measured.isChecked())
+                if cell is not None:
+                    self.selectLine(*cell)
+                else:
+                    self.updateView()
+                    self.printStatus("Every line is measured." if self.actionSkip_measured.isChecked() else "End of the measurement order.", 5000)
+                self.playSound("go_next")
+
+
+    def setMeasurement(self, i, side, val, op=None, spread=0.):
+        """
+        Store a value (0 to clear it) and the spread of its readings, and
+        journal it, op being "undo" or "redo" from the history.
+        """
+        with profiler.span("deviation"):
+            if self.path_lengths is not None:
+                self.path_lengths.set_measurement(i, side, val, spread)
+            else:
+                self.table.set_measurement(i, side, val, spread)
+        self.navigator.set_measured(i, side)
+        if self.project_filename is not None:
+            self.autosave.record(self.project_filename, self.table.side_key(i, side), val, op, spread)
+            self.autoSave()
+
+
+    def selectLine(self, i, side):
+        """Make line (index, side) the active one and redraw the view once."""
+        for combo_box, index in ((self.comboBox_Row, int(self.table.row[i])), (self.comboBox_Number, int(self.table.number[i])-1),
+                                 (self.comboBox_Side, side)):
+            combo_box.blockSignals(True)
+            combo_box.setCurrentIndex(index)
+            combo_box.blockSignals(False)
+        self.updateView()
 
-        self.lineEdit_Measurement.setText("")
+
+    def chooseSamples(self, samples=None):
+        """Number of consistent readings to collect per line before storing their median."""
+        if samples is None:
+            samples, ok = QtWidgets.QInputDialog.getInt(self.main_window, "Readings per line", "Consistent readings per line:",
+                                                        self.acquisition.samples, 1, 20)
+            if not ok:
+                return
+        self.acquisition = Acquisition(samples)
+        self.printStatus("%i reading(s) per line."%samples, 5000)
+
+
+    def undo(self):
+        """Revert the last measurement and select its line to measure it again."""
+        edit = self.history.undo()
+        if edit is None:
+            self.printStatus("Nothing to undo.", 5000)
+            return
+        self.acquisition.reset()
+        self.setMeasurement(edit.index, edit.side, edit.old, op="undo", spread=edit.old_spread)
+        self.selectLine(edit.index, edit.side)
+        self.playSound("go_back")
+
+
+    def redo(self):
+        """Store again the last undone measurement and select its line."""
+        edit = self.history.redo()
+        if edit is None:
+            self.printStatus("Nothing to redo.", 5000)
+            return
+        self.acquisition.reset()
+        self.setMeasurement(edit.index, edit.side, edit.new, op="redo", spread=edit.new_spread)
+        self.selectLine(edit.index, edit.side)
+        self.playSound("go_next")
 
 
 if __name__ == "__main__":
+    startup = PhaseTimer(startup_t0)
+    startup.mark("imports", startup_t0)
     app = QtWidgets.QApplication(sys.argv)
     mw = QtWidgets.QMainWindow()
-    lt = LineTrim(mw, version_number)
+    lt = LineTrim(mw, version_number, deferred=True, startup=startup)
+    app.aboutToQuit.connect(lt.autosave.stop)
+    app.aboutToQuit.connect(lt.measurement_bridge.stop)
+    if "--fleet-store" in sys.argv:
+        lt.openFleetStore()
+    if "--profile" in sys.argv:
+        lt.actionProfiling.setChecked(True)
+        lt.switchProfiling()
+    for arg in sys.argv:
+        if arg.startswith("--samples="):
+            lt.chooseSamples(int(arg.partition("=")[2]))
+
+    def start():
+        lt.start()
+        if "--startup-timings" in sys.argv:
+            print("Startup: %s"%startup.summary())
+        if "--disto" in sys.argv:
+            lt.connectDisto()
+        for arg in sys.argv:
+            if arg == "--serve" or arg.startswith("--serve="):
+                from core.session_server import parse_address
+                lt.startServer(*parse_address(arg.partition("=")[2]))
+
     mw.showMaximized()    
+    # Show the window before loading the glider and the first render
+    QtCore.QTimer.singleShot(0, start)
 #    lt.lineEdit_Identification.setText("Supair Savage S SA-SAV-S-2007-145")
 #    lt.setLineLength(ask_for_filename = False, filename = "Savage/LineLength_Savage_S.txt")
 #    sys.exit()   
@@ -0,0 +1 @@
+# Rendering of the glider measurement view
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""
+Drift view of a session comparison: the change of the deviation of every
+line between two sessions ("delta of delta"), colored like the deviations.
+"""
+
+import time
+
+import matplotlib
+import numpy as np
+
+from core.compare import trend_period
+from render.report import new_report_figure, report_font_size
+
+
+def drift_title(comparison, a=0, b=-1):
+    dates = [time.strftime("%d-%m-%Y", time.localtime(comparison.times[s])) for s in (a, b)]
+    return "%s %s %s - %s"%(dates[0], "→", dates[1], comparison.identifications[b])
+
+
+def show_drift(view, comparison, a=0, b=-1):
+    """Build view for the lines of the comparison and show the drift from session a to b."""
+    table = comparison.table()
+    view.build(table)
+    deviation = comparison.deviation
+    texts = [["%+i%s%+i"%(deviation[a, i, side], "→", deviation[b, i, side]) if np.isfinite(deviation[[a, b], i, side]).all() else ""
+              for side in range(deviation.shape[2])] for i in range(deviation.shape[1])]
+    footer = "Offset %+.1f %s %+.1f mm, trend %+.1f mm / %i days"%(comparison.offset[a], "→", comparison.offset[b], comparison.offset_trend(), trend_period)
+    view.updateValues(table, comparison.drift(a, b), drift_title(comparison, a, b), footer=footer, texts=texts)
+    return table
+
+
+def render_drift(comparison, filenames, a=0, b=-1):
+    """Render the drift from session a to b in one or several files."""
+    if isinstance(filenames, str): filenames = [filenames]
+    fig, view = new_report_figure()
+    with matplotlib.rc_context({"font.size": report_font_size}):
+        show_drift(view, comparison, a, b)
+        for filename in filenames:
+            fig.savefig(filename)
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+Matplotlib backend of the glider scene (see render/scene.py), used for the
+reports.
+
+The background (edge labels) is drawn once per axes, the static items of a
+glider (planform, theoretical lengths) once per glider load, and one retained artist per
+dynamic item of the scene is only touched when the scene reports the item
+as changed.
+"""
+
+import time
+
+import numpy as np
+from matplotlib.collections import LineCollection
+
+from render.scene import GliderScene, Label, Polygon, Segments, Points, Cursor, w, h
+
+_bbox = dict()
+
+
+def bbox(box):
+    """Matplotlib bbox properties of a scene Box."""
+    if not box in _bbox:
+        _bbox[box] = dict(fc=box.fc, ec=box.ec, pad=box.pad)
+    return _bbox[box]
+
+
+class GliderView(object):
+    """
+    Draw a GliderScene on a matplotlib axes and keep the artists alive
+    between updates.
+    """
+    def __init__(self, ax):
+        self.ax = ax
+        self.scene = GliderScene()
+        self.artists = dict()           # scene item -> artist
+        self.glider_artists = list()
+        self.has_background = False
+        self.last_redraw_time = 0.
+
+    @property
+    def position(self):
+        return self.scene.position
+
+    @property
+    def last_changed(self):
+        return self.scene.last_changed
+
+    def _add(self, item):
+        ax = self.ax
+        if isinstance(item, Label):
+            artist = ax.text(item.x, item.y, item.text, ha=item.ha, va=item.va, fontsize=item.size,
+                             fontweight="bold" if item.bold else "normal", fontstyle="italic" if item.italic else "normal",
+                             bbox=bbox(item.box), visible=item.visible)
+        elif isinstance(item, Cursor):
+            line = item.polyline
+            artist = ax.plot(line.x, line.y, linestyle="--", linewidth=line.width, color=line.color, visible=item.visible)[0]
+        elif isinstance(item, Polygon):
+            artist = ax.fill(item.x, item.y, color=item.color, linewidth=0)[0]
+        elif isinstance(item, Segments):
+            segments = np.stack([np.column_stack([item.x0, item.y0]), np.column_stack([item.x1, item.y1])], axis=1)
+            artist = ax.add_collection(LineCollection(segments, colors=[item.color], linewidths=item.width))
+        elif isinstance(item, Points):
+            artist = ax.plot(item.x, item.y, linestyle="none", marker="o", markersize=item.size, color=item.color)[0]
+        else:
+            artist = ax.plot(item.x, item.y, linestyle="--" if item.dashed else "-", color=item.color, linewidth=item.width)[0]
+        return artist
+
+    def _apply(self, item):
+        artist = self.artists[item]
+        if isinstance(item, Label):
+            artist.set_text(item.text)
+            artist.set_bbox(bbox(item.box))
+        else:
+            line = item.polyline
+            artist.set_data(line.x, line.y)
+        artist.set_visible(item.visible)
+
+    def buildBackground(self):
+        """Create the artists common to every glider."""
+        ax = self.ax
+        ax.cla()
+        ax.set_xlim(0,w)
+        ax.set_ylim(0,h)
+        for item in self.scene.background:
+            self._add(item)
+        self.glider_artists = list()
+        self.artists = dict()
+        self.has_background = True
+
+    def build(self, table):
+        """Create the artists of a glider, to be called once per glider load."""
+        if not self.has_background:
+            self.buildBackground()
+        for artist in self.glider_artists:
+            artist.remove()
+        self.scene.build(table)
+        self.glider_artists = [self._add(item) for item in self.scene.static]
+        self.artists = dict()
+        for item in self.scene.dynamic:
+            self.artists[item] = self._add(item)
+            self.glider_artists.append(self.artists[item])
+
+    def update(self, table, active=None, identification="", date=None):
+        """
+        Update the artists whose displayed value changed, active being the
+        (index, side) of the line to measure. The date shown in the title is
+        today if not given.
+
+        Returns the number of lines which had to be updated.
+        """
+        for item in self.scene.update(table, active, identification, date):
+            self._apply(item)
+        return self.scene.last_changed
+
+    def updateValues(self, table, values, title, footer="", label="ΔΔ", texts=None):
+        """Show one value per line and side, see GliderScene.updateValues."""
+        for item in self.scene.updateValues(table, values, title, footer, label, texts):
+            self._apply(item)
+
+    def draw(self):
+        """Push the current state to the canvas."""
+        t0 = time.perf_counter()
+        self.ax.figure.canvas.draw_idle()
+        self.last_redraw_time = time.perf_counter() - t0
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+Parametric planform of the wing drawn behind the lines.
+
+The outline and the ribs are generated from the number of cells and the
+projected aspect ratio of the glider, in view coordinates (see
+render/scene.py): elliptic chord distribution truncated at the tips,
+trailing edge swept back towards the tips, leading edge at the bottom of
+the view. Specifications without these parameters get a number of cells
+estimated from the number of lines and a usual aspect ratio.
+
+The lines of a row are attached at ribs spread over the half span, at the
+chord position of the row (A near the leading edge, brakes at the trailing
+edge); their labels are drawn at the attachment points, moved apart where
+they would overlap. Planforms are cached per number of cells and aspect
+ratio.
+"""
+
+import functools
+from collections import namedtuple
+
+import numpy as np
+
+default_aspect_ratio = 5.3
+# Estimate of the number of cells per line of the longest row and side
+cells_per_line = 2.3
+min_cells = 8
+# Tip chord relative to the root chord
+tip_chord = 0.2
+# Backward shift of the trailing edge at the tips, relative to the root chord
+sweep = 0.2
+# Chord position of the attachments of each row, 0 at the leading edge
+row_chord = dict(a=0.1, b=0.35, c=0.6, d=0.8, e=0.85, f=0.9, br=1., k=1.)
+
+Planform = namedtuple("Planform", ["rib_x", "leading", "trailing"])
+
+
+def wing_parameters(table):
+    """(number of cells, aspect ratio) of a LineTable, estimated when not given."""
+    cells = table.cells
+    if cells is None:
+        cells = max(min_cells, int(round(2*cells_per_line*max(table.max_number, 1))))
+    return cells, table.aspect_ratio or default_aspect_ratio
+
+
+@functools.lru_cache(maxsize=32)
+def planform(cells, aspect_ratio, x0, x1, y_center):
+    """Planform of a wing spanning x0 to x1 in view coordinates, chord centered on y_center."""
+    rib_x = np.linspace(x0, x1, cells+1)
+    s = (rib_x - 0.5*(x0+x1))/(0.5*(x1-x0))
+    shape = np.sqrt(1. - (1.-tip_chord**2)*s**2)
+    # Area = root chord * span/2 * integral of the shape over s in [-1, 1]
+    integral = 0.5*np.sum((shape[1:]+shape[:-1])*np.diff(s))
+    root = 2.*(x1-x0)/(aspect_ratio*integral)
+    trailing = y_center + 0.5*root - sweep*root*s**2
+    leading = trailing - root*shape
+    for array in (rib_x, leading, trailing):
+        array.setflags(write=False)
+    return Planform(rib_x, leading, trailing)
+
+
+def chord_position(row_name, row, n_rows):
+    """Chord position of the attachments of a row, from its name or rank."""
+    return row_chord.get(row_name.lower(), row_chord.get(row_name[:1].lower(), (row+0.5)/max(n_rows, 1)))
+
+
+def attachments(plan, table, snap=True):
+    """
+    Attachment points of the lines of a LineTable on the planform: x of
+    shape (n_lines, 2) for the left and right sides, and y (n_lines,).
+    Lines are numbered from the center; the k lines of a row are attached
+    at k evenly spread points of the half span or, with snap, at the ribs
+    nearest to them, the lines sharing a rib spread evenly over its cell.
+    """
+    x_center = 0.5*(plan.rib_x[0]+plan.rib_x[-1])
+    half_span = x_center - plan.rib_x[0]
+    half_ribs = plan.rib_x[plan.rib_x >= x_center] - x_center
+    cell = plan.rib_x[1] - plan.rib_x[0]
+    x = np.zeros((len(table), 2))
+    y = np.zeros(len(table))
+    for r, name in enumerate(table.row_names):
+        lines = np.flatnonzero(table.row == r)
+        if len(lines) == 0:
+            continue
+        k = int(table.number[lines].max())
+        targets = (np.arange(1, k+1)-0.5)/k*half_span
+        if snap:
+            rib = np.abs(half_ribs[None, :]-targets[:, None]).argmin(axis=1)
+            targets = half_ribs[rib]
+            for i in np.unique(rib[1:][rib[1:] == rib[:-1]]):
+                shared = np.flatnonzero(rib == i)
+                targets[shared] += ((np.arange(len(shared))+1.)/(len(shared)+1) - 0.5)*cell
+            targets = np.clip(targets, 0., half_span)
+        offset = targets[table.number[lines]-1]
+        x[lines, 0] = x_center - offset
+        x[lines, 1] = x_center + offset
+        fraction = chord_position(name, r, len(table.row_names))
+        leading = np.interp(x[lines, 1], plan.rib_x, plan.leading)
+        trailing = np.interp(x[lines, 1], plan.rib_x, plan.trailing)
+        y[lines] = leading + fraction*(trailing-leading)
+    return x, y
+
+
+def label_positions(plan, table, x, gap):
+    """
+    x of the labels of the lines attached at x (n_lines, 2): at their
+    attachment point, moved apart along their row where two labels of a
+    side are closer than gap (capped to 90% of the even spacing of the row),
+    as little as possible and within the half span.
+    """
+    x_center = 0.5*(plan.rib_x[0]+plan.rib_x[-1])
+    half_span = x_center - plan.rib_x[0]
+    label_x = np.array(x, dtype=np.float64)
+    for r in range(len(table.row_names)):
+        lines = np.flatnonzero(table.row == r)
+        if len(lines) < 2:
+            continue
+        lines = lines[np.argsort(table.number[lines], kind="stable")]
+        row_gap = min(gap, 0.9*half_span/int(table.number[lines].max()))
+        offset = np.abs(label_x[lines, 1] - x_center)
+        # Push outwards from the center, then back inwards from the tip
+        for j in range(1, len(offset)):
+            offset[j] = max(offset[j], offset[j-1] + row_gap)
+        offset[-1] = min(offset[-1], half_span)
+        for j in range(len(offset)-2, -1, -1):
+            offset[j] = min(offset[j], offset[j+1] - row_gap)
+        label_x[lines, 0] = x_center - offset
+        label_x[lines, 1] = x_center + offset
+    return label_x
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+PDF/PNG reports of LineTrim projects, usable without display.
+
+Batch generation for whole project directories (from the src directory)::
+
+    python -m render.report ../projects ../projects/autosave -o ../reports --format pdf png -j 4
+
+Reports are rendered in a process pool. Each worker keeps one figure whose
+background (edge labels) is drawn once and reused for every report.
+Projects whose report is up to date are skipped: a manifest in the output
+directory records the size, modification time and content hash of each
+rendered project.
+"""
+
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import os
+import sys
+import time
+
+import matplotlib
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from core.compare import session_time
+from core.project_file import LazyProject
+from render.glider_view import GliderView
+
+# A4 landscape, in inches
+report_size = (297./25.4, 210./25.4)
+report_font_size = 7
+manifest_name = ".reports.json"
+# Change when the report layout changes to regenerate every report
+report_version = "3"
+
+
+def new_report_figure():
+    """Figure and view used to render reports, the background is drawn once."""
+    with matplotlib.rc_context({"font.size": report_font_size}):
+        fig = Figure(figsize=report_size)
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot(1,1,1, frameon=False)
+        ax.get_xaxis().set_visible(False)
+        ax.get_yaxis().set_visible(False)
+        fig.subplots_adjust(left=10./297, right=287./297, bottom=10./210, top=200./210)
+        view = GliderView(ax)
+        view.buildBackground()
+    return fig, view
+
+
+def render_report(view, table, identification, filenames, date=None):
+    """Render a glider table with a report view in one or several files."""
+    if isinstance(filenames, str): filenames = [filenames]
+    with matplotlib.rc_context({"font.size": report_font_size}):
+        view.build(table)
+        view.update(table, identification=identification, date=date)
+        for filename in filenames:
+            view.ax.figure.savefig(filename)
+
+
+def report_date(project):
+    """Session date of a LazyProject in the report title format (see core.compare.session_time)."""
+    return time.strftime("%d-%m-%Y", time.localtime(session_time(project)))
+
+
+def project_hash(filename):
+    digest = hashlib.sha1(report_version.encode())
+    with open(filename, "rb") as f:
+        digest.update(f.read())
+    return digest.hexdigest()
+
+
+_worker = None
+
+
+def _renderProject(filename, outputs):
+    global _worker
+    if _worker is None:
+        _worker = new_report_figure()
+    project = LazyProject(filename)
+    render_report(_worker[1], project.table(), project.header["identification"], outputs, date=report_date(project))
+    return filename
+
+
+def _outputs(filename, output_dir, formats):
+    name = os.path.splitext(os.path.basename(filename))[0]
+    return [os.path.join(output_dir, "%s.%s"%(name, fmt)) for fmt in formats]
+
+
+def generate_reports(filenames, output_dir, formats=("pdf",), jobs=None, force=False, log=print):
+    """
+    Render the reports of the project files, skipping those up to date.
+
+    Returns the list of rendered project files.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_filename = os.path.join(output_dir, manifest_name)
+    manifest = dict()
+    if os.path.isfile(manifest_filename):
+        with open(manifest_filename, "r") as f: manifest = json.load(f)
+
+    todo = dict()
+    for filename in filenames:
+        outputs = _outputs(filename, output_dir, formats)
+        stat = os.stat(filename)
+        entry = manifest.get(os.path.abspath(filename))
+        if not force and entry is not None and all(os.path.isfile(output) for output in outputs):
+            if entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+                continue
+            if entry["hash"] == project_hash(filename):
+                entry["mtime"] = stat.st_mtime
+                continue
+        todo[filename] = (outputs, dict(size=stat.st_size, mtime=stat.st_mtime, hash=project_hash(filename)))
+
+    rendered = list()
+    if len(todo) > 0:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = dict((executor.submit(_renderProject, filename, outputs), filename) for filename, (outputs, entry) in todo.items())
+            for future in concurrent.futures.as_completed(futures):
+                filename = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    log("Failed %s: %s"%(filename, e))
+                    continue
+                manifest[os.path.abspath(filename)] = todo[filename][1]
+                rendered.append(filename)
+                log("Rendered %s"%filename)
+
+    with open(manifest_filename, "w") as f: json.dump(manifest, f, indent=1)
+    return rendered
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render LineTrim project reports without display.")
+    parser.add_argument("paths", nargs="+", help="Project files (.ltf) or directories of project files")
+    parser.add_argument("-o", "--output", default="reports", help="Output directory")
+    parser.add_argument("--format", nargs="+", default=["pdf"], choices=["pdf", "png", "svg"], help="Report formats")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="Number of worker processes")
+    parser.add_argument("-f", "--force", action="store_true", help="Render even the reports which are up to date")
+    args = parser.parse_args(argv)
+
+    filenames = list()
+    for path in args.paths:
+        if os.path.isdir(path):
+            filenames.extend(sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith(".ltf")))
+        else:
+            filenames.append(path)
+    t0 = time.perf_counter()
+    rendered = generate_reports(filenames, args.output, args.format, args.jobs, args.force)
+    print("%i report(s) rendered, %i up to date, in %0.1f s"%(len(rendered), len(filenames)-len(rendered), time.perf_counter()-t0))
+
+
+if __name__ == "__main__":
+    matplotlib.use("Agg")
+    sys.exit(main())
@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+"""
+Backend-neutral description of the glider view.
+
+The layout of a glider (planform of the wing, position of every line,
+labels of the theoretical lengths) is computed once per glider load into a
+scene of primitives in view coordinates (w x h, y upwards). update() then
+only changes the labels whose displayed value changed and returns them, so
+that a backend redraws those only. Two backends draw a scene:
+
+- render/glider_view.py with matplotlib, for the reports (PDF, PNG)
+- ui/scene_widget.py with QPainter, for the live view
+
+This module depends neither on matplotlib nor on Qt.
+"""
+
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from core.model import side_list, tolerance
+from render.planform import planform, attachments, label_positions, wing_parameters
+
+# View dimensions
+w, h = 1600, 900
+w_margin = 0.01*w
+h_margin = 0.01*h
+# Least distance between the labels of two lines of a row and side
+label_gap = 56.
+
+# Font sizes relative to the base font size of the backend, as in matplotlib
+font_scale = {"small": 0.833, "medium": 1., "large": 1.2, "x-large": 1.44}
+
+# Box drawn behind a label: face and edge RGB colors, padding in points
+Box = namedtuple("Box", ["fc", "ec", "pad"])
+Polygon = namedtuple("Polygon", ["x", "y", "color"])
+Polyline = namedtuple("Polyline", ["x", "y", "color", "width", "dashed"])
+# Separate straight segments from (x0, y0) to (x1, y1), arrays drawn at once
+Segments = namedtuple("Segments", ["x0", "y0", "x1", "y1", "color", "width"])
+# Round markers of the given diameter in points
+Points = namedtuple("Points", ["x", "y", "color", "size"])
+
+th_box = Box((0.9, 0.9, 0.9), (0., 0., 0.), 3)
+meas_box = Box((1., 1., 1.), (1., 1., 1.), 2)
+active_box = Box((1., 99./255, 71./255), (0., 0., 0.), 2)
+cursor_color = (1., 99./255, 71./255)
+
+# Segments of the matplotlib "jet" colormap, colors of the deviations
+_jet = dict(red=((0., 0.35, 0.66, 0.89, 1.), (0., 0., 1., 1., 0.5)),
+            green=((0., 0.125, 0.375, 0.64, 0.91, 1.), (0., 0., 1., 1., 0., 0.)),
+            blue=((0., 0.11, 0.34, 0.65, 1.), (0.5, 1., 1., 0., 0.)))
+_dev_boxes = dict()
+
+
+def jet(t):
+    """RGB color of the jet colormap at t in [0, 1]."""
+    t = min(max(t, 0.), 1.)
+    return tuple(float(np.interp(t, *_jet[channel])) for channel in ("red", "green", "blue"))
+
+
+def dev_box(dev):
+    """Box of a deviation (mm), from blue (too short) to red (too long)."""
+    dev = int(dev)
+    if not dev in _dev_boxes:
+        color = jet((dev+tolerance)/(2*tolerance))
+        _dev_boxes[dev] = Box(color, color, 2)
+    return _dev_boxes[dev]
+
+
+class Label(object):
+    """Text at (x, y), aligned by ha (left, center, right) and va (bottom, center, top)."""
+    __slots__ = ("x", "y", "text", "ha", "va", "size", "bold", "italic", "box", "visible")
+
+    def __init__(self, x, y, text, ha="center", va="center", size="medium", bold=False, italic=False, box=meas_box, visible=True):
+        self.x, self.y, self.text = x, y, text
+        self.ha, self.va, self.size = ha, va, size
+        self.bold, self.italic = bold, italic
+        self.box, self.visible = box, visible
+
+
+class Cursor(object):
+    """Dashed line through the active line, horizontal (at y) or vertical (at x)."""
+    __slots__ = ("vertical", "value", "visible")
+
+    def __init__(self, vertical):
+        self.vertical = vertical
+        self.value = 0.
+        self.visible = False
+
+    @property
+    def polyline(self):
+        if self.vertical:
+            return Polyline((self.value, self.value), (0., h), cursor_color, 2., True)
+        return Polyline((0., w), (self.value, self.value), cursor_color, 2., True)
+
+
+def background_items():
+    """Items common to every glider: edge labels and middle line."""
+    items = list()
+    for x, ha, side in ((w_margin, "left", 0), (w-w_margin, "right", 1)):
+        items.append(Label(x, h_margin, "%s leading edge"%side_list[side], ha=ha, va="bottom", size="large", bold=True))
+        items.append(Label(x, h-h_margin, "%s trailing edge"%side_list[side], ha=ha, va="top", size="large", bold=True))
+    items.append(Polyline((w/2, w/2), (0., h), (0., 0., 0.), 2., True))
+    return items
+
+
+def planform_items(plan, x, y):
+    """Outline and ribs of a planform, and markers at the attachment points x (n, 2), y (n,)."""
+    black = (0., 0., 0.)
+    return [Polygon(np.concatenate([plan.rib_x, plan.rib_x[::-1]]), np.concatenate([plan.leading, plan.trailing[::-1]]), (0.95, 0.95, 0.95)),
+            Segments(plan.rib_x[1:-1], plan.leading[1:-1], plan.rib_x[1:-1], plan.trailing[1:-1], black, 0.25),
+            Segments(plan.rib_x[[0, -1]], plan.leading[[0, -1]], plan.rib_x[[0, -1]], plan.trailing[[0, -1]], black, 1.),
+            Polyline(plan.rib_x, plan.leading, black, 1., False),
+            Polyline(plan.rib_x, plan.trailing, black, 1., False),
+            Points(x.ravel(), np.repeat(y, x.shape[1]), (0.4, 0.4, 0.4), 3.)]
+
+
+def thumbnail_items(table, size=4.):
+    """
+    Planform of a glider with a marker of the given size (points) at every
+    attachment point, colored by the deviation of its line, grey when not
+    measured: the picture of a session in the project browser.
+    """
+    plan = planform(*wing_parameters(table), w_margin, w-w_margin, h/2)
+    x, y = attachments(plan, table)
+    items = planform_items(plan, x, y)[:-1]
+    y = np.repeat(y[:, None], 2, axis=1)
+    measured = table.mask
+    items.append(Points(x[~measured], y[~measured], (0.6, 0.6, 0.6), size))
+    deviation = table.deviation
+    for dev in np.unique(np.clip(np.round(deviation[measured]), -tolerance, tolerance)).tolist():
+        selection = measured & (np.clip(np.round(deviation), -tolerance, tolerance) == dev)
+        items.append(Points(x[selection], y[selection], dev_box(dev).fc, size))
+    return items
+
+
+class GliderScene(object):
+    """
+    Items of the glider view: background (common to every glider), static
+    items of the glider (planform, theoretical lengths) and dynamic items
+    (title, offset, cursors, measured value and deviation of every line and
+    side).
+    """
+    def __init__(self):
+        self.background = background_items()
+        self.static = list()
+        self.labels = dict()        # (index, side) -> (measured Label, deviation Label)
+        self.line_state = dict()
+        self.position = dict()
+        self.title = Label(w/2, h-h_margin, "", va="top", size="x-large", bold=True)
+        self.footer = Label(w/2, h_margin, "", va="bottom")
+        self.h_cursor = Cursor(vertical=False)
+        self.v_cursor = Cursor(vertical=True)
+        self.last_changed = 0
+
+    @property
+    def dynamic(self):
+        """Every dynamic item, in drawing order."""
+        items = [self.title, self.footer, self.h_cursor, self.v_cursor]
+        for labels in self.labels.values():
+            items.extend(labels)
+        return items
+
+    def build(self, table):
+        """
+        Lay out the planform and the lines of a glider, once per glider load.
+        The labels of a line are above its attachment point on a rib, moved
+        apart from their neighbors along the row where they would overlap,
+        in the band of its row so that the labels of different rows never
+        overlap.
+        """
+        plan = planform(*wing_parameters(table), w_margin, w-w_margin, h/2)
+        x, y = attachments(plan, table)
+        self.static = planform_items(plan, x, y)
+        x = label_positions(plan, table, x, label_gap)
+        self.labels = dict()
+        self.line_state = dict()
+        self.position = dict()
+        v_step = (h-2*h_margin)/(len(table.row_names)+1)
+        v_space = 0.15*v_step
+        y = h_margin+(np.asarray(table.row, dtype=np.float64)+1)*v_step
+        x, y = x.tolist(), y.tolist()
+        for i, name in enumerate(table.names):
+            for side, side_name in enumerate(side_list):
+                self.position[i, side] = (x[i][side], y[i])
+                self.static.append(Label(x[i][side], y[i]+v_space, "%s-%s\n%i"%(name, side_name[0], table.reference[i, side]),
+                                         va="bottom", size="small", italic=True, box=th_box))
+                self.labels[i, side] = (Label(x[i][side], y[i], "", visible=False),
+                                        Label(x[i][side], y[i]-v_space, "", va="top", bold=True, box=dev_box(0.), visible=False))
+                self.line_state[i, side] = None
+        self.h_cursor.visible = self.v_cursor.visible = False
+
+    def _setText(self, label, text, changed):
+        if label.text != text:
+            label.text = text
+            changed.append(label)
+
+    def update(self, table, active=None, identification="", date=None):
+        """
+        Update the items whose displayed value changed, active being the
+        (index, side) of the line to measure. The date shown in the title is
+        today if not given. Returns the list of changed items.
+        """
+        changed = list()
+        if date is None: date = time.strftime("%d-%m-%Y")
+        self._setText(self.title, "%s - %s"%(date, identification), changed)
+        self._setText(self.footer, "Offset = %0.1f mm"%table.offset, changed)
+
+        measured = table.measured.astype(int).tolist()
+        deviation = table.deviation.astype(int).tolist()
+        n_lines = 0
+        for cell, (meas_label, dev_label) in self.labels.items():
+            i, side = cell
+            is_active = cell == active
+            if not measured[i][side] == 0:
+                state = (measured[i][side], deviation[i][side], is_active)
+            else:
+                state = (None, None, is_active)
+            if state == self.line_state[cell]:
+                continue
+            self.line_state[cell] = state
+            n_lines += 1
+            value, dev, _ = state
+            meas_label.box = active_box if is_active else meas_box
+            if value is not None:
+                meas_label.text = "%i"%value
+                meas_label.visible = True
+                dev_label.text = "Δ=%i"%dev
+                dev_label.box = dev_box(dev)
+                dev_label.visible = True
+            else:
+                meas_label.text = "--"
+                meas_label.visible = is_active
+                dev_label.visible = False
+            changed.extend((meas_label, dev_label))
+
+        self._setCursors(self.position.get(active), changed)
+        self.last_changed = n_lines
+        return changed
+
+    def _setCursors(self, position, changed):
+        for cursor, value in ((self.h_cursor, None if position is None else position[1]),
+                              (self.v_cursor, None if position is None else position[0])):
+            if value is None:
+                if cursor.visible:
+                    cursor.visible = False
+                    changed.append(cursor)
+            elif not cursor.visible or cursor.value != value:
+                cursor.visible = True
+                cursor.value = value
+                changed.append(cursor)
+
+    def updateValues(self, table, values, title, footer="", label="ΔΔ", texts=None):
+        """
+        Show one value per line and side instead of the measurements, e.g.
+        the drift between two sessions, colored like the deviations. Lines
+        whose value is NaN are left empty; texts, if given, are shown above
+        the values. Returns the list of changed items.
+        """
+        self.title.text = title
+        self.footer.text = footer
+        changed = [self.title, self.footer]
+        for cell, (meas_label, dev_label) in self.labels.items():
+            i, side = cell
+            value = values[i, side]
+            self.line_state[cell] = None
+            meas_label.box = meas_box
+            meas_label.visible = texts is not None and bool(texts[i][side])
+            if meas_label.visible:
+                meas_label.text = texts[i][side]
+            dev_label.visible = bool(np.isfinite(value))
+            if dev_label.visible:
+                dev_label.text = "%s=%i"%(label, value)
+                dev_label.box = dev_box(value)
+            changed.extend((meas_label, dev_label))
+        self._setCursors(None, changed)
+        self.last_changed = len(self.labels)
+        return changed
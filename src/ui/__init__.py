@@ -1,5 +1,4 @@
 # UI components for LineTrim
-from .figure_widget import FigureWidget
 from .line_trim_ui import Ui_LineTrim
 
-__all__ = ['FigureWidget', 'Ui_LineTrim']
+__all__ = ['Ui_LineTrim']
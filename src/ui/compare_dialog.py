@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+Window showing the drift of the lines between two sessions of a comparison.
+"""
+
+import time
+
+from PyQt5 import QtWidgets
+
+from core.compare import trend_period
+from ui.scene_widget import PainterView
+from render.compare_view import show_drift
+
+
+class CompareDialog(QtWidgets.QDialog):
+    """Drift view of a core.compare.Comparison, sessions chosen in two combo boxes."""
+    def __init__(self, comparison, parent=None):
+        super(CompareDialog, self).__init__(parent)
+        self.comparison = comparison
+        self.setWindowTitle("Session comparison")
+        self.resize(1400, 850)
+
+        self.comboBox_From = QtWidgets.QComboBox(self)
+        self.comboBox_To = QtWidgets.QComboBox(self)
+        for s in range(len(comparison)):
+            label = "%s - %s"%(time.strftime("%Y-%m-%d", time.localtime(comparison.times[s])), comparison.identifications[s])
+            self.comboBox_From.addItem(label)
+            self.comboBox_To.addItem(label)
+        self.comboBox_To.setCurrentIndex(len(comparison)-1)
+        self.view = PainterView(self)
+        self.label_Summary = QtWidgets.QLabel(self)
+
+        selection = QtWidgets.QHBoxLayout()
+        selection.addWidget(QtWidgets.QLabel("From", self))
+        selection.addWidget(self.comboBox_From, 1)
+        selection.addWidget(QtWidgets.QLabel("to", self))
+        selection.addWidget(self.comboBox_To, 1)
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.addLayout(selection)
+        layout.addWidget(self.view.widget, 1)
+        layout.addWidget(self.label_Summary)
+
+        self.comboBox_From.currentIndexChanged.connect(lambda index: self.refresh())
+        self.comboBox_To.currentIndexChanged.connect(lambda index: self.refresh())
+        self.refresh()
+
+    def refresh(self):
+        a, b = self.comboBox_From.currentIndex(), self.comboBox_To.currentIndex()
+        show_drift(self.view, self.comparison, a, b)
+        self.view.draw()
+        self.label_Summary.setText("%i sessions, offset trend %+.1f mm / %i days"%(len(self.comparison), self.comparison.offset_trend(), trend_period))
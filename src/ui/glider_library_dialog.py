@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+Dialog to pick a glider of the library, filtered as the user types.
+"""
+
+from PyQt5 import QtCore, QtWidgets
+
+
+class GliderLibraryDialog(QtWidgets.QDialog):
+    """List the entries of a GliderLibrary matching the search text."""
+    def __init__(self, library, parent=None):
+        super(GliderLibraryDialog, self).__init__(parent)
+        self.library = library
+        self.setWindowTitle("Glider library")
+        self.resize(520, 420)
+
+        self.lineEdit_Search = QtWidgets.QLineEdit(self)
+        self.lineEdit_Search.setPlaceholderText("Manufacturer, model, size...")
+        self.listWidget = QtWidgets.QListWidget(self)
+        self.label_Count = QtWidgets.QLabel(self)
+        self.buttonBox = QtWidgets.QDialogButtonBox(QtWidgets.QDialogButtonBox.Open | QtWidgets.QDialogButtonBox.Cancel, self)
+
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.addWidget(self.lineEdit_Search)
+        layout.addWidget(self.listWidget)
+        layout.addWidget(self.label_Count)
+        layout.addWidget(self.buttonBox)
+
+        self.lineEdit_Search.textChanged.connect(self.refresh)
+        self.lineEdit_Search.returnPressed.connect(self.accept)
+        self.listWidget.itemDoubleClicked.connect(self.accept)
+        self.buttonBox.accepted.connect(self.accept)
+        self.buttonBox.rejected.connect(self.reject)
+        self.refresh()
+
+    def refresh(self, text=None):
+        if text is None:
+            text = self.lineEdit_Search.text()
+        entries = self.library.search(text)
+        self.listWidget.clear()
+        for entry in entries:
+            label = " ".join(val for val in (entry.manufacturer, entry.model, entry.size) if val)
+            item = QtWidgets.QListWidgetItem("%s  (%i lines, rows %s)"%(label, entry.n_lines, " ".join(entry.row_names)))
+            item.setData(QtCore.Qt.UserRole, entry.filename)
+            item.setToolTip(entry.filename)
+            self.listWidget.addItem(item)
+        if self.listWidget.count() > 0:
+            self.listWidget.setCurrentRow(0)
+        self.label_Count.setText("%i of %i gliders"%(len(entries), len(self.library.entries)))
+
+    def selectedFilename(self):
+        item = self.listWidget.currentItem()
+        if item is None:
+            return None
+        return item.data(QtCore.Qt.UserRole)
+
+    @classmethod
+    def getFilename(cls, library, parent=None):
+        """Filename of the chosen glider, None if cancelled."""
+        dialog = cls(library, parent)
+        if dialog.exec_() == QtWidgets.QDialog.Accepted:
+            return dialog.selectedFilename()
+        return None
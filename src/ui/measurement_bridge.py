@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""
+Bridge between measurement sources running in threads and the Qt GUI thread.
+"""
+
+from PyQt5 import QtCore
+
+from core.measurement import MeasurementQueue
+
+
+class MeasurementBridge(QtCore.QObject):
+    """
+    Own a MeasurementQueue and call handler(measurement) in the GUI thread
+    for every reading pushed by the sources. Messages of the sources passed
+    to log() are emitted by the message signal, in the GUI thread as well.
+    """
+    received = QtCore.pyqtSignal()
+    message = QtCore.pyqtSignal(str)
+
+    def __init__(self, handler, parent=None):
+        super(MeasurementBridge, self).__init__(parent)
+        self.handler = handler
+        self.sources = list()
+        self.queue = MeasurementQueue(on_put=self.received.emit)
+        self.received.connect(self.drain, QtCore.Qt.QueuedConnection)
+
+    def log(self, message):
+        """Thread-safe message of a source."""
+        self.message.emit(message)
+
+    def addSource(self, source):
+        self.sources.append(source)
+        source.start(self.queue)
+
+    def stop(self):
+        for source in self.sources:
+            source.stop()
+        self.sources = list()
+
+    def drain(self):
+        for measurement in self.queue.get_all():
+            self.handler(measurement)
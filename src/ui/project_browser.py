@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""
+Browser of the project files, to pick a session without opening it.
+
+Every project is listed with its identification, date, measured lines and
+largest deviation, and a thumbnail of its deviations. The list is filled
+from the directory listings only, so it opens at once whatever the number
+of sessions. Summaries and thumbnails are loaded when their rows are first
+shown (the view only asks for the decorations of the visible rows) by the
+threads of a ThumbnailLoader, most recent request first, so the rows
+scrolled to are served before those scrolled past. Both are kept in the
+disk cache under the hash of the file content (see core/project_index.py),
+a project being read only once. The search only matches what is known
+without loading a project, so that its result does not change as the rows
+load: the file name and, for files of the current format, the header. The
+headers are read by a thread once the list is shown, the search matching
+the file names until then.
+"""
+
+import collections
+import os
+import struct
+import threading
+
+from PyQt5 import QtCore, QtGui, QtWidgets
+
+from core import cache
+from core.project_file import LazyProject, ProjectFileError, is_legacy, read_header
+from core.project_index import list_projects, project_summary, summary_text
+from render.scene import thumbnail_items
+from ui.scene_widget import ScenePainter
+
+# Size of the thumbnails in pixels, with the aspect ratio of the glider view
+thumbnail_width, thumbnail_height = 192, 108
+thumbnail_prefix = "thumbnail-"
+max_thumbnails = 2000
+n_loaders = min(4, os.cpu_count() or 1)
+# Role of the text matched by the search
+SearchRole = QtCore.Qt.UserRole + 1
+
+
+def render_thumbnail(table, font):
+    """QImage of the planform of a LineTable with its deviations, safe outside the GUI thread."""
+    image = QtGui.QImage(thumbnail_width, thumbnail_height, QtGui.QImage.Format_ARGB32_Premultiplied)
+    image.fill(QtCore.Qt.white)
+    scene_painter = ScenePainter(thumbnail_width, thumbnail_height, 72., font)
+    painter = QtGui.QPainter(image)
+    painter.setRenderHint(QtGui.QPainter.Antialiasing)
+    for item in thumbnail_items(table):
+        scene_painter.paint(painter, item)
+    painter.end()
+    return image
+
+
+def search_text(filename):
+    """
+    Text of a project file matched by the search: its name, with the
+    identification, glider and date of the header for the files of the
+    current format (legacy files would have to be loaded entirely).
+    """
+    name = os.path.basename(filename)
+    try:
+        if is_legacy(filename):
+            return name
+        header = read_header(filename)
+    except (OSError, ValueError, struct.error, ProjectFileError):
+        return name
+    return "\n".join([name, header.get("identification", ""), header.get("glider", ""), header.get("date", "")])
+
+
+def _readImage(f):
+    image = QtGui.QImage()
+    if not image.loadFromData(f.read(), "PNG"):
+        raise ValueError("unreadable thumbnail")
+    return image
+
+
+def _writeImage(f, image):
+    buffer = QtCore.QBuffer()
+    buffer.open(QtCore.QIODevice.WriteOnly)
+    image.save(buffer, "PNG")
+    f.write(bytes(buffer.data()))
+
+
+def load_entry(filename, font):
+    """(summary, thumbnail QImage) of a project file, from the cache when possible."""
+    digest = cache.file_hash(filename)
+    summary, project = project_summary(filename, digest)
+    name = "%s%s-%ix%i.png"%(thumbnail_prefix, digest, thumbnail_width, thumbnail_height)
+    image = cache.read_cache(name, _readImage)
+    if image is None:
+        if project is None:
+            project = LazyProject(filename)
+        image = render_thumbnail(project.table(), font)
+        if cache.write_cache(name, lambda f: _writeImage(f, image)):
+            cache.prune_cache(thumbnail_prefix, max_thumbnails)
+    return summary, image
+
+
+class ThumbnailLoader(object):
+    """
+    Threads loading the entries of project files, passed to
+    on_loaded(filename, summary, image) or on_loaded(filename, None, error
+    message). The most recent requests are served first.
+    """
+    def __init__(self, on_loaded, n_threads=n_loaders):
+        self.on_loaded = on_loaded
+        self.font = QtGui.QFont()
+        self._condition = threading.Condition()
+        self._queue = collections.deque()
+        self._running = True
+        self._threads = [threading.Thread(target=self._run, name="LineTrimThumbnails%i"%k, daemon=True) for k in range(n_threads)]
+        for thread in self._threads:
+            thread.start()
+
+    def request(self, filename):
+        with self._condition:
+            self._queue.append(filename)
+            self._condition.notify()
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._queue.clear()
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._running and len(self._queue) == 0:
+                    self._condition.wait()
+                if not self._running:
+                    return
+                filename = self._queue.pop()
+            try:
+                summary, image = load_entry(filename, self.font)
+            except Exception as e:
+                self.on_loaded(filename, None, str(e))
+            else:
+                self.on_loaded(filename, summary, image)
+
+
+class ProjectListModel(QtCore.QAbstractListModel):
+    """Project files of directories, with summaries and thumbnails loaded on demand."""
+    entryLoaded = QtCore.pyqtSignal(str, object, object)
+    searchTextsLoaded = QtCore.pyqtSignal(object)
+
+    def __init__(self, paths, parent=None):
+        super(ProjectListModel, self).__init__(parent)
+        self.filenames = list_projects(paths)
+        self.rows = dict((filename, row) for row, filename in enumerate(self.filenames))
+        self.summaries = dict()
+        self.thumbnails = dict()
+        self.errors = dict()
+        self._search = dict((filename, os.path.basename(filename)) for filename in self.filenames)
+        self._requested = set()
+        self._placeholder = QtGui.QPixmap(thumbnail_width, thumbnail_height)
+        self._placeholder.fill(QtGui.QColor(240, 240, 240))
+        self.entryLoaded.connect(self._setEntry, QtCore.Qt.QueuedConnection)
+        self.searchTextsLoaded.connect(self._setSearchTexts, QtCore.Qt.QueuedConnection)
+        self.loader = ThumbnailLoader(self.entryLoaded.emit)
+        self._scanning = True
+        self._scanner = threading.Thread(target=self._scanHeaders, name="LineTrimProjectHeaders", daemon=True)
+        self._scanner.start()
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.filenames)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        filename = self.filenames[index.row()]
+        if role == QtCore.Qt.DisplayRole:
+            name = os.path.basename(filename)
+            if filename in self.summaries:
+                summary = self.summaries[filename]
+                return "%s\n%s\n%s"%(summary.identification, summary_text(summary), name)
+            if filename in self.errors:
+                return "%s\nNot readable: %s"%(name, self.errors[filename])
+            return "%s\nLoading..."%name
+        if role == QtCore.Qt.DecorationRole:
+            if not filename in self._requested:
+                self._requested.add(filename)
+                self.loader.request(filename)
+            return self.thumbnails.get(filename, self._placeholder)
+        if role in (QtCore.Qt.ToolTipRole, QtCore.Qt.UserRole):
+            return filename
+        if role == SearchRole:
+            return self._search[filename]
+        return None
+
+    def _setEntry(self, filename, summary, image):
+        if summary is None:
+            self.errors[filename] = image
+        else:
+            self.summaries[filename] = summary
+            self.thumbnails[filename] = QtGui.QPixmap.fromImage(image)
+        index = self.index(self.rows[filename])
+        self.dataChanged.emit(index, index)
+
+    def _scanHeaders(self):
+        texts = dict()
+        for filename in self.filenames:
+            if not self._scanning:
+                return
+            texts[filename] = search_text(filename)
+        self.searchTextsLoaded.emit(texts)
+
+    def _setSearchTexts(self, texts):
+        self._search.update(texts)
+        if len(self.filenames) > 0:
+            self.dataChanged.emit(self.index(0), self.index(len(self.filenames)-1), [SearchRole])
+
+    def stop(self):
+        self._scanning = False
+        self._scanner.join()
+        self.loader.stop()
+
+
+class ProjectBrowserDialog(QtWidgets.QDialog):
+    """List of the project files of directories, filtered as the user types."""
+    def __init__(self, paths, parent=None):
+        super(ProjectBrowserDialog, self).__init__(parent)
+        self.paths = paths
+        self.setWindowTitle("Projects")
+        self.resize(760, 640)
+        self.filename = None
+
+        self.model = ProjectListModel(paths, self)
+        self.proxy = QtCore.QSortFilterProxyModel(self)
+        self.proxy.setSourceModel(self.model)
+        self.proxy.setFilterCaseSensitivity(QtCore.Qt.CaseInsensitive)
+        self.proxy.setFilterRole(SearchRole)
+
+        self.lineEdit_Search = QtWidgets.QLineEdit(self)
+        self.lineEdit_Search.setPlaceholderText("Identification, glider, date...")
+        self.listView = QtWidgets.QListView(self)
+        self.listView.setModel(self.proxy)
+        self.listView.setIconSize(QtCore.QSize(thumbnail_width, thumbnail_height))
+        self.listView.setUniformItemSizes(True)
+        self.listView.setSpacing(2)
+        self.listView.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.label_Count = QtWidgets.QLabel(self)
+        self.buttonBox = QtWidgets.QDialogButtonBox(QtWidgets.QDialogButtonBox.Open | QtWidgets.QDialogButtonBox.Cancel, self)
+        self.button_Other = self.buttonBox.addButton("Other file...", QtWidgets.QDialogButtonBox.ActionRole)
+
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.addWidget(self.lineEdit_Search)
+        layout.addWidget(self.listView)
+        layout.addWidget(self.label_Count)
+        layout.addWidget(self.buttonBox)
+
+        self.lineEdit_Search.textChanged.connect(self.refresh)
+        self.lineEdit_Search.returnPressed.connect(self.accept)
+        self.listView.doubleClicked.connect(self.accept)
+        self.buttonBox.accepted.connect(self.accept)
+        self.buttonBox.rejected.connect(self.reject)
+        self.button_Other.clicked.connect(self.chooseOther)
+        self.refresh()
+
+    def refresh(self, text=None):
+        if text is None:
+            text = self.lineEdit_Search.text()
+        self.proxy.setFilterFixedString(text)
+        if self.proxy.rowCount() > 0 and not self.listView.currentIndex().isValid():
+            self.listView.setCurrentIndex(self.proxy.index(0, 0))
+        self.label_Count.setText("%i of %i projects"%(self.proxy.rowCount(), self.model.rowCount()))
+
+    def selectedFilename(self):
+        if self.filename is not None:
+            return self.filename
+        index = self.listView.currentIndex()
+        if not index.isValid():
+            return None
+        return self.proxy.data(index, QtCore.Qt.UserRole)
+
+    def chooseOther(self):
+        directory = self.paths[0] if len(self.paths) > 0 else ""
+        filename = str(QtWidgets.QFileDialog.getOpenFileName(self, "Select a LTF project file", directory, filter="*.ltf")[0])
+        if len(filename) > 0:
+            self.filename = filename
+            self.accept()
+
+    def done(self, result):
+        self.model.stop()
+        super(ProjectBrowserDialog, self).done(result)
+
+    @classmethod
+    def getFilename(cls, paths, parent=None):
+        """Filename of the chosen project, None if cancelled."""
+        dialog = cls(paths, parent)
+        if dialog.exec_() == QtWidgets.QDialog.Accepted:
+            return dialog.selectedFilename()
+        return None
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""
+Shared fixtures of the tests. The modules are imported from src, as the
+application does; from the repository root::
+
+    python -m pytest tests
+"""
+
+import os
+import sys
+
+import pytest
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(root, "src"))
+
+from core import cache
+from core.project_file import dump_project
+from core.spec_file import load_spec
+
+glider_filename = os.path.join(root, "data", "gliders", "Supair_Savage_S.txt")
+
+
+@pytest.fixture
+def table():
+    """LineTable of the Supair Savage S, with a few lines measured."""
+    table = load_spec(glider_filename)
+    for i in range(0, len(table), 3):
+        table.set_measurement(i, 0, table.reference[i, 0] + 5.)
+        table.set_measurement(i, 1, table.reference[i, 1] - 10., spread=2.)
+    return table
+
+
+@pytest.fixture
+def write_project(table):
+    """write_project(filename, **fields) writes the session of table as a project file."""
+    def write(filename, **fields):
+        project = dict(table=table, identification="SA-SAV-S-2007-145", glider="Supair_Savage_S", date="2022-01-02 10:00:00")
+        project.update(fields)
+        with open(str(filename), "wb") as f:
+            dump_project(project, f)
+        return str(filename)
+    return write
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    """Empty disk cache for the test."""
+    monkeypatch.setattr(cache, "cache_dir", str(tmp_path/"cache"))
+    return tmp_path/"cache"
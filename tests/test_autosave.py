@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from core.autosave import AutoSaver, replay_journal
+from core.history import History
+from core.project_file import load_project
+
+
+def measure(table, history, autosave, filename, i, value, op=None):
+    if op is None:
+        history.push(i, 0, table.measured[i, 0], value)
+    autosave.record(filename, table.side_key(i, 0), value, op)
+    table.set_measurement(i, 0, value)
+
+
+def test_history_survives_snapshots(tmp_path, table):
+    filename = str(tmp_path/"session.ltf")
+    history = History()
+    autosave = AutoSaver(delay=0.)
+    try:
+        for i in range(3):
+            measure(table, history, autosave, filename, i, 1000. + i)
+        autosave.schedule(filename, dict(table=table.copy(), glider="Supair_Savage_S", history=history.arrays()))
+        autosave.flush()
+        # Edits after the snapshot, only in the journal
+        edit = history.undo()
+        measure(table, history, autosave, filename, edit.index, edit.old, op="undo")
+        measure(table, history, autosave, filename, 5, 2000.)
+        autosave.flush()
+    finally:
+        autosave.stop()
+
+    project = load_project(filename)
+    recovered = History()
+    recovered.restore(project["history"])
+    assert len(recovered) == 3
+    assert replay_journal(filename, project["table"], recovered) == 2
+    np.testing.assert_array_equal(project["table"].measured, table.measured)
+    assert [recovered[k] for k in range(len(recovered))] == [history[k] for k in range(len(history))]
+    assert [recovered.undo().index for _ in range(3)] == [5, 1, 0]
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+import csv
+
+from core.export import csv_name, export_sessions, verify_export
+
+
+def test_csv_row_counts(tmp_path, table, write_project):
+    projects = tmp_path/"projects"
+    projects.mkdir()
+    first = write_project(projects/"2022-01-02_Supair_Savage_S.ltf")
+    output = str(tmp_path/"export")
+    rows_per_session = 2*len(table)
+
+    exported = export_sessions([first], output, chunk_rows=50, log=lambda message: None)
+    assert exported == [first]
+    assert verify_export(output) == rows_per_session
+
+    second = write_project(projects/"2022-01-03_Supair_Savage_S.ltf")
+    assert export_sessions([first, second], output, incremental=True, log=lambda message: None) == [second]
+    assert export_sessions([first, second], output, incremental=True, log=lambda message: None) == []
+    assert verify_export(output) == 2*rows_per_session
+
+    with open(str(tmp_path/"export"/csv_name), newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == 2*rows_per_session
+    assert set(row["file"] for row in rows) == {"2022-01-02_Supair_Savage_S.ltf", "2022-01-03_Supair_Savage_S.ltf"}
+    assert set(row["run"] for row in rows) == {"1", "2"}
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from core.fleet_store import FleetStore
+
+
+def test_ingest_and_query(tmp_path, table, write_project):
+    projects = tmp_path/"projects"
+    projects.mkdir()
+    write_project(projects/"2022-01-02-Supair_Savage_S_-_SA-SAV-S-2007-145.ltf")
+    write_project(projects/"2021-12-05_Supair_Savage_S.ltf", date="2021-12-05 09:00:00")
+    store = FleetStore(str(tmp_path/"fleet.sqlite"))
+    try:
+        imported, skipped, errors = store.ingest([str(projects)])
+        assert (imported, skipped, errors) == (2, 0, {})
+        assert store.ingest([str(projects)])[:2] == (0, 2)
+
+        assert store.gliders()[0][:2] == ("Supair_Savage_S", 2)
+        dates = [row[0] for row in store.sessions(glider="Supair_Savage_S")]
+        assert dates == ["2021-12-05 00:00:00", "2022-01-02 00:00:00"]
+
+        # Left lines +5 mm and right lines -10 mm: 7.5 mm apart from the offset
+        n_measured = int(np.count_nonzero(table.measured[:, 1]))
+        short = store.lines(glider="Supair_Savage_S", side="Right", below=-5., latest=False)
+        assert len(short) == 2*n_measured
+        assert all(abs(row[-1] + 7.5) < 1e-9 for row in short)
+        assert len(store.lines(glider="Supair_Savage_S", side="Right", below=-5.)) == n_measured
+    finally:
+        store.close()
+
+
+def test_record_matches_ingest(tmp_path, table, write_project):
+    filename = write_project(tmp_path/"2022-01-02_Supair_Savage_S.ltf", date="2022-01-02 17:45:00")
+    recorded = FleetStore(str(tmp_path/"recorded.sqlite"))
+    ingested = FleetStore(str(tmp_path/"ingested.sqlite"))
+    try:
+        recorded.record(filename, dict(table=table, identification="SA-SAV-S-2007-145", glider="Supair_Savage_S",
+                                       date="2022-01-02 17:45:00"))
+        ingested.ingest([filename])
+        assert recorded.sessions() == ingested.sessions()
+    finally:
+        recorded.close()
+        ingested.close()
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from core.history import Edit, History
+
+
+def test_undo_redo():
+    history = History()
+    history.push(1, 0, 0., 100.)
+    history.push(2, 1, 0., 200., 0., 1.5)
+    assert history.can_undo and not history.can_redo
+
+    assert history.undo() == Edit(2, 1, 0., 200., 0., 1.5)
+    assert history.undo() == Edit(1, 0, 0., 100., 0., 0.)
+    assert history.undo() is None
+    assert history.can_redo
+
+    assert history.redo() == Edit(1, 0, 0., 100., 0., 0.)
+    assert len(history) == 2
+
+
+def test_push_drops_redo():
+    history = History()
+    history.push(1, 0, 0., 100.)
+    history.push(2, 0, 0., 200.)
+    history.undo()
+    history.push(3, 0, 0., 300.)
+    assert not history.can_redo
+    assert len(history) == 2
+    assert history[-1].index == 3
+
+
+def test_capacity():
+    history = History(capacity=3)
+    for k in range(5):
+        history.push(k, 0, 0., float(k))
+    assert len(history) == 3
+    assert [history[k].index for k in range(3)] == [2, 3, 4]
+    assert [history.undo().index for _ in range(3)] == [4, 3, 2]
+    assert history.undo() is None
+    with pytest.raises(IndexError):
+        history[3]
+
+
+def test_arrays_restore():
+    history = History(capacity=4)
+    for k in range(6):
+        history.push(k, k%2, 0., float(k), 0., 0.5*k)
+    history.undo()
+    restored = History(capacity=4)
+    restored.restore(history.arrays())
+    assert [restored[k] for k in range(len(restored))] == [history[k] for k in range(len(history))]
+    assert restored.redo() == history.redo()
+
+    smaller = History(capacity=2)
+    smaller.restore(history.arrays())
+    assert [smaller[k].index for k in range(len(smaller))] == [4, 5]
+    assert smaller.undo().index == 5
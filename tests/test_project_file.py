@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+import os
+import pickle
+import time
+
+import numpy as np
+
+from core.model import side_list
+from core.project_file import LazyProject, is_legacy, legacy_suffix, load_project, migrate, read_header, schema_version
+
+
+def test_round_trip(tmp_path, table, write_project):
+    filename = write_project(tmp_path/"session.ltf")
+    header = read_header(filename)
+    assert header["version"] == schema_version
+    assert header["n_measured"] == int(np.count_nonzero(table.measured))
+
+    project = load_project(filename)
+    loaded = project["table"]
+    assert project["identification"] == "SA-SAV-S-2007-145"
+    assert project["glider"] == "Supair_Savage_S"
+    assert project["date"] == "2022-01-02 10:00:00"
+    assert loaded.keys == table.keys
+    assert loaded.row_names == table.row_names
+    np.testing.assert_array_equal(loaded.reference, table.reference)
+    np.testing.assert_array_equal(loaded.measured, table.measured)
+    np.testing.assert_array_equal(loaded.spread, table.spread)
+
+
+def test_header_read_without_body(tmp_path, write_project):
+    project = LazyProject(write_project(tmp_path/"session.ltf"))
+    assert project._body is None
+    assert project.header["glider"] == "Supair_Savage_S"
+
+
+def test_legacy_migration(tmp_path, table):
+    line_length = dict((key, float(table.line_length[i])) for i, key in enumerate(table.keys))
+    measured = dict(("%s_%s"%(key, side), float(table.measured[i, j]))
+                    for i, key in enumerate(table.keys) for j, side in enumerate(side_list) if table.measured[i, j] != 0)
+    filename = str(tmp_path/"legacy.ltf")
+    with open(filename, "wb") as f:
+        pickle.dump(dict(line_length=line_length, measured_line_length=measured, row_names=table.row_names,
+                         identification="legacy wing"), f)
+    mtime = time.mktime(time.strptime("2021-12-05 18:30:00", "%Y-%m-%d %H:%M:%S"))
+    os.utime(filename, (mtime, mtime))
+
+    assert is_legacy(filename)
+    assert migrate(filename)
+    assert not is_legacy(filename)
+    assert os.path.isfile(filename + legacy_suffix)
+    assert not migrate(filename)
+
+    project = load_project(filename)
+    assert project["identification"] == "legacy wing"
+    assert project["date"] == "2021-12-05 18:30:00"
+    assert os.path.getmtime(filename) == mtime
+    np.testing.assert_array_equal(project["table"].measured, table.measured)
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+import shutil
+
+from core.project_index import project_summary
+
+
+def test_identical_files_keep_their_names(tmp_path, write_project, cache_dir):
+    first = write_project(tmp_path/"2022-03-18_Ozone_Geo5_S.ltf", glider="")
+    second = str(tmp_path/"2023-01-31_Supair_Savage_S.ltf")
+    shutil.copyfile(first, second)
+
+    summary, project = project_summary(first)
+    assert project is not None
+    assert (summary.date, summary.glider) == ("2022-03-18", "Ozone_Geo5_S")
+
+    # Same content: the cached content summary is used, not its date and glider
+    twin, project = project_summary(second)
+    assert project is None
+    assert (twin.date, twin.glider) == ("2023-01-31", "Supair_Savage_S")
+    assert twin.identification == summary.identification
+    assert (twin.n_measured, twin.n_lines, twin.max_deviation) == (summary.n_measured, summary.n_lines, summary.max_deviation)